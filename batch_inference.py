@@ -0,0 +1,307 @@
+"""
+多实例批量推理
+
+同时控制多个游戏客户端（本机多开或 vm_proxy 虚拟机）时，每个会话各自加载一份模型、
+逐帧（batch=1）推理，既占内存又浪费 CPU。推理服务只加载一份模型，
+把各会话在 max_wait 时间内提交的图像合并为一次批量推理，再把结果分发回各会话。
+
+每个会话拿到的是一个普通的 InferenceEngine，ScreenDetector 无需改动:
+
+    service = BatchInferenceService(model_registry.get_engine("hjzgv1.pt"), max_batch=8, max_wait=0.01)
+    detector1 = ScreenDetector(engine=service.client("vm1"), frame_source=...)
+    detector2 = RemoteScreenDetector("192.168.1.10", engine=service.client("vm2"))
+    ...
+    service.close()
+
+对比各会话独立推理:
+    python batch_inference.py hjzgv1.pt --sessions 4 --seconds 10
+"""
+
+import queue
+import threading
+import time
+from concurrent.futures import Future
+from typing import Dict, List, NamedTuple, Optional, Sequence
+
+import numpy as np
+
+from detections import Detections
+from inference_engines import InferenceEngine
+
+
+class _Request(NamedTuple):
+    """一个会话的一次 detect() 调用"""
+    session: str
+    frames: List[np.ndarray]
+    conf: float
+    imgsz: int
+    classes: Optional[Sequence[int]]
+    max_det: int
+    future: Future
+    submitted: float        # time.perf_counter()
+
+
+class BatchInferenceService:
+    """共享一个推理引擎，把多个会话的请求合并为批量推理"""
+
+    def __init__(self, engine: InferenceEngine, max_batch: int = 8, max_wait: float = 0.01):
+        """
+        参数:
+            engine: 共享的推理引擎（只被服务线程调用）
+            max_batch: 一次推理最多合并的图像数
+            max_wait: 收到第一个请求后最多等待其他会话的时间（秒），0表示不等待
+        """
+        self.engine = engine
+        self.names = engine.names
+        self.max_batch = max_batch
+        self.max_wait = max_wait
+        self._queue: "queue.Queue[Optional[_Request]]" = queue.Queue()
+        self._closed = False
+        self._stats_lock = threading.Lock()
+        self._stats = {'batches': 0, 'frames': 0, 'inference_ms': 0.0}
+        self._session_stats: Dict[str, Dict[str, float]] = {}
+        self._thread = threading.Thread(target=self._worker, name="BatchInference", daemon=True)
+        self._thread.start()
+
+    def client(self, session: str) -> 'BatchedEngine':
+        """为一个会话创建推理引擎"""
+        return BatchedEngine(self, session)
+
+    def submit(self, session: str, frames: List[np.ndarray], conf: float = 0.25, imgsz: int = 640,
+               classes: Optional[Sequence[int]] = None, max_det: int = 300) -> Future:
+        """
+        提交一批图像，返回 Future，结果为每张图像的 Detections
+
+        参数同 InferenceEngine.detect
+        """
+        future = Future()
+        if self._closed:
+            future.set_exception(RuntimeError("推理服务已关闭"))
+            return future
+        self._queue.put(_Request(session, list(frames), conf, imgsz, classes, max_det,
+                                 future, time.perf_counter()))
+        return future
+
+    def close(self, timeout: float = 2.0):
+        """停止服务线程，未处理的请求以异常结束"""
+        self._closed = True
+        self._queue.put(None)
+        self._thread.join(timeout)
+        while True:
+            try:
+                request = self._queue.get_nowait()
+            except queue.Empty:
+                break
+            if request is not None:
+                request.future.set_exception(RuntimeError("推理服务已关闭"))
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    # ========== 服务线程 ==========
+
+    def _collect(self, first: _Request) -> List[_Request]:
+        """从第一个请求开始，在 max_wait 内收集可以合并的请求"""
+        batch = [first]
+        frames = len(first.frames)
+        deadline = time.perf_counter() + self.max_wait
+        while frames < self.max_batch:
+            remaining = deadline - time.perf_counter()
+            try:
+                request = self._queue.get(timeout=remaining) if remaining > 0 else self._queue.get_nowait()
+            except queue.Empty:
+                break
+            if request is None:
+                # 关闭信号放回队列，处理完这一批后退出
+                self._queue.put(None)
+                break
+            batch.append(request)
+            frames += len(request.frames)
+        return batch
+
+    def _worker(self):
+        pending: List[_Request] = []
+        while True:
+            if not pending:
+                request = self._queue.get()
+                if request is None:
+                    return
+                pending = self._collect(request)
+            # 推理尺寸不同的请求不能合并，留到下一批
+            imgsz = pending[0].imgsz
+            batch = [r for r in pending if r.imgsz == imgsz]
+            pending = [r for r in pending if r.imgsz != imgsz]
+            try:
+                self._run_batch(batch)
+            except Exception as e:
+                # 服务线程不能退出，否则所有会话都会卡在等待结果上
+                for r in batch:
+                    if not r.future.done():
+                        r.future.set_exception(e)
+
+    def _run_batch(self, batch: List[_Request]):
+        """一次批量推理，再按各请求的阈值、类别和数量筛选"""
+        frames = [frame for r in batch for frame in r.frames]
+        conf = min(r.conf for r in batch)
+        if any(r.classes is None for r in batch):
+            classes = None
+        else:
+            classes = sorted({int(c) for r in batch for c in r.classes})
+        max_det = max(r.max_det for r in batch)
+
+        started = time.perf_counter()
+        results = self.engine.detect(frames, conf=conf, imgsz=batch[0].imgsz,
+                                     classes=classes, max_det=max_det)
+        elapsed = (time.perf_counter() - started) * 1000
+        timings = self.engine.last_timings
+
+        thresholds = np.empty(max(self.names) + 1, dtype=np.float32)
+        i = 0
+        for r in batch:
+            parts = []
+            for local in results[i:i + len(r.frames)]:
+                if r.classes is not None and classes != sorted(r.classes):
+                    local = local.filter_classes(r.classes)
+                if r.conf > conf:
+                    thresholds[:] = r.conf
+                    local = local.filter_confidence(thresholds)
+                if len(local) > r.max_det:
+                    local = Detections(local.data[:r.max_det], self.names)
+                parts.append(local)
+            i += len(r.frames)
+            self._record(r, started, elapsed, len(frames))
+            r.future.set_result((parts, timings))
+
+        with self._stats_lock:
+            self._stats['batches'] += 1
+            self._stats['frames'] += len(frames)
+            self._stats['inference_ms'] += elapsed
+
+    def _record(self, request: _Request, started: float, elapsed: float, batch_size: int):
+        with self._stats_lock:
+            stats = self._session_stats.setdefault(
+                request.session, {'requests': 0, 'wait_ms': 0.0, 'inference_ms': 0.0, 'batch_size': 0.0})
+            stats['requests'] += 1
+            stats['wait_ms'] += (started - request.submitted) * 1000
+            stats['inference_ms'] += elapsed
+            stats['batch_size'] += batch_size
+
+    def get_stats(self) -> Dict[str, Dict[str, float]]:
+        """
+        返回:
+            {'service': {'batches': 批次数, 'frames': 图像数, 'avg_batch': 平均批大小,
+                         'avg_inference_ms': 每批平均推理耗时},
+             会话名称: {'requests': 请求数, 'avg_wait_ms': 平均排队等待,
+                        'avg_inference_ms': 所在批次的平均推理耗时, 'avg_batch': 所在批次的平均大小}}
+        """
+        with self._stats_lock:
+            batches = max(self._stats['batches'], 1)
+            result = {'service': {
+                'batches': self._stats['batches'],
+                'frames': self._stats['frames'],
+                'avg_batch': self._stats['frames'] / batches,
+                'avg_inference_ms': self._stats['inference_ms'] / batches,
+            }}
+            for session, s in self._session_stats.items():
+                n = max(s['requests'], 1)
+                result[session] = {
+                    'requests': s['requests'],
+                    'avg_wait_ms': s['wait_ms'] / n,
+                    'avg_inference_ms': s['inference_ms'] / n,
+                    'avg_batch': s['batch_size'] / n,
+                }
+        return result
+
+
+class BatchedEngine(InferenceEngine):
+    """一个会话使用的推理引擎，detect() 提交到共享的推理服务并等待结果"""
+
+    name = "batched"
+
+    def __init__(self, service: BatchInferenceService, session: str, timeout: float = 10.0):
+        """
+        参数:
+            service: 推理服务
+            session: 会话名称（用于统计）
+            timeout: 等待结果的最长时间（秒）
+        """
+        super().__init__()
+        self.service = service
+        self.session = session
+        self.timeout = timeout
+        self.names = service.names
+
+    def detect(self, frames, conf=0.25, imgsz=640, classes=None, max_det=300):
+        # 共享引擎只被服务线程调用，这里不加锁，同一会话的并发请求也能合并到一批
+        return self._detect(frames, conf, imgsz, classes, max_det)
+
+    def _detect(self, frames, conf=0.25, imgsz=640, classes=None, max_det=300):
+        future = self.service.submit(self.session, frames, conf, imgsz, classes, max_det)
+        detections, timings = future.result(self.timeout)
+        self._set_timings(**timings)
+        return detections
+
+    def __repr__(self) -> str:
+        return f"BatchedEngine({self.session!r}, {self.service.engine.name})"
+
+
+# ========== 与各会话独立推理对比 ==========
+
+def benchmark(model_path: str, sessions: int = 4, seconds: float = 10.0, imgsz: int = 640,
+              max_wait: float = 0.01, frame_shape=(1080, 1920, 3)) -> Dict[str, float]:
+    """
+    N 个会话线程各自循环推理，对比独立引擎（各加载一份模型）与共享的批量推理服务
+
+    返回:
+        {'separate_fps': 独立推理的总帧率, 'batched_fps': 批量推理的总帧率, 'avg_batch': 平均批大小}
+    """
+    from inference_engines import create_engine
+
+    frame = np.random.randint(0, 255, frame_shape, dtype=np.uint8)
+
+    def run(engines) -> float:
+        counts = [0] * len(engines)
+        end = time.perf_counter() + seconds
+
+        def loop(k):
+            while time.perf_counter() < end:
+                engines[k].detect([frame], imgsz=imgsz)
+                counts[k] += 1
+
+        threads = [threading.Thread(target=loop, args=(k,)) for k in range(len(engines))]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        return sum(counts) / seconds
+
+    separate = [create_engine(model_path) for _ in range(sessions)]
+    for engine in separate:
+        engine.warmup(imgsz)
+    separate_fps = run(separate)
+    del separate
+
+    with BatchInferenceService(create_engine(model_path), max_batch=sessions, max_wait=max_wait) as service:
+        service.engine.warmup(imgsz)
+        batched_fps = run([service.client(f"session{k}") for k in range(sessions)])
+        avg_batch = service.get_stats()['service']['avg_batch']
+    return {'separate_fps': separate_fps, 'batched_fps': batched_fps, 'avg_batch': avg_batch}
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="对比多会话独立推理与共享批量推理")
+    parser.add_argument('model', nargs='?', default='hjzgv1.pt')
+    parser.add_argument('--sessions', type=int, default=4)
+    parser.add_argument('--seconds', type=float, default=10.0)
+    parser.add_argument('--imgsz', type=int, default=640)
+    parser.add_argument('--max-wait', type=float, default=0.01, help="最多等待其他会话的时间（秒）")
+    args = parser.parse_args()
+
+    result = benchmark(args.model, args.sessions, args.seconds, args.imgsz, args.max_wait)
+    print(f"独立推理: {result['separate_fps']:.1f} FPS（{args.sessions} 份模型）")
+    print(f"批量推理: {result['batched_fps']:.1f} FPS（1 份模型，平均批大小 {result['avg_batch']:.1f}）")
@@ -0,0 +1,346 @@
+"""
+紧凑的检测结果类型
+
+用结构化 NumPy 数组保存一帧的全部检测框，替代逐框创建的字典列表。
+解析时整个 boxes 张量只向主机拷贝一次，同时保留原有的字典视图以兼容旧代码。
+"""
+
+import numpy as np
+from typing import Dict, Iterator, List, Optional, Tuple
+
+from spatial import SpatialIndex
+
+
+def nms_indices(xyxy: np.ndarray, scores: np.ndarray, cls_ids: np.ndarray,
+                iou_threshold: float = 0.5, metric: str = 'iou') -> np.ndarray:
+    """
+    按类别的贪心非极大值抑制
+
+    参数:
+        xyxy: (N, 4) 边界框
+        scores: (N,) 置信度
+        cls_ids: (N,) 类别ID，不同类别的框互不抑制
+        iou_threshold: 重叠阈值
+        metric: 'iou' 交并比；'ios' 交集 / 较小框面积（切片边缘被截断的框与完整框的
+                IoU 很低，但几乎完全被完整框包含）
+
+    返回:
+        保留的下标（按置信度从高到低）
+    """
+    if len(xyxy) == 0:
+        return np.empty(0, dtype=np.int64)
+
+    # 按类别平移坐标，使不同类别的框不可能重叠，一次处理所有类别
+    span = float(xyxy.max() - xyxy.min()) + 1
+    boxes = xyxy.astype(np.float32) + (cls_ids.astype(np.float32) * span)[:, None]
+    x1, y1, x2, y2 = boxes.T
+    areas = (x2 - x1) * (y2 - y1)
+    order = np.argsort(-scores, kind='stable')
+
+    keep = []
+    while order.size:
+        i = order[0]
+        keep.append(i)
+        rest = order[1:]
+        w = np.clip(np.minimum(x2[i], x2[rest]) - np.maximum(x1[i], x1[rest]), 0, None)
+        h = np.clip(np.minimum(y2[i], y2[rest]) - np.maximum(y1[i], y1[rest]), 0, None)
+        inter = w * h
+        if metric == 'ios':
+            overlap = inter / (np.minimum(areas[i], areas[rest]) + 1e-9)
+        else:
+            overlap = inter / (areas[i] + areas[rest] - inter + 1e-9)
+        order = rest[overlap <= iou_threshold]
+    return np.array(keep, dtype=np.int64)
+
+
+# 每个检测框一条记录
+DETECTION_DTYPE = np.dtype([
+    ('x1', np.float32),
+    ('y1', np.float32),
+    ('x2', np.float32),
+    ('y2', np.float32),
+    ('conf', np.float32),
+    ('cls', np.int32),
+])
+
+
+class Detections:
+    """
+    一帧的检测结果（只读，数组存储）
+
+    兼容原来的 List[Dict] 用法：
+        for det in detections:
+            det['name'], det['confidence'], det['bbox'], det['center']
+    """
+
+    __slots__ = ('data', 'class_names', '_class_index', '_centers', '_spatial')
+
+    def __init__(self, data: np.ndarray, class_names: Dict[int, str]):
+        """
+        参数:
+            data: DETECTION_DTYPE 结构化数组
+            class_names: 类别ID -> 类别名称
+        """
+        data.flags.writeable = False
+        self.data = data
+        self.class_names = class_names
+        self._class_index = None
+        self._centers = None
+        self._spatial = None
+
+    # ========== 构造 ==========
+
+    @classmethod
+    def empty(cls, class_names: Dict[int, str]) -> 'Detections':
+        """空结果"""
+        return cls(np.empty(0, dtype=DETECTION_DTYPE), class_names)
+
+    @classmethod
+    def from_arrays(cls, xyxy: np.ndarray, conf: np.ndarray, cls_ids: np.ndarray,
+                    class_names: Dict[int, str]) -> 'Detections':
+        """
+        由坐标、置信度、类别数组构造
+
+        参数:
+            xyxy: (N, 4) 边界框
+            conf: (N,) 置信度
+            cls_ids: (N,) 类别ID
+        """
+        xyxy = np.asarray(xyxy, dtype=np.float32).reshape(-1, 4)
+        data = np.empty(len(xyxy), dtype=DETECTION_DTYPE)
+        data['x1'] = xyxy[:, 0]
+        data['y1'] = xyxy[:, 1]
+        data['x2'] = xyxy[:, 2]
+        data['y2'] = xyxy[:, 3]
+        data['conf'] = np.asarray(conf, dtype=np.float32).reshape(-1)
+        data['cls'] = np.asarray(cls_ids).reshape(-1).astype(np.int32)
+        return cls(data, class_names)
+
+    @classmethod
+    def from_boxes_array(cls, boxes: np.ndarray, class_names: Dict[int, str]) -> 'Detections':
+        """
+        由 (N, 6) 数组 [x1, y1, x2, y2, conf, cls] 构造（ultralytics Boxes.data 的格式）
+        """
+        boxes = np.asarray(boxes, dtype=np.float32).reshape(-1, 6)
+        return cls.from_arrays(boxes[:, :4], boxes[:, 4], boxes[:, 5], class_names)
+
+    @classmethod
+    def from_result(cls, result, class_names: Dict[int, str]) -> 'Detections':
+        """
+        解析一个 ultralytics Results 对象
+
+        整个 boxes.data 张量一次性拷贝到主机，而不是每个框各同步一次
+        """
+        boxes = result.boxes
+        if boxes is None or len(boxes) == 0:
+            return cls.empty(class_names)
+        return cls.from_boxes_array(boxes.data.cpu().numpy(), class_names)
+
+    @classmethod
+    def concatenate(cls, parts: List['Detections'], class_names: Dict[int, str]) -> 'Detections':
+        """合并多个检测结果"""
+        if not parts:
+            return cls.empty(class_names)
+        return cls(np.concatenate([p.data for p in parts]), class_names)
+
+    # ========== 变换 ==========
+
+    def offset(self, dx: int, dy: int) -> 'Detections':
+        """平移所有检测框（裁剪区域坐标 -> 全屏坐标）"""
+        if dx == 0 and dy == 0:
+            return self
+        data = self.data.copy()
+        data['x1'] += dx
+        data['x2'] += dx
+        data['y1'] += dy
+        data['y2'] += dy
+        return Detections(data, self.class_names)
+
+    def nms(self, iou_threshold: float = 0.5, metric: str = 'iou') -> 'Detections':
+        """
+        按类别做非极大值抑制（用于合并多个重叠区域的检测结果）
+
+        参数:
+            iou_threshold: 同类别两个框重叠超过该值时只保留置信度高的
+            metric: 'iou' 或 'ios'（见 nms_indices）
+        """
+        if len(self.data) < 2:
+            return self
+        keep = nms_indices(self.xyxy, self.data['conf'], self.data['cls'], iou_threshold, metric)
+        return Detections(self.data[keep], self.class_names)
+
+    def filter_classes(self, class_ids, exclude: bool = False) -> 'Detections':
+        """
+        按类别ID筛选
+
+        参数:
+            class_ids: 类别ID集合
+            exclude: True 表示去掉这些类别
+        """
+        mask = np.isin(self.data['cls'], np.fromiter(class_ids, dtype=np.int32))
+        if exclude:
+            mask = ~mask
+        if mask.all():
+            return self
+        return Detections(self.data[mask], self.class_names)
+
+    def filter_confidence(self, thresholds: np.ndarray) -> 'Detections':
+        """
+        按类别置信度阈值筛选
+
+        参数:
+            thresholds: 按类别ID索引的阈值数组
+        """
+        mask = self.data['conf'] >= thresholds[self.data['cls']]
+        if mask.all():
+            return self
+        return Detections(self.data[mask], self.class_names)
+
+    # ========== 数组视图 ==========
+
+    @property
+    def xyxy(self) -> np.ndarray:
+        """(N, 4) float32 边界框"""
+        d = self.data
+        return np.stack([d['x1'], d['y1'], d['x2'], d['y2']], axis=1)
+
+    @property
+    def confidence(self) -> np.ndarray:
+        """(N,) 置信度"""
+        return self.data['conf']
+
+    @property
+    def class_id(self) -> np.ndarray:
+        """(N,) 类别ID"""
+        return self.data['cls']
+
+    @property
+    def centers(self) -> np.ndarray:
+        """(N, 2) int 中心点（与旧版字典中的 center 取整方式一致）"""
+        if self._centers is None:
+            d = self.data
+            centers = np.empty((len(d), 2), dtype=np.int64)
+            centers[:, 0] = (d['x1'] + d['x2']) / 2
+            centers[:, 1] = (d['y1'] + d['y2']) / 2
+            centers.flags.writeable = False
+            self._centers = centers
+        return self._centers
+
+    # ========== 按类别查询 ==========
+
+    def class_ids_for(self, name: str) -> List[int]:
+        """类别名称 -> 类别ID列表"""
+        return [cid for cid, cname in self.class_names.items() if cname == name]
+
+    def indices_of(self, name: str) -> np.ndarray:
+        """指定类别的检测框下标"""
+        if self._class_index is None:
+            # 按类别ID建立下标索引（首次使用时构建一次）
+            index = {}
+            cls_ids = self.data['cls']
+            if len(cls_ids):
+                order = np.argsort(cls_ids, kind='stable')
+                uniq, starts = np.unique(cls_ids[order], return_index=True)
+                bounds = list(starts[1:]) + [len(order)]
+                for cid, start, end in zip(uniq, starts, bounds):
+                    index[int(cid)] = order[start:end]
+            self._class_index = index
+
+        ids = self.class_ids_for(name)
+        if len(ids) == 1:
+            return self._class_index.get(ids[0], np.empty(0, dtype=np.int64))
+        parts = [self._class_index[cid] for cid in ids if cid in self._class_index]
+        if not parts:
+            return np.empty(0, dtype=np.int64)
+        return np.sort(np.concatenate(parts))
+
+    def by_name(self, name: str) -> 'Detections':
+        """筛选出指定类别的检测结果"""
+        return Detections(self.data[self.indices_of(name)], self.class_names)
+
+    def first_center(self, name: str) -> Optional[Tuple[int, int]]:
+        """指定类别的第一个中心点，未检测到返回 None"""
+        idx = self.indices_of(name)
+        if len(idx) == 0:
+            return None
+        cx, cy = self.centers[idx[0]]
+        return (int(cx), int(cy))
+
+    def centers_by_name(self, name: str) -> List[Tuple[int, int]]:
+        """指定类别的全部中心点"""
+        return [(int(cx), int(cy)) for cx, cy in self.centers[self.indices_of(name)]]
+
+    def group_by_name(self) -> Dict[str, List[Tuple[int, int]]]:
+        """按类别分组的中心点 {'类别名': [(x, y), ...]}"""
+        result = {}
+        names = self.class_names
+        for cid, (cx, cy) in zip(self.data['cls'], self.centers):
+            result.setdefault(names[int(cid)], []).append((int(cx), int(cy)))
+        return result
+
+    # ========== 空间查询 ==========
+
+    @property
+    def spatial(self) -> SpatialIndex:
+        """中心点空间索引（首次使用时构建一次）"""
+        if self._spatial is None:
+            self._spatial = SpatialIndex(self)
+        return self._spatial
+
+    def _center_list(self, idx) -> List[Tuple[int, int]]:
+        return [(int(cx), int(cy)) for cx, cy in self.centers[idx]]
+
+    def nearest_center(self, name: Optional[str], point: Tuple[int, int]) -> Optional[Tuple[int, int]]:
+        """距离 point 最近的指定类别中心点，name 为 None 时不限类别"""
+        i = self.spatial.nearest(point, name)
+        if i is None:
+            return None
+        cx, cy = self.centers[i]
+        return (int(cx), int(cy))
+
+    def k_nearest_centers(self, name: Optional[str], point: Tuple[int, int], k: int) -> List[Tuple[int, int]]:
+        """距离 point 最近的 k 个中心点（由近到远）"""
+        return self._center_list(self.spatial.k_nearest(point, k, name))
+
+    def centers_within_radius(self, name: Optional[str], point: Tuple[int, int],
+                              radius: float) -> List[Tuple[int, int]]:
+        """与 point 距离不超过 radius 的中心点（由近到远）"""
+        return self._center_list(self.spatial.within_radius(point, radius, name))
+
+    def centers_within_box(self, name: Optional[str], box: Tuple[int, int, int, int]) -> List[Tuple[int, int]]:
+        """位于矩形 (x1, y1, x2, y2) 内的中心点"""
+        return self._center_list(self.spatial.within_box(box, name))
+
+    # ========== 字典视图（兼容旧接口） ==========
+
+    def _as_dict(self, i: int) -> Dict:
+        rec = self.data[i]
+        cx, cy = self.centers[i]
+        return {
+            'name': self.class_names[int(rec['cls'])],
+            'confidence': float(rec['conf']),
+            'bbox': [int(rec['x1']), int(rec['y1']), int(rec['x2']), int(rec['y2'])],
+            'center': (int(cx), int(cy))
+        }
+
+    def to_dicts(self) -> List[Dict]:
+        """转换为旧版的字典列表"""
+        return [self._as_dict(i) for i in range(len(self.data))]
+
+    def __len__(self) -> int:
+        return len(self.data)
+
+    def __bool__(self) -> bool:
+        return len(self.data) > 0
+
+    def __iter__(self) -> Iterator[Dict]:
+        for i in range(len(self.data)):
+            yield self._as_dict(i)
+
+    def __getitem__(self, i: int) -> Dict:
+        if isinstance(i, slice):
+            return Detections(self.data[i], self.class_names)
+        return self._as_dict(i)
+
+    def __repr__(self) -> str:
+        return f"Detections({len(self)} boxes)"
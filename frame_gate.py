@@ -0,0 +1,107 @@
+"""
+画面变化检测
+
+在推理前比较当前画面与上一次推理时的画面，画面基本没变时直接复用上一次的检测结果。
+比较使用缩小后的灰度图（每个格子约 20x20 像素），开销远小于一次推理。
+"""
+
+import threading
+import time
+from typing import Dict, Hashable, List, Optional, Tuple
+
+import cv2
+import numpy as np
+
+
+class FrameChangeGate:
+    """
+    画面变化门控
+
+    用法:
+        sig = gate.signature(frames)
+        detections = gate.lookup(key, sig)
+        if detections is None:
+            detections = 推理(frames)
+            gate.store(key, sig, detections)
+    """
+
+    def __init__(self, threshold: float = 8.0, grid: Tuple[int, int] = (96, 54),
+                 max_reuse_age: float = 1.0):
+        """
+        参数:
+            threshold: 任一格子的灰度变化（0-255）超过该值即认为画面变化
+            grid: 缩小后的尺寸 (宽, 高)
+            max_reuse_age: 结果最长复用时间（秒），超过后即使画面没变也重新推理
+        """
+        self.threshold = threshold
+        self.grid = grid
+        self.max_reuse_age = max_reuse_age
+        self._entries: Dict[Hashable, tuple] = {}  # key -> (签名, 检测结果, 推理时间)
+        self._lock = threading.Lock()
+        self.checks = 0
+        self.skips = 0
+
+    def signature(self, frames: List[np.ndarray]) -> List[np.ndarray]:
+        """计算画面签名（每张图像缩小后的灰度图）"""
+        sigs = []
+        for frame in frames:
+            h, w = frame.shape[:2]
+            gw, gh = self.grid
+            size = (max(1, min(gw, w)), max(1, min(gh, h)))
+            small = cv2.resize(frame, size, interpolation=cv2.INTER_AREA)
+            sigs.append(cv2.cvtColor(small, cv2.COLOR_BGR2GRAY))
+        return sigs
+
+    def difference(self, a: List[np.ndarray], b: List[np.ndarray]) -> float:
+        """两个签名之间最大的格子灰度差，尺寸不同时返回 inf"""
+        if len(a) != len(b):
+            return float('inf')
+        diff = 0.0
+        for x, y in zip(a, b):
+            if x.shape != y.shape:
+                return float('inf')
+            diff = max(diff, float(cv2.absdiff(x, y).max()))
+        return diff
+
+    def lookup(self, key: Hashable, sig: List[np.ndarray]):
+        """
+        画面未变化时返回上一次的检测结果，否则返回 None
+        """
+        with self._lock:
+            self.checks += 1
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            prev_sig, detections, timestamp = entry
+            if time.monotonic() - timestamp > self.max_reuse_age:
+                return None
+            if self.difference(sig, prev_sig) > self.threshold:
+                return None
+            self.skips += 1
+            return detections
+
+    def store(self, key: Hashable, sig: List[np.ndarray], detections):
+        """记录本次推理的画面签名和结果"""
+        with self._lock:
+            self._entries[key] = (sig, detections, time.monotonic())
+
+    def clear(self):
+        """清除所有记录"""
+        with self._lock:
+            self._entries.clear()
+
+    def get_stats(self) -> Dict[str, float]:
+        """
+        返回:
+            {'checks': 检查次数, 'skips': 跳过推理次数, 'skip_rate': 跳过比例}
+        """
+        return {
+            'checks': self.checks,
+            'skips': self.skips,
+            'skip_rate': self.skips / self.checks if self.checks else 0.0
+        }
+
+    def reset_stats(self):
+        """重置统计"""
+        self.checks = 0
+        self.skips = 0
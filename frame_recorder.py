@@ -0,0 +1,171 @@
+"""
+最近画面记录
+
+在固定大小、预先分配的环形缓冲区中保存最近 N 帧（缩小后的）画面和检测结果，
+脚本卡住或出错时导出到磁盘，查看检测器当时看到了什么。
+运行几个小时内存占用也不会变化: 写入时只往已分配的数组里拷贝，不创建新数组。
+
+导出的目录可以直接作为图片目录回放: ScreenDetector(frame_source='frame_dumps/20260101_120000_000')
+"""
+
+import json
+import os
+import threading
+import time
+from datetime import datetime
+from typing import List, Optional, Tuple
+
+import cv2
+import numpy as np
+
+from detections import DETECTION_DTYPE, Detections
+
+
+class FrameRingBuffer:
+    """画面与检测结果的环形缓冲区"""
+
+    def __init__(self, capacity: int = 120, frame_size: Tuple[int, int] = (480, 270),
+                 max_detections: int = 100):
+        """
+        参数:
+            capacity: 保存的帧数
+            frame_size: 保存的画面尺寸 (宽, 高)，画面按比例缩小后放入左上角
+            max_detections: 每帧最多保存的检测框数
+        """
+        w, h = frame_size
+        self.capacity = capacity
+        self.frame_size = frame_size
+        self.frames = np.zeros((capacity, h, w, 3), dtype=np.uint8)
+        self.scales = np.zeros(capacity, dtype=np.float32)        # 屏幕坐标 -> 缓冲区坐标的缩放比例
+        self.timestamps = np.zeros(capacity, dtype=np.float64)    # time.time()
+        self.detections = np.zeros((capacity, max_detections), dtype=DETECTION_DTYPE)
+        self.counts = np.zeros(capacity, dtype=np.int32)
+        self._next = 0
+        self._size = 0
+        self._lock = threading.Lock()
+
+    @property
+    def nbytes(self) -> int:
+        """缓冲区占用的内存（字节）"""
+        return (self.frames.nbytes + self.scales.nbytes + self.timestamps.nbytes
+                + self.detections.nbytes + self.counts.nbytes)
+
+    def __len__(self) -> int:
+        return self._size
+
+    def add(self, frames: List[np.ndarray], offsets, detections: Detections,
+            screen_shape: Optional[Tuple[int, int]] = None, timestamp: Optional[float] = None):
+        """
+        记录一次检测
+
+        参数:
+            frames: 推理使用的图像（全屏图像，或各区域的截图）
+            offsets: 每张图像在屏幕上的偏移
+            detections: 检测结果（全屏坐标）
+            screen_shape: 屏幕尺寸 (高, 宽)，区域截图时用于确定缩放比例
+            timestamp: 时间（time.time()），None表示当前时间
+        """
+        if timestamp is None:
+            timestamp = time.time()
+        h, w = self.frames.shape[1:3]
+
+        # 画面在屏幕上覆盖的范围
+        if screen_shape is not None:
+            extent_h, extent_w = screen_shape[:2]
+        else:
+            extent_h = max(dy + f.shape[0] for f, (_, dy) in zip(frames, offsets))
+            extent_w = max(dx + f.shape[1] for f, (dx, _) in zip(frames, offsets))
+        scale = min(w / extent_w, h / extent_h)
+
+        with self._lock:
+            i = self._next
+            slot = self.frames[i]
+            single = len(frames) == 1 and offsets[0] == (0, 0)
+            if single and frames[0].shape[:2] == (extent_h, extent_w) \
+                    and (int(extent_w * scale), int(extent_h * scale)) == (w, h):
+                # 宽高比一致，直接缩放到缓冲区
+                cv2.resize(frames[0], (w, h), dst=slot, interpolation=cv2.INTER_AREA)
+            else:
+                slot[:] = 0
+                for frame, (dx, dy) in zip(frames, offsets):
+                    x1, y1 = int(dx * scale), int(dy * scale)
+                    tw = min(int(frame.shape[1] * scale), w - x1)
+                    th = min(int(frame.shape[0] * scale), h - y1)
+                    if tw > 0 and th > 0:
+                        cv2.resize(frame, (tw, th), dst=slot[y1:y1 + th, x1:x1 + tw],
+                                   interpolation=cv2.INTER_AREA)
+
+            n = min(len(detections), self.detections.shape[1])
+            self.detections[i, :n] = detections.data[:n]
+            self.counts[i] = n
+            self.scales[i] = scale
+            self.timestamps[i] = timestamp
+
+            self._next = (i + 1) % self.capacity
+            self._size = min(self._size + 1, self.capacity)
+
+    def _order(self) -> List[int]:
+        """按时间顺序排列的槽位"""
+        start = (self._next - self._size) % self.capacity
+        return [(start + k) % self.capacity for k in range(self._size)]
+
+    def dump(self, directory: str, class_names, annotate: bool = False) -> str:
+        """
+        导出到磁盘
+
+        参数:
+            directory: 上级目录，在其中创建以当前时间（毫秒）命名的子目录
+            class_names: 类别ID -> 类别名称
+            annotate: 是否在图片上画出检测框（回放检测时应为 False）
+
+        返回:
+            导出目录
+        """
+        with self._lock:
+            order = self._order()
+            # 花式索引会拷贝，导出期间可以继续写入
+            frames = self.frames[order]
+            scales = self.scales[order]
+            timestamps = self.timestamps[order]
+            dets = [self.detections[i, :self.counts[i]].copy() for i in order]
+
+        # 精确到毫秒，同一毫秒内多次导出时加序号，不覆盖已有的导出
+        stamp = datetime.now().strftime("%Y%m%d_%H%M%S_%f")[:-3]
+        out_dir = os.path.join(directory, stamp)
+        suffix = 1
+        while True:
+            try:
+                os.makedirs(out_dir)
+                break
+            except FileExistsError:
+                suffix += 1
+                out_dir = os.path.join(directory, f"{stamp}_{suffix}")
+        index = []
+        for k, (frame, scale, ts, data) in enumerate(zip(frames, scales, timestamps, dets)):
+            detections = Detections(data, class_names)
+            if annotate:
+                for rec in data:
+                    p1 = (int(rec['x1'] * scale), int(rec['y1'] * scale))
+                    p2 = (int(rec['x2'] * scale), int(rec['y2'] * scale))
+                    cv2.rectangle(frame, p1, p2, (0, 255, 0), 1)
+                    cv2.putText(frame, class_names[int(rec['cls'])], (p1[0], p1[1] - 2),
+                                cv2.FONT_HERSHEY_SIMPLEX, 0.35, (0, 255, 0), 1)
+            name = f"{k:04d}.jpg"
+            cv2.imwrite(os.path.join(out_dir, name), frame)
+            index.append({
+                'file': name,
+                'timestamp': float(ts),
+                'time': datetime.fromtimestamp(ts).strftime("%H:%M:%S.%f")[:-3],
+                'scale': float(scale),
+                'detections': detections.to_dicts(),   # 全屏坐标
+            })
+
+        with open(os.path.join(out_dir, 'detections.json'), 'w', encoding='utf-8') as f:
+            json.dump(index, f, ensure_ascii=False, indent=1)
+        return out_dir
+
+    def clear(self):
+        """清空（不释放内存）"""
+        with self._lock:
+            self._next = 0
+            self._size = 0
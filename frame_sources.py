@@ -0,0 +1,544 @@
+"""
+图像帧来源
+
+把"截图"抽象成可替换的 FrameSource，检测器和代理服务器按名称或实例选择:
+- 'mss':       mss 快速截屏（Windows / Linux / macOS）
+- 'imagegrab': PIL.ImageGrab（原有实现，兼容性最好）
+- 'xshm':      Linux X11 共享内存截屏（XShmGetImage）
+- 'video':     视频文件回放
+- 'images':    图片目录回放
+
+所有来源返回 BGR 图像，并尽量写入复用的缓冲区。
+注意: 返回的图像在下一次 grab() 之前有效，需要长期保存请 copy()。
+"""
+
+import ctypes
+import ctypes.util
+import glob
+import os
+import sys
+import threading
+import time
+from abc import ABC, abstractmethod
+from collections import OrderedDict
+from typing import Dict, Optional, Tuple, Union
+
+import cv2
+import numpy as np
+
+Region = Optional[Tuple[int, int, int, int]]
+
+
+class FrameSource(ABC):
+    """图像帧来源基类"""
+
+    name = "base"
+    max_buffers = 4             # 每个线程最多保留的缓冲区数（按尺寸区分）
+
+    def __init__(self):
+        self._buffers: Dict[int, OrderedDict] = {}   # 线程ID -> {(高, 宽, 通道): 缓冲区}
+        self._buffers_lock = threading.Lock()
+        self.latency = None     # LatencyRecorder，设置后记录颜色转换耗时（'convert'）
+
+    @abstractmethod
+    def grab(self, region: Region = None) -> np.ndarray:
+        """
+        获取一帧
+
+        参数:
+            region: 截取区域 (x1, y1, x2, y2)，None表示全屏
+
+        返回:
+            BGR 图像（复用缓冲区）
+        """
+        pass
+
+    def close(self):
+        """释放资源"""
+        pass
+
+    def _buffer(self, height: int, width: int, channels: int = 3) -> np.ndarray:
+        """
+        获取当前线程可复用的缓冲区
+
+        按线程分开，脚本线程和后台检测线程同时截图不会互相覆盖；
+        按尺寸区分，每个线程只保留最近使用的 max_buffers 个尺寸，已退出线程的缓冲区随之释放
+        """
+        shape = (height, width, channels)
+        ident = threading.get_ident()
+        with self._buffers_lock:
+            buffers = self._buffers.get(ident)
+            if buffers is None:
+                alive = {t.ident for t in threading.enumerate()}
+                for dead in [i for i in self._buffers if i not in alive]:
+                    del self._buffers[dead]
+                buffers = self._buffers[ident] = OrderedDict()
+            buf = buffers.get(shape)
+            if buf is None:
+                buf = buffers[shape] = np.empty(shape, dtype=np.uint8)
+                while len(buffers) > self.max_buffers:
+                    buffers.popitem(last=False)
+            else:
+                buffers.move_to_end(shape)
+        return buf
+
+    def _bgra_to_bgr(self, bgra: np.ndarray) -> np.ndarray:
+        """BGRA -> BGR，直接写入复用缓冲区"""
+        t0 = time.perf_counter()
+        h, w = bgra.shape[:2]
+        dst = self._buffer(h, w)
+        cv2.cvtColor(bgra, cv2.COLOR_BGRA2BGR, dst=dst)
+        if self.latency is not None:
+            self.latency.record_since('convert', t0)
+        return dst
+
+    @staticmethod
+    def _crop(frame: np.ndarray, region: Region) -> np.ndarray:
+        """按区域裁剪（返回视图，不拷贝）"""
+        if not region:
+            return frame
+        x1, y1, x2, y2 = region
+        return frame[y1:y2, x1:x2]
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+    def __repr__(self) -> str:
+        return f"{self.__class__.__name__}()"
+
+
+# ============================================
+# 屏幕截图
+# ============================================
+
+class ImageGrabFrameSource(FrameSource):
+    """PIL.ImageGrab 截屏（原有实现）"""
+
+    name = "imagegrab"
+
+    def grab(self, region: Region = None) -> np.ndarray:
+        from PIL import ImageGrab
+
+        screenshot = ImageGrab.grab(bbox=region) if region else ImageGrab.grab()
+        t0 = time.perf_counter()
+        rgb = np.asarray(screenshot)
+        h, w = rgb.shape[:2]
+        dst = self._buffer(h, w)
+        cv2.cvtColor(rgb, cv2.COLOR_RGB2BGR, dst=dst)
+        if self.latency is not None:
+            self.latency.record_since('convert', t0)
+        return dst
+
+
+class MSSFrameSource(FrameSource):
+    """
+    mss 快速截屏
+
+    需要安装: pip install mss
+    mss 的句柄不能跨线程使用，这里每个线程各建一个
+    """
+
+    name = "mss"
+
+    def __init__(self, monitor: int = 1):
+        """
+        参数:
+            monitor: 显示器编号（1为主显示器）
+        """
+        super().__init__()
+        import mss  # noqa: F401  尽早暴露缺失的依赖
+        self.monitor = monitor
+        self._local = threading.local()
+
+    def _sct(self):
+        sct = getattr(self._local, 'sct', None)
+        if sct is None:
+            import mss
+            sct = mss.mss()
+            self._local.sct = sct
+        return sct
+
+    def grab(self, region: Region = None) -> np.ndarray:
+        sct = self._sct()
+        if region:
+            x1, y1, x2, y2 = region
+            area = {'left': x1, 'top': y1, 'width': x2 - x1, 'height': y2 - y1}
+        else:
+            area = sct.monitors[self.monitor]
+        shot = sct.grab(area)
+        bgra = np.frombuffer(shot.raw, dtype=np.uint8).reshape(shot.height, shot.width, 4)
+        return self._bgra_to_bgr(bgra)
+
+    def close(self):
+        sct = getattr(self._local, 'sct', None)
+        if sct is not None:
+            sct.close()
+            self._local.sct = None
+
+
+class _XImage(ctypes.Structure):
+    """XImage 结构体（只声明需要读取的前部字段）"""
+    _fields_ = [
+        ('width', ctypes.c_int),
+        ('height', ctypes.c_int),
+        ('xoffset', ctypes.c_int),
+        ('format', ctypes.c_int),
+        ('data', ctypes.c_void_p),
+        ('byte_order', ctypes.c_int),
+        ('bitmap_unit', ctypes.c_int),
+        ('bitmap_bit_order', ctypes.c_int),
+        ('bitmap_pad', ctypes.c_int),
+        ('depth', ctypes.c_int),
+        ('bytes_per_line', ctypes.c_int),
+        ('bits_per_pixel', ctypes.c_int),
+    ]
+
+
+class _XShmSegmentInfo(ctypes.Structure):
+    _fields_ = [
+        ('shmseg', ctypes.c_ulong),
+        ('shmid', ctypes.c_int),
+        ('shmaddr', ctypes.c_void_p),
+        ('readOnly', ctypes.c_int),
+    ]
+
+
+class XShmFrameSource(FrameSource):
+    """
+    Linux X11 共享内存截屏
+
+    XShmGetImage 直接把根窗口写入共享内存段，再从共享内存转换为 BGR，
+    整个过程只有一次拷贝。需要 X11 环境（DISPLAY）及 libX11 / libXext。
+    """
+
+    name = "xshm"
+
+    _ZPIXMAP = 2
+    _ALL_PLANES = 0xFFFFFFFF
+    _IPC_PRIVATE = 0
+    _IPC_CREAT = 0o1000
+    _IPC_RMID = 0
+
+    def __init__(self, display: Optional[str] = None):
+        """
+        参数:
+            display: X 显示名（None表示使用 DISPLAY 环境变量）
+        """
+        super().__init__()
+        if not sys.platform.startswith('linux'):
+            raise RuntimeError("XShm 截屏仅支持 Linux")
+
+        x11 = ctypes.util.find_library('X11')
+        xext = ctypes.util.find_library('Xext')
+        if not x11 or not xext:
+            raise RuntimeError("未找到 libX11 / libXext")
+        self._x11 = ctypes.CDLL(x11)
+        self._xext = ctypes.CDLL(xext)
+        self._libc = ctypes.CDLL(ctypes.util.find_library('c'), use_errno=True)
+        self._setup_prototypes()
+
+        self._display = self._x11.XOpenDisplay(display.encode() if display else None)
+        if not self._display:
+            raise RuntimeError(f"无法连接 X 显示: {display or os.environ.get('DISPLAY')}")
+        if not self._xext.XShmQueryExtension(self._display):
+            self._x11.XCloseDisplay(self._display)
+            self._display = None
+            raise RuntimeError("X 服务器不支持 MIT-SHM 扩展")
+
+        screen = self._x11.XDefaultScreen(self._display)
+        self._root = self._x11.XDefaultRootWindow(self._display)
+        self.width = self._x11.XDisplayWidth(self._display, screen)
+        self.height = self._x11.XDisplayHeight(self._display, screen)
+
+        self._shminfo = _XShmSegmentInfo()
+        self._image = self._xext.XShmCreateImage(
+            self._display,
+            self._x11.XDefaultVisual(self._display, screen),
+            self._x11.XDefaultDepth(self._display, screen),
+            self._ZPIXMAP, None, ctypes.byref(self._shminfo),
+            self.width, self.height
+        )
+        if not self._image:
+            self.close()
+            raise RuntimeError("XShmCreateImage 失败")
+        image = self._image.contents
+        if image.bits_per_pixel != 32:
+            self.close()
+            raise RuntimeError(f"不支持的像素格式: {image.bits_per_pixel} bpp")
+
+        size = image.bytes_per_line * image.height
+        shmid = self._libc.shmget(self._IPC_PRIVATE, size, self._IPC_CREAT | 0o600)
+        if shmid < 0:
+            self.close()
+            raise RuntimeError(f"shmget 失败: errno {ctypes.get_errno()}")
+        self._shminfo.shmid = shmid
+        addr = self._libc.shmat(shmid, None, 0)
+        if addr in (None, ctypes.c_void_p(-1).value):
+            self._libc.shmctl(shmid, self._IPC_RMID, None)
+            self.close()
+            raise RuntimeError(f"shmat 失败: errno {ctypes.get_errno()}")
+        self._shminfo.shmaddr = addr
+        self._shminfo.readOnly = 0
+        image.data = addr
+
+        self._xext.XShmAttach(self._display, ctypes.byref(self._shminfo))
+        self._x11.XSync(self._display, 0)
+        # 标记删除，所有进程 detach 后自动释放
+        self._libc.shmctl(shmid, self._IPC_RMID, None)
+        self._attached = True
+
+        # 共享内存的 numpy 视图 (H, W, 4) BGRA
+        raw = (ctypes.c_uint8 * size).from_address(addr)
+        self._bgra = np.ctypeslib.as_array(raw).reshape(
+            image.height, image.bytes_per_line // 4, 4)[:, :image.width]
+        self._lock = threading.Lock()
+
+    def _setup_prototypes(self):
+        x11, xext, libc = self._x11, self._xext, self._libc
+        x11.XOpenDisplay.restype = ctypes.c_void_p
+        x11.XOpenDisplay.argtypes = [ctypes.c_char_p]
+        x11.XDefaultScreen.argtypes = [ctypes.c_void_p]
+        x11.XDefaultRootWindow.restype = ctypes.c_ulong
+        x11.XDefaultRootWindow.argtypes = [ctypes.c_void_p]
+        x11.XDisplayWidth.argtypes = [ctypes.c_void_p, ctypes.c_int]
+        x11.XDisplayHeight.argtypes = [ctypes.c_void_p, ctypes.c_int]
+        x11.XDefaultVisual.restype = ctypes.c_void_p
+        x11.XDefaultVisual.argtypes = [ctypes.c_void_p, ctypes.c_int]
+        x11.XDefaultDepth.argtypes = [ctypes.c_void_p, ctypes.c_int]
+        x11.XSync.argtypes = [ctypes.c_void_p, ctypes.c_int]
+        x11.XCloseDisplay.argtypes = [ctypes.c_void_p]
+        x11.XDestroyImage.argtypes = [ctypes.POINTER(_XImage)]
+        xext.XShmQueryExtension.argtypes = [ctypes.c_void_p]
+        xext.XShmCreateImage.restype = ctypes.POINTER(_XImage)
+        xext.XShmCreateImage.argtypes = [
+            ctypes.c_void_p, ctypes.c_void_p, ctypes.c_uint, ctypes.c_int,
+            ctypes.c_char_p, ctypes.POINTER(_XShmSegmentInfo), ctypes.c_uint, ctypes.c_uint]
+        xext.XShmAttach.argtypes = [ctypes.c_void_p, ctypes.POINTER(_XShmSegmentInfo)]
+        xext.XShmDetach.argtypes = [ctypes.c_void_p, ctypes.POINTER(_XShmSegmentInfo)]
+        xext.XShmGetImage.argtypes = [
+            ctypes.c_void_p, ctypes.c_ulong, ctypes.POINTER(_XImage),
+            ctypes.c_int, ctypes.c_int, ctypes.c_ulong]
+        libc.shmget.restype = ctypes.c_int
+        libc.shmget.argtypes = [ctypes.c_int, ctypes.c_size_t, ctypes.c_int]
+        libc.shmat.restype = ctypes.c_void_p
+        libc.shmat.argtypes = [ctypes.c_int, ctypes.c_void_p, ctypes.c_int]
+        libc.shmdt.argtypes = [ctypes.c_void_p]
+        libc.shmctl.argtypes = [ctypes.c_int, ctypes.c_int, ctypes.c_void_p]
+
+    def grab(self, region: Region = None) -> np.ndarray:
+        with self._lock:
+            if not self._xext.XShmGetImage(self._display, self._root, self._image,
+                                           0, 0, self._ALL_PLANES):
+                raise RuntimeError("XShmGetImage 失败")
+            return self._bgra_to_bgr(self._crop(self._bgra, region))
+
+    def close(self):
+        if getattr(self, '_display', None) is None:
+            return
+        if getattr(self, '_attached', False):
+            self._xext.XShmDetach(self._display, ctypes.byref(self._shminfo))
+            self._attached = False
+        if getattr(self, '_image', None):
+            # XShm 图像的 destroy 不会释放 data（共享内存由下面的 shmdt 释放）
+            self._x11.XDestroyImage(self._image)
+            self._image = None
+        if self._shminfo.shmaddr:
+            self._libc.shmdt(self._shminfo.shmaddr)
+            self._shminfo.shmaddr = None
+        self._x11.XCloseDisplay(self._display)
+        self._display = None
+
+    def __del__(self):
+        try:
+            self.close()
+        except Exception:
+            pass
+
+
+# ============================================
+# 录像回放
+# ============================================
+
+class VideoFrameSource(FrameSource):
+    """视频文件回放，每次 grab 读取下一帧"""
+
+    name = "video"
+
+    def __init__(self, path: str, loop: bool = True):
+        """
+        参数:
+            path: 视频文件路径
+            loop: 播放完毕后是否从头开始
+        """
+        super().__init__()
+        self.path = path
+        self.loop = loop
+        self._cap = cv2.VideoCapture(path)
+        if not self._cap.isOpened():
+            raise RuntimeError(f"无法打开视频: {path}")
+        self._frame = None
+        self._lock = threading.Lock()
+
+    def grab(self, region: Region = None) -> np.ndarray:
+        with self._lock:
+            # 传入上一帧的缓冲区，OpenCV 会在尺寸一致时直接写入
+            ok, frame = self._cap.read(self._frame)
+            if not ok and self.loop:
+                self._cap.set(cv2.CAP_PROP_POS_FRAMES, 0)
+                ok, frame = self._cap.read(self._frame)
+            if not ok:
+                raise EOFError(f"视频已播放完毕: {self.path}")
+            self._frame = frame
+            return self._crop(frame, region)
+
+    def close(self):
+        self._cap.release()
+
+    def __repr__(self) -> str:
+        return f"VideoFrameSource({self.path!r})"
+
+
+class ImageDirFrameSource(FrameSource):
+    """
+    图片目录回放，按文件名顺序逐张返回
+
+    图片解码本身就是唯一的一次拷贝，不再额外复制到缓冲区
+    """
+
+    name = "images"
+
+    EXTENSIONS = ('.png', '.jpg', '.jpeg', '.bmp')
+
+    def __init__(self, directory: str, loop: bool = True):
+        """
+        参数:
+            directory: 图片目录
+            loop: 播放完毕后是否从头开始
+        """
+        super().__init__()
+        self.directory = directory
+        self.loop = loop
+        self.files = sorted(
+            f for f in glob.glob(os.path.join(directory, '*'))
+            if f.lower().endswith(self.EXTENSIONS)
+        )
+        if not self.files:
+            raise RuntimeError(f"目录中没有图片: {directory}")
+        self._index = 0
+        self._lock = threading.Lock()
+
+    def grab(self, region: Region = None) -> np.ndarray:
+        with self._lock:
+            if self._index >= len(self.files):
+                if not self.loop:
+                    raise EOFError(f"图片已回放完毕: {self.directory}")
+                self._index = 0
+            path = self.files[self._index]
+            self._index += 1
+        frame = cv2.imread(path, cv2.IMREAD_COLOR)
+        if frame is None:
+            raise RuntimeError(f"无法读取图片: {path}")
+        return self._crop(frame, region)
+
+    def __repr__(self) -> str:
+        return f"ImageDirFrameSource({self.directory!r})"
+
+
+# ============================================
+# 工厂函数
+# ============================================
+
+FRAME_SOURCES = {
+    'mss': MSSFrameSource,
+    'imagegrab': ImageGrabFrameSource,
+    'xshm': XShmFrameSource,
+    'video': VideoFrameSource,
+    'images': ImageDirFrameSource,
+}
+
+
+def _default_screen_source() -> str:
+    """当前平台的默认截屏方式"""
+    try:
+        import mss  # noqa: F401
+        return 'mss'
+    except ImportError:
+        pass
+    if sys.platform.startswith('linux'):
+        return 'xshm'
+    return 'imagegrab'
+
+
+def create_frame_source(source: Union[str, FrameSource, None] = 'auto', **kwargs) -> FrameSource:
+    """
+    按名称创建图像帧来源
+
+    参数:
+        source: FrameSource 实例；或名称 'auto' / 'mss' / 'imagegrab' / 'xshm'；
+                或视频文件路径 / 图片目录路径
+        **kwargs: 传给对应构造函数的参数
+
+    返回:
+        FrameSource 实例
+    """
+    if isinstance(source, FrameSource):
+        return source
+    if source is None or source == 'auto':
+        source = _default_screen_source()
+
+    if source in FRAME_SOURCES:
+        return FRAME_SOURCES[source](**kwargs)
+    if os.path.isdir(source):
+        return ImageDirFrameSource(source, **kwargs)
+    if os.path.isfile(source):
+        return VideoFrameSource(source, **kwargs)
+
+    raise ValueError(f"未知的图像来源: {source}（可选: {', '.join(FRAME_SOURCES)}，或视频/图片目录路径）")
+
+
+def benchmark_frame_source(source: Union[str, FrameSource], frames: int = 100,
+                           region: Region = None) -> Dict[str, float]:
+    """
+    测量截图耗时
+
+    参数:
+        source: 图像来源（名称、路径或实例）
+        frames: 测量帧数
+        region: 截取区域
+
+    返回:
+        {'frames', 'mean_ms', 'min_ms', 'max_ms', 'fps'}
+    """
+    frame_source = create_frame_source(source)
+    frame_source.grab(region)  # 预热，分配缓冲区
+
+    times = np.empty(frames)
+    for i in range(frames):
+        t0 = time.perf_counter()
+        frame_source.grab(region)
+        times[i] = time.perf_counter() - t0
+
+    if frame_source is not source:
+        frame_source.close()
+
+    return {
+        'frames': frames,
+        'mean_ms': float(times.mean() * 1000),
+        'min_ms': float(times.min() * 1000),
+        'max_ms': float(times.max() * 1000),
+        'fps': float(frames / times.sum()),
+    }
+
+
+if __name__ == "__main__":
+    names = sys.argv[1:] or ['auto']
+    for name in names:
+        try:
+            stats = benchmark_frame_source(name)
+            print(f"{name}: 平均 {stats['mean_ms']:.2f}ms, 最小 {stats['min_ms']:.2f}ms, "
+                  f"最大 {stats['max_ms']:.2f}ms, {stats['fps']:.1f} FPS")
+        except Exception as e:
+            print(f"{name}: 不可用 ({e})")
@@ -2,14 +2,14 @@
 游戏输入高级方案 - 绕过游戏保护
 
 PyAutoGUI在很多游戏中会被检测并屏蔽，需要使用更底层的输入方法
+
+pywin32 只在用到窗口消息和窗口查找时才导入，WindowsInput / BatchedWindowsInput
+传入 user32 替身后可以在非 Windows 系统上测试
 """
 
 import time
 import ctypes
 from ctypes import wintypes
-import win32api
-import win32con
-import win32gui
 
 
 # ============================================
@@ -30,8 +30,12 @@ class WindowsInput:
     # 键盘事件常量
     KEYEVENTF_KEYUP = 0x0002
 
-    def __init__(self):
-        self.user32 = ctypes.windll.user32
+    def __init__(self, user32=None):
+        """
+        参数:
+            user32: user32 接口（默认 ctypes.windll.user32，测试时可传入记录调用的替身）
+        """
+        self.user32 = user32 if user32 is not None else ctypes.windll.user32
 
     def get_screen_size(self):
         """获取屏幕尺寸"""
@@ -50,6 +54,20 @@ class WindowsInput:
             abs_x, abs_y, 0, 0
         )
 
+    def _button_flags(self, button):
+        """按钮对应的 (按下, 释放) 事件"""
+        if button == 'left':
+            return self.MOUSEEVENTF_LEFTDOWN, self.MOUSEEVENTF_LEFTUP
+        return self.MOUSEEVENTF_RIGHTDOWN, self.MOUSEEVENTF_RIGHTUP
+
+    def mouse_down(self, button='left'):
+        """在当前位置按下鼠标按钮"""
+        self.user32.mouse_event(self._button_flags(button)[0], 0, 0, 0, 0)
+
+    def mouse_up(self, button='left'):
+        """在当前位置释放鼠标按钮"""
+        self.user32.mouse_event(self._button_flags(button)[1], 0, 0, 0, 0)
+
     def click(self, x=None, y=None, button='left', delay=0.05):
         """
         点击鼠标
@@ -63,19 +81,12 @@ class WindowsInput:
             self.move_mouse(x, y)
             time.sleep(0.05)
 
-        if button == 'left':
-            down_flag = self.MOUSEEVENTF_LEFTDOWN
-            up_flag = self.MOUSEEVENTF_LEFTUP
-        else:
-            down_flag = self.MOUSEEVENTF_RIGHTDOWN
-            up_flag = self.MOUSEEVENTF_RIGHTUP
-
         # 按下
-        self.user32.mouse_event(down_flag, 0, 0, 0, 0)
+        self.mouse_down(button)
         time.sleep(delay)
 
         # 释放
-        self.user32.mouse_event(up_flag, 0, 0, 0, 0)
+        self.mouse_up(button)
 
     def double_click(self, x=None, y=None, delay=0.05):
         """双击"""
@@ -101,13 +112,223 @@ class WindowsInput:
             F1-F12: 0x70 - 0x7B
         """
         # 按下
-        self.user32.keybd_event(vk_code, 0, 0, 0)
+        self.key_down(vk_code)
         time.sleep(delay)
 
         # 释放
+        self.key_up(vk_code)
+
+    def key_down(self, vk_code):
+        """按下按键"""
+        self.user32.keybd_event(vk_code, 0, 0, 0)
+
+    def key_up(self, vk_code):
+        """释放按键"""
         self.user32.keybd_event(vk_code, 0, self.KEYEVENTF_KEYUP, 0)
 
 
+# ============================================
+# 方案1b: SendInput 批量发送
+# ============================================
+
+class MOUSEINPUT(ctypes.Structure):
+    _fields_ = [('dx', wintypes.LONG), ('dy', wintypes.LONG), ('mouseData', wintypes.DWORD),
+                ('dwFlags', wintypes.DWORD), ('time', wintypes.DWORD), ('dwExtraInfo', ctypes.c_size_t)]
+
+
+class KEYBDINPUT(ctypes.Structure):
+    _fields_ = [('wVk', wintypes.WORD), ('wScan', wintypes.WORD), ('dwFlags', wintypes.DWORD),
+                ('time', wintypes.DWORD), ('dwExtraInfo', ctypes.c_size_t)]
+
+
+class HARDWAREINPUT(ctypes.Structure):
+    _fields_ = [('uMsg', wintypes.DWORD), ('wParamL', wintypes.WORD), ('wParamH', wintypes.WORD)]
+
+
+class _INPUTUNION(ctypes.Union):
+    _fields_ = [('mi', MOUSEINPUT), ('ki', KEYBDINPUT), ('hi', HARDWAREINPUT)]
+
+
+class INPUT(ctypes.Structure):
+    _fields_ = [('type', wintypes.DWORD), ('u', _INPUTUNION)]
+
+
+INPUT_MOUSE = 0
+INPUT_KEYBOARD = 1
+
+
+class BatchedWindowsInput(WindowsInput):
+    """
+    使用 SendInput 发送输入
+
+    WindowsInput 按下和释放各是一次 mouse_event / keybd_event。这里把移动+按下+释放或一串按键
+    组装成 INPUT 数组，一次 SendInput 发出（系统保证同一批输入不会被其他输入插入）。
+    默认的 click(x, y)（按住 0.05 秒）为两次 SendInput: 移动+按下、释放；
+    移动和按下在同一批中发出，不再需要 WindowsInput 移动后的 0.05 秒等待。
+
+    屏幕尺寸不缓存: 每批含绝对移动的输入在组装时读取 GetSystemMetrics（只读系统已有的值，开销很小），
+    切换分辨率后的第一次点击就按新尺寸换算坐标。
+    """
+
+    def __init__(self, user32=None):
+        """
+        参数:
+            user32: user32 接口（默认 ctypes.windll.user32）
+        """
+        super().__init__(user32)
+        # 按钮和按键的 INPUT 不随坐标变化，组装一次后复用（SendInput 时会被复制进数组）
+        self._inputs = {}
+
+    # ========== 组装 INPUT ==========
+
+    def _mouse(self, flags, dx=0, dy=0) -> INPUT:
+        if dx or dy:
+            return INPUT(INPUT_MOUSE, _INPUTUNION(mi=MOUSEINPUT(dx, dy, 0, flags, 0, 0)))
+        item = self._inputs.get(('mouse', flags))
+        if item is None:
+            item = self._inputs[('mouse', flags)] = INPUT(INPUT_MOUSE, _INPUTUNION(mi=MOUSEINPUT(0, 0, 0, flags, 0, 0)))
+        return item
+
+    def _key(self, vk_code, flags=0) -> INPUT:
+        item = self._inputs.get((vk_code, flags))
+        if item is None:
+            item = self._inputs[(vk_code, flags)] = INPUT(INPUT_KEYBOARD, _INPUTUNION(ki=KEYBDINPUT(vk_code, 0, flags, 0, 0)))
+        return item
+
+    def _move(self, x, y) -> INPUT:
+        screen_width, screen_height = self.get_screen_size()
+        return self._mouse(self.MOUSEEVENTF_MOVE | self.MOUSEEVENTF_ABSOLUTE,
+                           int(x * 65535 / screen_width), int(y * 65535 / screen_height))
+
+    def send(self, inputs):
+        """
+        一次 SendInput 发出一组 INPUT
+
+        返回:
+            int: 系统实际插入的输入数（被其他线程阻塞时可能小于 len(inputs)）
+        """
+        count = len(inputs)
+        if not count:
+            return 0
+        return self.user32.SendInput(count, (INPUT * count)(*inputs), ctypes.sizeof(INPUT))
+
+    # ========== 输入 ==========
+
+    def move_mouse(self, x, y):
+        """移动鼠标到绝对坐标"""
+        self.send([self._move(x, y)])
+
+    def mouse_down(self, button='left'):
+        """在当前位置按下鼠标按钮"""
+        self.send([self._mouse(self._button_flags(button)[0])])
+
+    def mouse_up(self, button='left'):
+        """在当前位置释放鼠标按钮"""
+        self.send([self._mouse(self._button_flags(button)[1])])
+
+    def click(self, x=None, y=None, button='left', delay=0.05):
+        """
+        点击鼠标
+
+        参数:
+            x, y: 坐标（None则在当前位置点击）
+            button: 'left' 或 'right'
+            delay: 按下和释放之间的延迟，0 表示移动、按下、释放一次发出
+        """
+        down_flag, up_flag = self._button_flags(button)
+        inputs = [] if x is None or y is None else [self._move(x, y)]
+        inputs.append(self._mouse(down_flag))
+        if delay > 0:
+            self.send(inputs)
+            time.sleep(delay)
+            inputs = []
+        inputs.append(self._mouse(up_flag))
+        self.send(inputs)
+
+    def key_down(self, vk_code):
+        """按下按键"""
+        self.send([self._key(vk_code)])
+
+    def key_up(self, vk_code):
+        """释放按键"""
+        self.send([self._key(vk_code, self.KEYEVENTF_KEYUP)])
+
+    def press_key(self, vk_code, delay=0.05):
+        """按键，delay 为 0 时按下和释放一次发出"""
+        if delay > 0:
+            super().press_key(vk_code, delay)
+        else:
+            self.press_keys([vk_code])
+
+    def press_keys(self, vk_codes):
+        """依次按下并释放多个键，一次 SendInput 发出"""
+        inputs = []
+        for vk_code in vk_codes:
+            inputs.append(self._key(vk_code))
+            inputs.append(self._key(vk_code, self.KEYEVENTF_KEYUP))
+        self.send(inputs)
+
+
+class _NullUser32:
+    """只计数不发送的 user32，用于测量 Python 侧的开销"""
+
+    def __init__(self):
+        self.calls = 0
+
+    def GetSystemMetrics(self, index):
+        self.calls += 1
+        return 1920 if index == 0 else 1080
+
+    def mouse_event(self, *args):
+        self.calls += 1
+
+    def keybd_event(self, *args):
+        self.calls += 1
+
+    def SendInput(self, count, inputs, size):
+        self.calls += 1
+        return count
+
+
+def benchmark_input(n: int = 20000, clicks: int = 20):
+    """
+    对比 WindowsInput 与 BatchedWindowsInput（不真正发送输入）
+
+    - 默认点击: 脚本实际使用的 click(x, y)（按住 0.05 秒），每次点击的耗时和 user32 调用数
+    - 零等待: 移动 + 按下 + 释放不等待，每个动作 Python 侧的开销
+
+    返回:
+        {类名: {'click_ms': 默认点击耗时, 'click_calls': 默认点击的 user32 调用数,
+                'action_us': 零等待动作的微秒数, 'action_calls': 零等待动作的 user32 调用数}}
+    """
+    def legacy(win_input, x, y):
+        win_input.move_mouse(x, y)
+        win_input.mouse_down()
+        win_input.mouse_up()
+
+    def batched(win_input, x, y):
+        win_input.click(x, y, delay=0)
+
+    result = {}
+    for backend, action in ((WindowsInput, legacy), (BatchedWindowsInput, batched)):
+        user32 = _NullUser32()
+        win_input = backend(user32)
+        started = time.perf_counter()
+        for i in range(clicks):
+            win_input.click(i % 1920, i % 1080)
+        click_ms = (time.perf_counter() - started) / clicks * 1000
+        click_calls = user32.calls / clicks
+
+        user32.calls = 0
+        started = time.perf_counter()
+        for i in range(n):
+            action(win_input, i % 1920, i % 1080)
+        elapsed = time.perf_counter() - started
+        result[backend.__name__] = {'click_ms': click_ms, 'click_calls': click_calls,
+                                    'action_us': elapsed / n * 1e6, 'action_calls': user32.calls / n}
+    return result
+
+
 # ============================================
 # 方案2: 使用PostMessage发送消息到窗口
 # ============================================
@@ -126,6 +347,7 @@ class WindowMessageInput:
         if hwnd:
             self.hwnd = hwnd
         elif window_title:
+            import win32gui
             self.hwnd = win32gui.FindWindow(None, window_title)
             if not self.hwnd:
                 raise Exception(f"未找到窗口: {window_title}")
@@ -140,6 +362,9 @@ class WindowMessageInput:
             x, y: 窗口内的相对坐标
             button: 'left' 或 'right'
         """
+        import win32api
+        import win32con
+
         # 构造lParam（坐标）
         lParam = win32api.MAKELONG(x, y)
 
@@ -160,6 +385,9 @@ class WindowMessageInput:
 
     def double_click(self, x, y):
         """双击"""
+        import win32api
+        import win32con
+
         lParam = win32api.MAKELONG(x, y)
 
         # 发送双击消息
@@ -169,6 +397,9 @@ class WindowMessageInput:
 
     def press_key(self, vk_code):
         """发送按键消息"""
+        import win32api
+        import win32con
+
         # 按下
         win32api.PostMessage(self.hwnd, win32con.WM_KEYDOWN, vk_code, 0)
         time.sleep(0.05)
@@ -178,6 +409,8 @@ class WindowMessageInput:
 
     def get_window_rect(self):
         """获取窗口位置和大小"""
+        import win32gui
+
         rect = win32gui.GetWindowRect(self.hwnd)
         return rect  # (left, top, right, bottom)
 
@@ -243,6 +476,8 @@ def find_game_window(keyword):
     返回:
         窗口句柄列表
     """
+    import win32gui
+
     windows = []
 
     def callback(hwnd, extra):
@@ -258,6 +493,8 @@ def find_game_window(keyword):
 
 def list_all_windows():
     """列出所有可见窗口"""
+    import win32gui
+
     print("所有可见窗口:")
     print("-" * 60)
 
@@ -280,6 +517,14 @@ def list_all_windows():
 # ============================================
 
 if __name__ == "__main__":
+    import sys
+
+    if '--benchmark' in sys.argv:
+        for name, r in benchmark_input().items():
+            print(f"{name}: 默认点击 {r['click_ms']:.1f}ms / {r['click_calls']:.1f} 次 user32 调用, "
+                  f"零等待 {r['action_us']:.2f} 微秒 / {r['action_calls']:.1f} 次 user32 调用")
+        sys.exit(0)
+
     print("游戏输入高级方案测试")
     print("=" * 60)
 
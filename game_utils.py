@@ -4,11 +4,18 @@
 提供通用的游戏操作辅助函数，包括窗口管理、对象检测、点击操作等
 """
 
+import math
 import time
+from concurrent.futures import CancelledError
+from typing import Iterable, NamedTuple, Optional, Tuple
+
 import win32gui
 import win32con
 import pyautogui
 
+from frame_gate import FrameChangeGate
+from input_macro import PRESS_A, play_macro, run_macro
+
 
 # 设置PyAutoGUI的安全延迟
 pyautogui.PAUSE = 0.1
@@ -43,54 +50,368 @@ def activate_game_window(window_title=None):
     return False
 
 
-def get_pos_by_name(detector, name):
+def get_pos_by_name(detector, name, timeout=None, app=None):
     """
-    检测屏幕上的对象并返回其中心坐标
+    检测屏幕上的对象并返回其中心坐标（等待直到出现）
 
     参数:
         detector: ScreenDetector实例
         name: 对象名称
+        timeout: 最长等待时间（秒），None表示一直等待
+        app: 提供 is_running / is_paused 的对象（如GUI或脚本），停止时立即返回
 
     返回:
-        tuple: (x, y) 中心坐标
+        tuple: (x, y) 中心坐标；超时或停止时返回 None
     """
-    xy = detector.get_center_by_name(name=name)
-    while not xy:
-        sleep(1)
-        xy = detector.get_center_by_name(name=name)
-    return xy
+    return wait_for(detector, name, timeout=timeout, app=app).pos
+
+
+# ========== 等待原语 ==========
+
+class WaitResult(NamedTuple):
+    """等待结果，条件满足时为真"""
+    status: str                         # 'found' / 'gone' / 'stable' / 'timeout' / 'stopped'
+    name: Optional[str]                 # 触发的目标名称
+    pos: Optional[Tuple[int, int]]      # 目标中心坐标（消失时为最后一次看到的位置）
+    elapsed: float                      # 等待耗时（秒，不含暂停时间）
+    polls: int                          # 检测次数
+
+    def __bool__(self) -> bool:
+        return self.status not in ('timeout', 'stopped')
+
+
+def _template_center(detector, name, region=None):
+    """静态界面元素先用模板匹配（ScreenDetector.match_template），不可用或匹配失败返回 None"""
+    match = getattr(detector, 'match_template', None)
+    if match is None or region is not None:
+        return None
+    return match(name)
+
+
+def _wait(detector, names, check, timeout, app, region, min_interval, max_interval, backoff,
+          templates=False):
+    """
+    轮询检测快照直到 check 返回 (状态, 名称, 坐标)
+
+    轮询间隔从 min_interval 开始（刚执行完操作时画面变化最快），每次乘以 backoff，
+    最多 max_interval。暂停期间不计入超时。
+    templates 为真时每次先对 names 模板匹配，匹配到即视为出现（不截全屏、不推理）
+    """
+    start = time.monotonic()
+    paused = 0.0
+    interval = min_interval
+    polls = 0
+    classes = frozenset(names) if getattr(detector, 'filter_classes', False) else None
+
+    while True:
+        if app is not None:
+            if not app.is_running:
+                return WaitResult('stopped', None, None, time.monotonic() - start - paused, polls)
+            if app.is_paused:
+                t = time.monotonic()
+                while app.is_paused and app.is_running:
+                    time.sleep(0.1)
+                paused += time.monotonic() - t
+                continue
+
+        if templates:
+            for name in names:
+                pos = _template_center(detector, name, region)
+                if pos:
+                    polls += 1
+                    return WaitResult('found', name, pos, time.monotonic() - start - paused, polls)
+
+        # 第一次可以复用有效期内的快照，之后每次都重新检测（后台连续检测模式下直接读取最新结果）
+        snapshot = detector.get_snapshot(region, max_age=None if polls == 0 else 0, classes=classes)
+        polls += 1
+        hit = check(snapshot)
+        elapsed = time.monotonic() - start - paused
+        if hit is not None:
+            status, name, pos = hit
+            return WaitResult(status, name, pos, elapsed, polls)
+
+        if timeout is not None and elapsed >= timeout:
+            return WaitResult('timeout', None, None, elapsed, polls)
+        delay = interval if timeout is None else min(interval, timeout - elapsed)
+        if delay > 0:
+            time.sleep(delay)
+        interval = min(interval * backoff, max_interval)
+
+
+def wait_for(detector, name, timeout=10.0, app=None, region=None,
+             min_interval=0.03, max_interval=0.5, backoff=1.5):
+    """
+    等待对象出现
+
+    参数:
+        detector: ScreenDetector实例
+        name: 对象名称
+        timeout: 最长等待时间（秒），None表示一直等待
+        app: 提供 is_running / is_paused 的对象（如GUI或脚本），None表示不检查
+        region: 检测区域，None表示全屏
+        min_interval, max_interval, backoff: 轮询间隔从 min_interval 开始按 backoff 倍增长到 max_interval
+
+    返回:
+        WaitResult，status 为 'found' / 'timeout' / 'stopped'
+    """
+    def check(snapshot):
+        pos = snapshot.first_center(name)
+        return ('found', name, pos) if pos else None
+
+    return _wait(detector, (name,), check, timeout, app, region, min_interval, max_interval, backoff,
+                 templates=True)
+
+
+def wait_for_any(detector, names: Iterable[str], timeout=10.0, app=None, region=None,
+                 min_interval=0.03, max_interval=0.5, backoff=1.5):
+    """
+    等待多个对象中的任意一个出现（同时出现时按 names 的顺序优先）
+
+    参数同 wait_for
+
+    返回:
+        WaitResult，name 为出现的对象
+    """
+    names = tuple(names)
+
+    def check(snapshot):
+        for name in names:
+            pos = snapshot.first_center(name)
+            if pos:
+                return 'found', name, pos
+        return None
+
+    return _wait(detector, names, check, timeout, app, region, min_interval, max_interval, backoff,
+                 templates=True)
+
+
+def wait_until_gone(detector, name, timeout=10.0, app=None, region=None, confirm=2,
+                    min_interval=0.03, max_interval=0.5, backoff=1.5):
+    """
+    等待对象消失
+
+    参数:
+        confirm: 连续多少帧（不同的检测快照）检测不到才算消失（避免单帧漏检）
+        其余参数同 wait_for
+
+    返回:
+        WaitResult，status 为 'gone' 时 pos 为最后一次看到的位置
+    """
+    state = {'misses': 0, 'last': None, 'frame_id': None}
+
+    def check(snapshot):
+        # 画面没变时会复用同一快照，同一帧只计一次
+        if snapshot.frame_id == state['frame_id']:
+            return None
+        state['frame_id'] = snapshot.frame_id
+        pos = snapshot.first_center(name)
+        if pos:
+            state['misses'] = 0
+            state['last'] = pos
+            return None
+        state['misses'] += 1
+        return ('gone', name, state['last']) if state['misses'] >= confirm else None
+
+    return _wait(detector, (name,), check, timeout, app, region, min_interval, max_interval, backoff)
+
+
+def wait_for_stable(detector, name, timeout=10.0, app=None, region=None, tolerance=5.0, frames=3,
+                    min_interval=0.03, max_interval=0.5, backoff=1.5):
+    """
+    等待对象出现且位置稳定（如界面动画、镜头移动结束后再点击）
+
+    参数:
+        tolerance: 位置变化不超过多少像素算稳定
+        frames: 连续多少帧（不同的检测快照）位置稳定
+        其余参数同 wait_for
+
+    返回:
+        WaitResult，status 为 'stable' 时 pos 为最后一帧的位置
+    """
+    state = {'anchor': None, 'count': 0, 'frame_id': None}
+
+    def check(snapshot):
+        if snapshot.frame_id == state['frame_id']:
+            return None
+        state['frame_id'] = snapshot.frame_id
+        pos = snapshot.first_center(name)
+        if not pos:
+            state['anchor'], state['count'] = None, 0
+            return None
+        anchor = state['anchor']
+        if anchor is None or math.hypot(pos[0] - anchor[0], pos[1] - anchor[1]) > tolerance:
+            state['anchor'], state['count'] = pos, 1
+        else:
+            state['count'] += 1
+        return ('stable', name, pos) if state['count'] >= frames else None
 
+    return _wait(detector, (name,), check, timeout, app, region, min_interval, max_interval, backoff)
 
-def press_a():
-    """使用A键拾取物品"""
+
+def press_a(game_input=None, executor=None):
+    """
+    使用A键拾取物品（间隔 0.1 秒按 5 次）
+
+    参数:
+        game_input: GameInput实例（可选），提供时按预编译的宏定时发送，不累积 sleep 误差
+        executor: InputExecutor（可选），提供时排在已提交的输入之后执行，GUI 停止时随之取消
+    """
+    if executor is not None:
+        try:
+            play_macro(executor, PRESS_A).result()
+        except CancelledError:
+            pass
+        return
+    if game_input is not None and hasattr(game_input, 'key_down'):
+        run_macro(game_input, PRESS_A)
+        return
     for _ in range(5):
         pyautogui.press('a')
         sleep(0.1)
 
 
-def pick_up_items(detector, name, game_input=None):
+# ========== 拾取物品 ==========
+
+def plan_pickup_route(items, start):
+    """
+    最近邻路线: 从 start 出发，每次走向最近的未拾取物品
+
+    参数:
+        items: 物品坐标列表 [(x, y), ...]
+        start: 起点（人物位置）
+
+    返回:
+        按拾取顺序排列的坐标列表
+    """
+    remaining = list(items)
+    route = []
+    current = start
+    while remaining:
+        i = min(range(len(remaining)),
+                key=lambda k: (remaining[k][0] - current[0]) ** 2 + (remaining[k][1] - current[1]) ** 2)
+        current = remaining.pop(i)
+        route.append(current)
+    return route
+
+
+class PickupBlacklist:
+    """按位置记录拾取尝试次数，多次点击仍未拾起的物品（如背包已满、不可拾取）不再点击"""
+
+    def __init__(self, radius=30.0, max_attempts=2):
+        """
+        参数:
+            radius: 距离小于该值（像素）的坐标视为同一个物品
+            max_attempts: 尝试多少次后放弃
+        """
+        self.radius = radius
+        self.max_attempts = max_attempts
+        self._entries = []      # [[坐标, 尝试次数], ...]
+
+    def _find(self, pos):
+        for entry in self._entries:
+            if math.hypot(pos[0] - entry[0][0], pos[1] - entry[0][1]) <= self.radius:
+                return entry
+        return None
+
+    def attempt(self, pos):
+        """记录一次拾取尝试"""
+        entry = self._find(pos)
+        if entry is None:
+            self._entries.append([pos, 1])
+        else:
+            entry[1] += 1
+
+    def is_blocked(self, pos):
+        """该位置的物品是否已放弃"""
+        entry = self._find(pos)
+        return entry is not None and entry[1] >= self.max_attempts
+
+    def __len__(self):
+        """已放弃的物品数"""
+        return sum(1 for _, attempts in self._entries if attempts >= self.max_attempts)
+
+
+def pick_up_items(detector, name, game_input=None, app=None, character='person',
+                  walk_speed=1000.0, click_interval=0.05, settle=0.3,
+                  max_attempts=2, radius=30.0, max_rounds=10, executor=None):
     """
     拾取屏幕上的所有物品
 
+    每轮只检测一次，按最近邻路线从人物位置出发依次点击所有物品，
+    再检测一次确认剩余物品。多次点击仍在原地的物品加入黑名单，避免死循环。
+    提供 executor 时整条路线的点击和按键一次排入执行器，脚本线程只等待最后一个动作。
+
     参数:
         detector: ScreenDetector实例
         name: 物品对象名称
         game_input: GameInput实例（可选，如果不提供则使用默认点击方式）
+        app: 提供 is_running 的对象（如GUI或脚本），停止时立即返回
+        character: 人物对象名称，检测不到时从屏幕中心出发
+        walk_speed: 人物移动速度（像素/秒），用于估算相邻两次点击的间隔
+        click_interval: 相邻两次点击的最小间隔（秒）
+        settle: 一轮点击结束后等待拾取完成的时间（秒）
+        max_attempts: 同一位置的物品最多点击次数
+        radius: 判断是否为同一物品的距离（像素）
+        max_rounds: 最多检测轮数
+        executor: InputExecutor（可选）
+
+    返回:
+        dict: {'rounds': 检测轮数, 'clicks': 点击次数, 'remaining': 最后剩余物品数, 'blacklisted': 放弃的物品数}
     """
-    press_a()
-    sleep(1)
-    items = detector.get_all_centers_by_name(name)
-    while items:
-        if game_input:
-            game_input.click(items[0][0], items[0][1])
-        else:
-            pyautogui.click(items[0][0], items[0][1])
-        press_a()
-        sleep(1)
-        items = detector.get_all_centers_by_name(name)
+    blacklist = PickupBlacklist(radius, max_attempts)
+    stats = {'rounds': 0, 'clicks': 0, 'remaining': 0, 'blacklisted': 0}
+    classes = frozenset((name, character)) if getattr(detector, 'filter_classes', False) else None
 
+    press_a(game_input, executor)
+    for _ in range(max_rounds):
+        if app is not None and not app.is_running:
+            break
+        # 一次检测同时得到人物和所有物品
+        snapshot = detector.get_snapshot(classes=classes)
+        stats['rounds'] += 1
+        items = [pos for pos in snapshot.centers_by_name(name) if not blacklist.is_blocked(pos)]
+        stats['remaining'] = len(items)
+        if not items:
+            break
 
-def click_pos(pos, click_type='single', duration=0.2, use_api=True, game_input=None):
+        start = snapshot.first_center(character)
+        if start is None:
+            width, height = game_input.get_screen_size() if game_input else pyautogui.size()
+            start = (width // 2, height // 2)
+
+        current = start
+        for pos in plan_pickup_route(items, start):
+            if app is not None and not app.is_running:
+                break
+            # 等人物大致走到该物品再点下一个
+            distance = math.hypot(pos[0] - current[0], pos[1] - current[1])
+            walk = max(click_interval, distance / walk_speed if walk_speed else 0.0)
+            if executor is not None:
+                executor.click(pos[0], pos[1])
+                executor.wait(walk)
+            elif game_input:
+                game_input.click(pos[0], pos[1])
+                sleep(walk)
+            else:
+                pyautogui.click(pos[0], pos[1])
+                sleep(walk)
+            blacklist.attempt(pos)
+            stats['clicks'] += 1
+            current = pos
+
+        # 按键排在路线的点击之后，等它完成即整条路线执行完
+        press_a(game_input, executor)
+        if app is not None and not app.is_running:
+            break
+        detector.invalidate_cache()
+        sleep(settle)
+
+    stats['blacklisted'] = len(blacklist)
+    return stats
+
+
+def click_pos(pos, click_type='single', duration=0.2, use_api=True, game_input=None, detector=None,
+              move_delay=0.15, after_delay=0.2, executor=None):
     """
     点击指定位置
 
@@ -103,11 +424,26 @@ def click_pos(pos, click_type='single', duration=0.2, use_api=True, game_input=N
         duration: 鼠标移动时间（秒，仅PyAutoGUI有效）
         use_api: 是否使用Windows API（True=使用game_input，False=使用PyAutoGUI）
         game_input: GameInput实例（当use_api=True时必须提供）
+        detector: ScreenDetector实例（可选，点击后使其检测快照失效）
+        move_delay: 移动鼠标后、点击前的等待（秒）
+        after_delay: 点击后的等待（秒）
+        executor: InputExecutor（可选），提供时移动和点击由执行器按时间表发送，
+                  GUI 停止时随之取消（不再点击，直接返回）
     """
-    if use_api and game_input:
+    if use_api and executor is not None:
+        if click_type == 'double':
+            done = executor.double_click(pos[0], pos[1], settle=move_delay)
+        else:
+            button = 'right' if click_type == 'right' else 'left'
+            done = executor.click(pos[0], pos[1], button=button, settle=move_delay)
+        try:
+            done.result()
+        except CancelledError:
+            return
+    elif use_api and game_input:
         # 使用Windows API（绕过游戏保护）
         game_input.move_mouse(pos[0], pos[1])
-        sleep(0.15)
+        sleep(move_delay)
 
         if click_type == 'double':
             game_input.double_click()
@@ -118,7 +454,7 @@ def click_pos(pos, click_type='single', duration=0.2, use_api=True, game_input=N
     else:
         # 使用PyAutoGUI
         pyautogui.moveTo(pos[0], pos[1], duration=duration)
-        sleep(0.15)
+        sleep(move_delay)
 
         if click_type == 'double':
             pyautogui.doubleClick()
@@ -127,4 +463,126 @@ def click_pos(pos, click_type='single', duration=0.2, use_api=True, game_input=N
         else:
             pyautogui.click()
 
-    sleep(0.2)
+    # 画面即将变化，旧的检测快照不再可信
+    if detector is not None:
+        detector.invalidate_cache()
+
+    if after_delay:
+        sleep(after_delay)
+
+
+class ClickResult(NamedTuple):
+    """点击确认结果，观察到预期变化时为真"""
+    status: str                         # 'appeared' / 'disappeared' / 'changed' / 'timeout' / 'stopped'
+    name: Optional[str]                 # 出现或消失的对象名称
+    pos: Optional[Tuple[int, int]]      # 出现的对象坐标
+    reaction_time: Optional[float]      # 最后一次点击到观察到变化的时间（秒）
+    attempts: int                       # 点击次数
+
+    def __bool__(self) -> bool:
+        return self.status not in ('timeout', 'stopped')
+
+
+def click_and_confirm(detector, pos, appear=None, disappear=None, region=None, click_type='single',
+                      game_input=None, use_api=True, app=None, timeout=1.0, retries=2, retarget=True,
+                      confirm=2, change_threshold=8.0, move_delay=0.03,
+                      min_interval=0.02, max_interval=0.1, backoff=1.5, executor=None):
+    """
+    点击并等待预期的画面变化，观察到变化立即返回（固定延迟变为上限）
+
+    参数:
+        detector: ScreenDetector实例
+        pos: 点击坐标 (x, y)
+        appear: 点击后应出现的对象名称（或名称列表，任意一个出现即可）
+        disappear: 点击后应消失的对象名称（通常是被点击的按钮）
+        region: 点击后应发生变化的屏幕区域 (x1, y1, x2, y2)
+        click_type: 'single' / 'double' / 'right'
+        game_input, use_api: 同 click_pos
+        app: 提供 is_running / is_paused 的对象（如GUI或脚本），停止时立即返回
+        timeout: 每次点击后最长等待时间（秒）
+        retries: 超时后重新点击的次数
+        retarget: 重试时如果 disappear 对象仍可见，点击它当前的位置
+        confirm: 连续多少帧（不同的检测快照）检测不到 disappear 对象才算消失
+        change_threshold: 区域变化阈值（缩小灰度图的最大格子差，0-255）
+        move_delay: 移动鼠标后、点击前的等待（秒）
+        min_interval, max_interval, backoff: 轮询间隔，从 min_interval 开始按 backoff 倍增长
+        executor: 同 click_pos
+
+    返回:
+        ClickResult
+    """
+    if appear is None and disappear is None and region is None:
+        raise ValueError("至少需要指定 appear / disappear / region 中的一个")
+    appear = (appear,) if isinstance(appear, str) else tuple(appear or ())
+    names = appear + ((disappear,) if disappear else ())
+    classes = frozenset(names) if getattr(detector, 'filter_classes', False) else None
+    gate = FrameChangeGate(change_threshold) if region is not None else None
+
+    for attempt in range(1, retries + 2):
+        baseline = gate.signature([detector.capture_screen(region)]) if gate is not None else None
+        click_pos(pos, click_type=click_type, use_api=use_api, game_input=game_input, detector=detector,
+                  move_delay=move_delay, after_delay=0, executor=executor)
+        clicked = time.monotonic()
+        interval = min_interval
+        misses = 0
+        first_miss = None
+        miss_frame = None
+        last_seen = None
+
+        while True:
+            if app is not None:
+                if not app.is_running:
+                    return ClickResult('stopped', None, None, None, attempt)
+                if app.is_paused:
+                    t = time.monotonic()
+                    while app.is_paused and app.is_running:
+                        time.sleep(0.1)
+                    # 暂停期间不计入超时和反应时间
+                    paused = time.monotonic() - t
+                    clicked += paused
+                    if first_miss is not None:
+                        first_miss += paused
+                    continue
+            now = time.monotonic()
+
+            if gate is not None:
+                sig = gate.signature([detector.capture_screen(region)])
+                if gate.difference(sig, baseline) > change_threshold:
+                    return ClickResult('changed', None, None, now - clicked, attempt)
+
+            if names:
+                # 界面按钮先模板匹配，匹配不到再检测
+                for name in appear:
+                    found = _template_center(detector, name)
+                    if found:
+                        return ClickResult('appeared', name, found, now - clicked, attempt)
+                seen = _template_center(detector, disappear) if disappear else None
+                if appear or (disappear and not seen):
+                    snapshot = detector.get_snapshot(max_age=0, classes=classes)
+                    for name in appear:
+                        found = snapshot.first_center(name)
+                        if found:
+                            return ClickResult('appeared', name, found, now - clicked, attempt)
+                    if disappear and not seen:
+                        seen = snapshot.first_center(disappear)
+                if disappear:
+                    if seen:
+                        misses, first_miss, last_seen = 0, None, seen
+                    elif snapshot.frame_id != miss_frame:
+                        # 同一帧被重复返回时只计一次漏检
+                        miss_frame = snapshot.frame_id
+                        misses += 1
+                        first_miss = first_miss or now
+                        if misses >= confirm:
+                            return ClickResult('disappeared', disappear, None, first_miss - clicked, attempt)
+
+            remaining = timeout - (time.monotonic() - clicked)
+            if remaining <= 0:
+                break
+            time.sleep(min(interval, remaining))
+            interval = min(interval * backoff, max_interval)
+
+        if retarget and last_seen is not None:
+            pos = last_seen
+
+    return ClickResult('timeout', None, None, None, retries + 1)
@@ -13,18 +13,47 @@ from tkinter import ttk, scrolledtext
 import threading
 import time
 from datetime import datetime
+import multiprocessing
+import os
 import sys
 import keyboard  # 需要安装: pip install keyboard
 
 # 导入原脚本的功能
 from game_utils import activate_game_window
-from game_input_advanced import WindowsInput as GameInput
-from screen_detector import ScreenDetector
+from game_input_advanced import BatchedWindowsInput as GameInput
+from input_executor import InputExecutor
+from screen_detector import ScreenDetector, get_resource_path
+from tiling import TileConfig
+from template_matcher import DEFAULT_TEMPLATE_CLASSES
+import model_registry
 
 # 导入脚本模块
 from scripts.base_script import BaseScript
 
 
+class FirstActionTimer:
+    """包装游戏输入控制器，记录启动后第一次输入操作的时间"""
+
+    ACTIONS = ('move_mouse', 'click', 'double_click', 'press_key', 'mouse_down', 'key_down')
+
+    def __init__(self, game_input, on_first_action):
+        self._game_input = game_input
+        self._on_first_action = on_first_action
+        self._fired = False
+
+    def __getattr__(self, name):
+        attr = getattr(self._game_input, name)
+        if self._fired or name not in self.ACTIONS:
+            return attr
+
+        def wrapper(*args, **kwargs):
+            if not self._fired:
+                self._fired = True
+                self._on_first_action()
+            return attr(*args, **kwargs)
+        return wrapper
+
+
 class GameAutomationGUI:
     """游戏自动化图形界面"""
 
@@ -41,12 +70,24 @@ class GameAutomationGUI:
         self.detector = None
         self.game_input = GameInput()
         self.current_script = None  # 当前运行的脚本实例
+        self.input_executor = None  # 异步输入执行器（脚本运行期间有效）
         self.run_count = 0  # 运行次数计数器
 
         # 配置变量
         self.window_title = tk.StringVar(value="Torchlight: Infinite")
         self.model_path = tk.StringVar(value="hjzgv1.pt")
+        self.frame_source = tk.StringVar(value="auto")  # 截图方式或录像路径
+        self.infer_threads = tk.IntVar(value=0)  # CPU 推理线程数，0表示默认
         self.conf_threshold = tk.DoubleVar(value=0.5)
+        self.continuous_mode = tk.BooleanVar(value=False)  # 后台连续检测
+        self.multiprocess_mode = tk.BooleanVar(value=False)  # 后台检测放到独立进程
+        self.target_fps = tk.IntVar(value=10)
+        self.inference_profile = tk.StringVar(value="default")  # 推理配置，auto 表示按场景自动选择
+        self.tile_small_objects = tk.BooleanVar(value=False)  # 高分辨率屏幕上对 props 切片推理
+        self.record_frames = tk.BooleanVar(value=True)  # 在内存中保留最近画面，出错时导出
+        self.skip_unchanged = tk.BooleanVar(value=False)  # 画面未变化时复用上一次检测结果
+        self.template_buttons = tk.BooleanVar(value=False)  # 界面按钮优先用模板匹配
+        self.class_conf_text = tk.StringVar(value="")  # 按类别的置信度阈值，如 "portal1=0.7, props=0.3"
 
         # 获取所有可用脚本
         available_scripts = BaseScript.get_all_scripts()
@@ -55,6 +96,15 @@ class GameAutomationGUI:
         # 创建界面
         self.create_widgets()
 
+        # 打开界面或修改模型路径后，在后台加载并预热模型
+        self._preload_job = None
+        self._start_time = None
+        self.model_path.trace_add('write', self.schedule_preload)
+        self.infer_threads.trace_add('write', self.schedule_preload)
+        self.preload_model()
+        self.class_conf_text.trace_add('write', self.apply_class_conf)
+        self.update_latency_summary()
+
         # 注册全局快捷键
         self.register_hotkeys()
 
@@ -72,9 +122,13 @@ class GameAutomationGUI:
         ttk.Label(config_frame, text="游戏窗口标题:").grid(row=0, column=0, sticky=tk.W, padx=5, pady=2)
         ttk.Entry(config_frame, textvariable=self.window_title, width=30).grid(row=0, column=1, padx=5, pady=2)
 
-        # 模型路径
+        # 模型路径（.pt / .onnx / *_openvino_model，按类型自动选择推理引擎）
         ttk.Label(config_frame, text="模型路径:").grid(row=1, column=0, sticky=tk.W, padx=5, pady=2)
         ttk.Entry(config_frame, textvariable=self.model_path, width=30).grid(row=1, column=1, padx=5, pady=2)
+        threads_frame = ttk.Frame(config_frame)
+        threads_frame.grid(row=1, column=2, sticky=tk.W, padx=5, pady=2)
+        ttk.Label(threads_frame, text="线程:").pack(side=tk.LEFT)
+        ttk.Spinbox(threads_frame, from_=0, to=64, textvariable=self.infer_threads, width=4).pack(side=tk.LEFT)
 
         # 置信度
         ttk.Label(config_frame, text="置信度阈值:").grid(row=2, column=0, sticky=tk.W, padx=5, pady=2)
@@ -90,6 +144,44 @@ class GameAutomationGUI:
         script_combo.grid(row=3, column=1, padx=5, pady=2)
         script_combo.bind('<<ComboboxSelected>>', self.on_script_changed)
 
+        # 截图方式
+        ttk.Label(config_frame, text="截图方式:").grid(row=5, column=0, sticky=tk.W, padx=5, pady=2)
+        ttk.Combobox(config_frame, textvariable=self.frame_source,
+                     values=["auto", "mss", "imagegrab", "xshm"], width=28).grid(row=5, column=1, padx=5, pady=2)
+
+        # 按类别的置信度阈值（未列出的类别使用上面的置信度阈值）
+        ttk.Label(config_frame, text="分类阈值:").grid(row=6, column=0, sticky=tk.W, padx=5, pady=2)
+        ttk.Entry(config_frame, textvariable=self.class_conf_text, width=30).grid(row=6, column=1, padx=5, pady=2)
+        ttk.Label(config_frame, text="如 portal1=0.7, props=0.3").grid(row=6, column=2, sticky=tk.W, padx=5, pady=2)
+
+        # 最近画面记录
+        ttk.Checkbutton(config_frame, text="记录最近画面（出错时导出）", variable=self.record_frames).grid(
+            row=7, column=0, columnspan=2, sticky=tk.W, padx=5, pady=2)
+
+        # 检测加速（会改变检测结果的时机，默认关闭）
+        fast_frame = ttk.Frame(config_frame)
+        fast_frame.grid(row=7, column=2, sticky=tk.W, padx=5, pady=2)
+        ttk.Checkbutton(fast_frame, text="画面未变化时跳过推理", variable=self.skip_unchanged).pack(side=tk.LEFT)
+        ttk.Checkbutton(fast_frame, text="按钮模板匹配", variable=self.template_buttons).pack(side=tk.LEFT)
+
+        # 推理配置
+        profile_frame = ttk.Frame(config_frame)
+        profile_frame.grid(row=5, column=2, sticky=tk.W, padx=5, pady=2)
+        ttk.Label(profile_frame, text="推理配置:").pack(side=tk.LEFT)
+        ttk.Combobox(profile_frame, textvariable=self.inference_profile,
+                     values=["default", "auto", "menu", "loot"], state='readonly', width=8).pack(side=tk.LEFT)
+
+        # 后台连续检测
+        ttk.Checkbutton(config_frame, text="后台连续检测", variable=self.continuous_mode).grid(
+            row=4, column=0, sticky=tk.W, padx=5, pady=2)
+        fps_frame = ttk.Frame(config_frame)
+        fps_frame.grid(row=4, column=1, sticky=tk.W, padx=5, pady=2)
+        ttk.Label(fps_frame, text="目标帧率:").pack(side=tk.LEFT)
+        ttk.Spinbox(fps_frame, from_=1, to=60, textvariable=self.target_fps, width=5).pack(side=tk.LEFT, padx=5)
+        ttk.Checkbutton(fps_frame, text="多进程检测", variable=self.multiprocess_mode).pack(side=tk.LEFT)
+        ttk.Checkbutton(config_frame, text="切片检测小物品", variable=self.tile_small_objects).grid(
+            row=4, column=2, sticky=tk.W, padx=5, pady=2)
+
         # ===== 控制按钮区 =====
         control_frame = ttk.Frame(self.root, padding=10)
         control_frame.pack(fill=tk.X, padx=10, pady=5)
@@ -123,6 +215,22 @@ class GameAutomationGUI:
         )
         self.stop_btn.pack(side=tk.LEFT, padx=5)
 
+        # 导出最近画面
+        ttk.Button(
+            control_frame,
+            text="导出画面",
+            command=self.dump_frames,
+            width=10
+        ).pack(side=tk.LEFT, padx=5)
+
+        # 导出分阶段耗时
+        ttk.Button(
+            control_frame,
+            text="导出耗时",
+            command=self.dump_latency,
+            width=10
+        ).pack(side=tk.LEFT, padx=5)
+
         # ===== 状态指示器 =====
         status_frame = ttk.Frame(self.root, padding=5)
         status_frame.pack(fill=tk.X, padx=10)
@@ -141,6 +249,10 @@ class GameAutomationGUI:
         self.run_count_label = ttk.Label(status_frame, text="运行次数: 0")
         self.run_count_label.pack(side=tk.RIGHT, padx=5)
 
+        # 分阶段耗时（p50/p95）
+        self.latency_label = ttk.Label(self.root, text="", foreground="gray", padding=(15, 0))
+        self.latency_label.pack(fill=tk.X)
+
         # ===== 日志显示区 =====
         log_frame = ttk.LabelFrame(self.root, text="运行日志", padding=5)
         log_frame.pack(fill=tk.BOTH, expand=True, padx=10, pady=5)
@@ -194,6 +306,111 @@ class GameAutomationGUI:
             description = temp_instance.get_description()
             self.log(f"已选择脚本: {script_name} - {description}", "INFO")
 
+    def schedule_preload(self, *args):
+        """配置改变后延迟预加载（避免输入路径时每个字符都触发加载）"""
+        if self._preload_job is not None:
+            self.root.after_cancel(self._preload_job)
+        self._preload_job = self.root.after(800, self.preload_model)
+
+    def preload_model(self):
+        """在后台线程加载并预热模型"""
+        self._preload_job = None
+        try:
+            model_path = get_resource_path(self.model_path.get())
+            threads = self.infer_threads.get() or None
+        except (tk.TclError, ValueError):
+            return
+        if model_registry.is_loaded(model_path, threads=threads):
+            return
+
+        def on_done(future):
+            error = future.exception()
+            if error is not None:
+                self.root.after(0, self.log, f"模型预加载失败: {error}", "WARNING")
+            else:
+                info = future.result()
+                self.root.after(0, self.log, f"模型已预加载: 加载 {info.load_seconds:.2f}s, "
+                                             f"预热 {info.warmup_seconds:.2f}s", "DEBUG")
+
+        try:
+            model_registry.preload(model_path, threads=threads, callback=on_done)
+        except OSError:
+            # 路径还没输入完整
+            return
+        self.log(f"后台预加载模型: {self.model_path.get()}", "DEBUG")
+
+    def parse_class_conf(self):
+        """
+        解析分类阈值输入框
+
+        返回:
+            {类别名称: 阈值}，格式错误时返回 None
+        """
+        result = {}
+        for item in self.class_conf_text.get().replace('，', ',').split(','):
+            if not item.strip():
+                continue
+            name, sep, value = item.partition('=')
+            try:
+                conf = float(value)
+            except ValueError:
+                return None
+            if not sep or not name.strip() or not 0 < conf <= 1:
+                return None
+            result[name.strip()] = conf
+        return result
+
+    def apply_class_conf(self, *args):
+        """运行中修改分类阈值时立即生效"""
+        if self.detector is None:
+            return
+        class_conf = self.parse_class_conf()
+        if class_conf is None:
+            return
+        for name in set(self.detector.class_conf) - set(class_conf):
+            self.detector.set_class_conf(name, None)
+        for name, conf in class_conf.items():
+            if self.detector.class_conf.get(name) != conf:
+                self.detector.set_class_conf(name, conf)
+
+    def update_latency_summary(self):
+        """每秒刷新一次分阶段耗时摘要"""
+        if self.detector is not None:
+            summary = self.detector.latency.format_summary(
+                ['capture', 'convert', 'preprocess', 'inference', 'postprocess', 'merge', 'total'])
+            if summary:
+                self.latency_label.config(text=f"耗时 p50/p95: {summary}")
+        self.root.after(1000, self.update_latency_summary)
+
+    def dump_latency(self):
+        """把分阶段耗时统计写入 latency.json"""
+        if self.detector is None:
+            self.log("还没有耗时数据（请先启动脚本）", "WARNING")
+            return
+        path = os.path.abspath("latency.json")
+        try:
+            self.detector.dump_latency(path)
+        except OSError as e:
+            self.log(f"导出耗时失败: {e}", "ERROR")
+            return
+        self.log(f"分阶段耗时已导出: {path}", "SUCCESS")
+
+    def dump_frames(self):
+        """导出最近记录的画面和检测结果"""
+        if self.detector is None:
+            self.log("还没有画面记录（请先启动脚本）", "WARNING")
+            return None
+        try:
+            path = self.detector.dump_frames()
+        except OSError as e:
+            self.log(f"导出画面失败: {e}", "ERROR")
+            return None
+        if path is None:
+            self.log("没有画面记录（请勾选“记录最近画面”）", "WARNING")
+        else:
+            self.log(f"最近画面已导出: {os.path.abspath(path)}", "SUCCESS")
+        return path
+
     def log(self, message, level="INFO"):
         """添加日志"""
         timestamp = datetime.now().strftime("%H:%M:%S")
@@ -222,6 +439,7 @@ class GameAutomationGUI:
         # 启动新线程运行脚本
         self.is_running = True
         self.is_paused = False
+        self._start_time = time.perf_counter()
 
         self.start_btn.config(state=tk.DISABLED)
         self.pause_btn.config(state=tk.NORMAL)
@@ -262,6 +480,9 @@ class GameAutomationGUI:
 
         self.is_running = False
         self.is_paused = False
+        # 丢弃尚未执行的输入动作，松开仍按住的按键
+        if self.input_executor is not None:
+            self.input_executor.cancel_all()
 
         self.start_btn.config(state=tk.NORMAL)
         self.pause_btn.config(state=tk.DISABLED, text="⏸ 暂停 (F11)")
@@ -288,13 +509,53 @@ class GameAutomationGUI:
     def run_script(self):
         """运行主脚本逻辑"""
         try:
-            # 初始化检测器
+            class_conf = self.parse_class_conf()
+            if class_conf is None:
+                self.log(f"分类阈值格式错误，已忽略: {self.class_conf_text.get()}", "WARNING")
+                class_conf = {}
+            unknown = set(class_conf)
+
+            # 初始化检测器（模型已预加载时直接复用）
             self.log(f"加载模型: {self.model_path.get()}", "INFO")
+            warm = model_registry.is_loaded(get_resource_path(self.model_path.get()),
+                                            threads=self.infer_threads.get() or None)
+            if self.detector is not None:
+                # 上一次运行的检测器（截图句柄、共享内存）
+                self.detector.close()
             self.detector = ScreenDetector(
                 model_path=self.model_path.get(),
-                conf=self.conf_threshold.get()
+                conf=self.conf_threshold.get(),
+                frame_source=self.frame_source.get() or "auto",
+                threads=self.infer_threads.get() or None,
+                profile=self.inference_profile.get(),
+                tiling=[TileConfig(('props',))] if self.tile_small_objects.get() else None,
+                class_conf=class_conf,
+                record_frames=120 if self.record_frames.get() else 0,
+                change_threshold=8.0 if self.skip_unchanged.get() else None,
+                template_classes=DEFAULT_TEMPLATE_CLASSES if self.template_buttons.get() else ()
             )
-            self.log("模型加载成功", "SUCCESS")
+            unknown -= set(self.detector.class_names.values())
+            if unknown:
+                self.log(f"分类阈值中有未知类别: {', '.join(sorted(unknown))}", "WARNING")
+            self.log(f"模型加载成功 ({'预热' if warm else '冷启动'}, "
+                     f"{time.perf_counter() - self._start_time:.2f}s)", "SUCCESS")
+
+            # 记录启动到第一次输入操作的耗时
+            game_input = self.game_input
+            self.game_input = FirstActionTimer(game_input, lambda: self.log(
+                f"启动到首次操作: {time.perf_counter() - self._start_time:.2f}s "
+                f"({'预热' if warm else '冷启动'})", "DEBUG"))
+            self.input_executor = InputExecutor(self.game_input)
+
+            if self.continuous_mode.get():
+                self.detector.start_continuous(
+                    target_fps=self.target_fps.get(),
+                    should_run=lambda: self.is_running,
+                    should_pause=lambda: self.is_paused,
+                    processes=self.multiprocess_mode.get()
+                )
+                mode = "独立进程" if self.detector.is_multiprocess else "后台线程"
+                self.log(f"后台连续检测已启动 ({mode}, 目标 {self.target_fps.get()} FPS)", "INFO")
 
             # 激活游戏窗口
             window_title = self.window_title.get()
@@ -325,11 +586,29 @@ class GameAutomationGUI:
                 self.run_count += 1
                 self.run_count_label.config(text=f"运行次数: {self.run_count}")
                 self.log(f"\n>>> 开始第 {self.run_count} 次运行 <<<", "SUCCESS")
+                self.detector.reset_cache_stats()
 
                 # 执行脚本
                 if not self.current_script.execute():
                     break
 
+                stats = self.detector.get_cache_stats()
+                self.log(f"检测统计: 推理 {stats['inferences']} 次, 快照复用 {stats['hits']} 次 "
+                         f"(命中率 {stats['hit_rate']:.0%})", "DEBUG")
+                gate = self.detector.get_gate_stats()
+                if gate['checks']:
+                    self.log(f"画面未变化跳过推理: {gate['skips']}/{gate['checks']} 次 "
+                             f"({gate['skip_rate']:.0%})", "DEBUG")
+                for name, t in self.detector.get_template_stats().items():
+                    self.log(f"模板匹配 {name}: 命中 {t['hits']}/{t['hits'] + t['misses']} "
+                             f"({t['hit_rate']:.0%}), 平均 {t['avg_match_ms']:.1f}ms", "DEBUG")
+                for name, p in self.detector.get_profile_stats().items():
+                    self.log(f"推理配置 {name}: {p['frames']} 次, 平均 {p['avg_ms']:.1f}ms, "
+                             f"平均 {p['avg_detections']:.1f} 个目标", "DEBUG")
+                if self.detector.is_continuous:
+                    p = self.detector.get_pipeline_stats()
+                    self.log(f"后台检测: {p['fps']:.1f} FPS, 截图 {p['capture_ms']:.1f}ms, "
+                             f"推理 {p['inference_ms']:.1f}ms", "DEBUG")
                 self.log(f"<<< 第 {self.run_count} 次运行完成 >>>\n", "SUCCESS")
 
                 # 等待下一次循环
@@ -340,8 +619,17 @@ class GameAutomationGUI:
             self.log(f"脚本执行出错: {e}", "ERROR")
             import traceback
             self.log(traceback.format_exc(), "ERROR")
+            if self.detector is not None and self.detector.frame_recorder is not None:
+                self.dump_frames()
         finally:
             self.is_running = False
+            if self.input_executor is not None:
+                self.input_executor.close()
+                self.input_executor = None
+            if isinstance(self.game_input, FirstActionTimer):
+                self.game_input = self.game_input._game_input
+            if self.detector:
+                self.detector.stop_continuous()
             self.current_script = None
             self.root.after(0, self.stop_script)
 
@@ -351,6 +639,9 @@ class GameAutomationGUI:
             self.stop_script()
             time.sleep(0.5)
 
+        if self.detector is not None:
+            self.detector.close()
+
         # 注销快捷键
         try:
             keyboard.unhook_all()
@@ -362,6 +653,8 @@ class GameAutomationGUI:
 
 def main():
     """主函数"""
+    # 打包为 exe 后多进程检测的子进程需要
+    multiprocessing.freeze_support()
     root = tk.Tk()
     app = GameAutomationGUI(root)
     root.mainloop()
@@ -0,0 +1,401 @@
+"""
+推理引擎
+
+ScreenDetector 通过推理引擎运行模型，引擎统一返回 Detections:
+- 'ultralytics': 原有的 ultralytics YOLO (.pt)
+- 'onnx':        ONNX Runtime (.onnx)，CPU 上通常比 PyTorch 快
+- 'openvino':    OpenVINO（*_openvino_model 目录或 .xml），Intel CPU 上最快
+
+ONNX / OpenVINO 引擎自带与 ultralytics 一致的预处理（letterbox）和后处理（NMS）。
+
+导出模型:
+    yolo export model=hjzgv1.pt format=onnx
+    yolo export model=hjzgv1.pt format=openvino
+"""
+
+import ast
+import glob
+import os
+import threading
+import time
+from abc import ABC, abstractmethod
+from typing import Dict, List, Optional, Sequence, Tuple
+
+import cv2
+import numpy as np
+
+from detections import Detections, nms_indices
+
+
+class InferenceEngine(ABC):
+    """推理引擎基类"""
+
+    name = "base"
+
+    def __init__(self):
+        self.names: Dict[int, str] = {}
+        self._local = threading.local()
+        # 同一个引擎（ultralytics 模型 / ONNX 会话 / OpenVINO InferRequest）不能同时推理，
+        # 后台检测线程、脚本线程以及共享同一引擎的多个检测器（model_registry）依次使用
+        self._lock = threading.Lock()
+
+    @property
+    def last_timings(self) -> Dict[str, float]:
+        """
+        当前线程最近一次 detect() 的分阶段耗时（毫秒）
+
+        返回:
+            {'preprocess': 预处理, 'inference': 推理, 'postprocess': 后处理（含 NMS）, 'parse': 解析}
+        """
+        return getattr(self._local, 'timings', {})
+
+    def _set_timings(self, **timings: float):
+        self._local.timings = timings
+
+    def detect(self, frames: List[np.ndarray], conf: float = 0.25, imgsz: int = 640,
+               classes: Optional[Sequence[int]] = None, max_det: int = 300) -> List[Detections]:
+        """
+        对一批 BGR 图像推理（多线程调用时依次执行）
+
+        参数:
+            frames: BGR 图像列表
+            conf: 置信度阈值
+            imgsz: 输入尺寸（固定输入尺寸的模型会忽略）
+            classes: 只保留这些类别ID，None表示全部
+            max_det: 每张图像最多保留的检测框数
+
+        返回:
+            每张图像的 Detections（坐标相对于该图像）
+        """
+        with self._lock:
+            return self._detect(frames, conf, imgsz, classes, max_det)
+
+    @abstractmethod
+    def _detect(self, frames: List[np.ndarray], conf: float, imgsz: int,
+                classes: Optional[Sequence[int]], max_det: int) -> List[Detections]:
+        """由子类实现的推理（调用时已持有锁）"""
+        pass
+
+    def warmup(self, imgsz: int = 640):
+        """用空白图像跑一次推理，消除首帧的额外开销"""
+        self.detect([np.zeros((imgsz, imgsz, 3), dtype=np.uint8)], imgsz=imgsz)
+
+
+# torch.set_num_threads 是进程级设置，指定了线程数的引擎推理期间临时切换，互相之间串行
+_torch_threads_lock = threading.Lock()
+
+
+class UltralyticsEngine(InferenceEngine):
+    """ultralytics YOLO（.pt 模型）"""
+
+    name = "ultralytics"
+
+    def __init__(self, model_path: str, threads: Optional[int] = None, model=None):
+        """
+        参数:
+            model_path: 模型路径
+            threads: PyTorch 计算线程数，None表示默认（只在本引擎推理期间生效，结束后恢复原值）
+            model: 已加载的 YOLO 对象（可选）
+        """
+        super().__init__()
+        self.threads = threads
+        if model is None:
+            from ultralytics import YOLO
+            model = YOLO(model_path)
+        self.model = model
+        self.names = model.names
+
+    def _predict(self, source, conf, imgsz, classes, max_det):
+        return self.model.predict(source=source, conf=conf, imgsz=imgsz, verbose=False,
+                                  classes=list(classes) if classes is not None else None,
+                                  max_det=max_det)
+
+    def _detect(self, frames, conf=0.25, imgsz=640, classes=None, max_det=300):
+        source = frames[0] if len(frames) == 1 else frames
+        if self.threads:
+            import torch
+            with _torch_threads_lock:
+                previous = torch.get_num_threads()
+                torch.set_num_threads(self.threads)
+                try:
+                    results = self._predict(source, conf, imgsz, classes, max_det)
+                finally:
+                    torch.set_num_threads(previous)
+        else:
+            results = self._predict(source, conf, imgsz, classes, max_det)
+        t0 = time.perf_counter()
+        # 整个 boxes 张量一次性拷贝到主机
+        detections = [Detections.from_result(result, self.names) for result in results]
+
+        # ultralytics 记录的是批内每张图像的平均耗时
+        n = len(results)
+        speed = (getattr(results[0], 'speed', None) or {}) if n else {}
+        self._set_timings(preprocess=speed.get('preprocess', 0.0) * n,
+                          inference=speed.get('inference', 0.0) * n,
+                          postprocess=speed.get('postprocess', 0.0) * n,
+                          parse=(time.perf_counter() - t0) * 1000)
+        return detections
+
+
+# ============================================
+# 自带预处理/后处理的引擎
+# ============================================
+
+def letterbox(frame: np.ndarray, new_shape: Tuple[int, int]) -> Tuple[np.ndarray, float, Tuple[int, int]]:
+    """
+    等比例缩放并填充到 new_shape（与 ultralytics LetterBox 一致）
+
+    返回:
+        (图像, 缩放比例, (左侧填充, 顶部填充))
+    """
+    h, w = frame.shape[:2]
+    new_h, new_w = new_shape
+    r = min(new_h / h, new_w / w)
+    unpad_w, unpad_h = int(round(w * r)), int(round(h * r))
+    dw, dh = (new_w - unpad_w) / 2, (new_h - unpad_h) / 2
+
+    if (w, h) != (unpad_w, unpad_h):
+        frame = cv2.resize(frame, (unpad_w, unpad_h), interpolation=cv2.INTER_LINEAR)
+    top, bottom = int(round(dh - 0.1)), int(round(dh + 0.1))
+    left, right = int(round(dw - 0.1)), int(round(dw + 0.1))
+    frame = cv2.copyMakeBorder(frame, top, bottom, left, right, cv2.BORDER_CONSTANT,
+                               value=(114, 114, 114))
+    return frame, r, (left, top)
+
+
+def decode_yolo_output(output: np.ndarray, num_classes: int, conf: float, ratio: float,
+                       pad: Tuple[int, int], orig_shape: Tuple[int, int],
+                       iou: float = 0.7, max_det: int = 300, classes: Optional[Sequence[int]] = None):
+    """
+    解析单张图像的 YOLOv8 输出 (4 + 类别数, 候选框数)
+
+    参数:
+        classes: 只在这些类别ID中取最高分，None表示全部
+
+    返回:
+        (xyxy, 置信度, 类别ID)，坐标已映射回原图
+    """
+    if output.shape[0] != 4 + num_classes:
+        output = output.T
+    boxes, scores = output[:4].T, output[4:].T
+
+    if classes is not None:
+        # 与 ultralytics 一致: 先取最高分类别，再丢弃不需要的类别
+        selected = np.zeros(num_classes, dtype=bool)
+        selected[list(classes)] = True
+    cls_ids = scores.argmax(axis=1)
+    best = scores[np.arange(len(scores)), cls_ids]
+    if classes is not None:
+        best = np.where(selected[cls_ids], best, 0.0)
+    mask = best > conf
+    boxes, best, cls_ids = boxes[mask], best[mask], cls_ids[mask]
+
+    # cx, cy, w, h -> x1, y1, x2, y2
+    xyxy = np.empty_like(boxes)
+    xyxy[:, 0] = boxes[:, 0] - boxes[:, 2] / 2
+    xyxy[:, 1] = boxes[:, 1] - boxes[:, 3] / 2
+    xyxy[:, 2] = boxes[:, 0] + boxes[:, 2] / 2
+    xyxy[:, 3] = boxes[:, 1] + boxes[:, 3] / 2
+
+    keep = nms_indices(xyxy, best, cls_ids, iou)[:max_det]
+    xyxy, best, cls_ids = xyxy[keep], best[keep], cls_ids[keep]
+
+    # 去掉填充并缩放回原图，裁剪到图像范围内
+    xyxy[:, [0, 2]] -= pad[0]
+    xyxy[:, [1, 3]] -= pad[1]
+    xyxy /= ratio
+    h, w = orig_shape
+    xyxy[:, [0, 2]] = xyxy[:, [0, 2]].clip(0, w)
+    xyxy[:, [1, 3]] = xyxy[:, [1, 3]].clip(0, h)
+    return xyxy, best, cls_ids
+
+
+class _ExportedModelEngine(InferenceEngine):
+    """导出模型引擎的公共部分: 预处理、批处理和后处理"""
+
+    iou = 0.7       # 与 ultralytics predict 的默认 NMS 阈值一致
+    max_det = 300
+
+    # 子类设置
+    input_shape: Tuple = (1, 3, 640, 640)
+
+    @abstractmethod
+    def _run(self, batch: np.ndarray) -> np.ndarray:
+        """执行推理，输入 NCHW float32，输出 (N, 4 + 类别数, 候选框数)"""
+        pass
+
+    def _model_size(self, imgsz: int) -> Tuple[int, int]:
+        """固定输入尺寸的模型使用模型尺寸，否则使用 imgsz"""
+        h, w = self.input_shape[2], self.input_shape[3]
+        if isinstance(h, int) and isinstance(w, int):
+            return h, w
+        return imgsz, imgsz
+
+    def _fixed_batch(self) -> bool:
+        return isinstance(self.input_shape[0], int)
+
+    def _detect(self, frames, conf=0.25, imgsz=640, classes=None, max_det=300):
+        t0 = time.perf_counter()
+        size = self._model_size(imgsz)
+        prepared = [letterbox(frame, size) for frame in frames]
+
+        def to_input(items):
+            batch = np.stack([img for img, _, _ in items])
+            # BGR HWC uint8 -> RGB NCHW float32
+            return np.ascontiguousarray(batch[..., ::-1].transpose(0, 3, 1, 2), dtype=np.float32) / 255.0
+
+        if self._fixed_batch():
+            # 导出时 batch 固定，逐张推理（预处理和推理交替进行，都计入推理）
+            t1 = time.perf_counter()
+            outputs = [self._run(to_input([item]))[0] for item in prepared]
+        else:
+            batch = to_input(prepared)
+            t1 = time.perf_counter()
+            outputs = list(self._run(batch))
+        t2 = time.perf_counter()
+
+        results = []
+        for frame, output, (_, ratio, pad) in zip(frames, outputs, prepared):
+            xyxy, scores, cls_ids = decode_yolo_output(
+                output, len(self.names), conf, ratio, pad, frame.shape[:2], self.iou,
+                min(max_det, self.max_det), classes)
+            results.append(Detections.from_arrays(xyxy, scores, cls_ids, self.names))
+        t3 = time.perf_counter()
+        self._set_timings(preprocess=(t1 - t0) * 1000, inference=(t2 - t1) * 1000,
+                          postprocess=(t3 - t2) * 1000, parse=0.0)
+        return results
+
+
+def _parse_names(value) -> Dict[int, str]:
+    """解析模型元数据中的类别名称"""
+    if isinstance(value, str):
+        value = ast.literal_eval(value)
+    if isinstance(value, (list, tuple)):
+        return dict(enumerate(value))
+    return {int(k): v for k, v in value.items()}
+
+
+class OnnxEngine(_ExportedModelEngine):
+    """
+    ONNX Runtime 推理
+
+    需要安装: pip install onnxruntime
+    """
+
+    name = "onnx"
+
+    def __init__(self, model_path: str, threads: Optional[int] = None):
+        """
+        参数:
+            model_path: .onnx 模型路径
+            threads: 算子内并行线程数（intra_op_num_threads），None表示默认
+        """
+        super().__init__()
+        import onnxruntime as ort
+
+        options = ort.SessionOptions()
+        if threads:
+            options.intra_op_num_threads = threads
+            options.inter_op_num_threads = 1
+        options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+        self.session = ort.InferenceSession(model_path, sess_options=options,
+                                            providers=['CPUExecutionProvider'])
+        model_input = self.session.get_inputs()[0]
+        self.input_name = model_input.name
+        self.input_shape = tuple(model_input.shape)
+
+        metadata = self.session.get_modelmeta().custom_metadata_map
+        if 'names' not in metadata:
+            raise ValueError(f"ONNX 模型缺少类别名称元数据（请使用 ultralytics 导出）: {model_path}")
+        self.names = _parse_names(metadata['names'])
+
+    def _run(self, batch):
+        return self.session.run(None, {self.input_name: batch})[0]
+
+
+class OpenVinoEngine(_ExportedModelEngine):
+    """
+    OpenVINO 推理
+
+    需要安装: pip install openvino
+    """
+
+    name = "openvino"
+
+    def __init__(self, model_path: str, threads: Optional[int] = None):
+        """
+        参数:
+            model_path: *_openvino_model 目录或其中的 .xml 文件
+            threads: 推理线程数（INFERENCE_NUM_THREADS），None表示默认
+        """
+        super().__init__()
+        import openvino as ov
+        import yaml
+
+        if os.path.isdir(model_path):
+            xml_files = glob.glob(os.path.join(model_path, '*.xml'))
+            if not xml_files:
+                raise FileNotFoundError(f"目录中没有 OpenVINO 模型: {model_path}")
+            xml_path = xml_files[0]
+        else:
+            xml_path = model_path
+
+        core = ov.Core()
+        model = core.read_model(xml_path)
+        config = {'PERFORMANCE_HINT': 'LATENCY'}
+        if threads:
+            config['INFERENCE_NUM_THREADS'] = threads
+        self.compiled = core.compile_model(model, 'CPU', config)
+        self.request = self.compiled.create_infer_request()
+
+        shape = model.inputs[0].get_partial_shape()
+        self.input_shape = tuple(d.get_length() if d.is_static else None for d in shape)
+
+        metadata_path = os.path.join(os.path.dirname(xml_path), 'metadata.yaml')
+        if not os.path.exists(metadata_path):
+            raise FileNotFoundError(f"缺少类别名称元数据: {metadata_path}")
+        with open(metadata_path, encoding='utf-8') as f:
+            self.names = _parse_names(yaml.safe_load(f)['names'])
+
+    def _run(self, batch):
+        return self.request.infer({0: batch})[self.compiled.outputs[0]]
+
+
+# ============================================
+# 工厂函数
+# ============================================
+
+ENGINES = {
+    'ultralytics': UltralyticsEngine,
+    'onnx': OnnxEngine,
+    'openvino': OpenVinoEngine,
+}
+
+
+def engine_for_path(model_path: str) -> str:
+    """根据模型路径推断引擎名称"""
+    path = model_path.rstrip('/\\')
+    if path.endswith('.onnx'):
+        return 'onnx'
+    if path.endswith('.xml') or path.endswith('_openvino_model'):
+        return 'openvino'
+    return 'ultralytics'
+
+
+def create_engine(model_path: str, engine: str = 'auto', threads: Optional[int] = None) -> InferenceEngine:
+    """
+    创建推理引擎
+
+    参数:
+        model_path: 模型路径（.pt / .onnx / *_openvino_model）
+        engine: 'auto'（按文件类型选择）/ 'ultralytics' / 'onnx' / 'openvino'
+        threads: CPU 推理线程数，None表示默认
+
+    返回:
+        InferenceEngine
+    """
+    if engine == 'auto':
+        engine = engine_for_path(model_path)
+    if engine not in ENGINES:
+        raise ValueError(f"未知的推理引擎: {engine}（可选: {', '.join(ENGINES)}）")
+    return ENGINES[engine](model_path, threads=threads)
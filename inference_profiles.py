@@ -0,0 +1,101 @@
+"""
+推理配置
+
+不同场景使用不同的推理参数: 菜单界面只有几个大按钮，低分辨率即可；
+拾取物品时 props 很小，需要更高的分辨率。
+
+- 脚本手动切换: detector.set_profile('menu')
+- 自动选择: detector.set_profile('auto')，根据上一次检测结果中出现的类别
+  （几乎没有额外开销）选择下一次推理使用的配置
+"""
+
+import threading
+from typing import Dict, NamedTuple, Optional, Tuple
+
+# yolo_dataset.yaml 中的类别
+MENU_CLASSES = ('button1', 'button2', 'startButton', 'dungeon')
+GAMEPLAY_CLASSES = ('person', 'monster', 'boss', 'props')
+
+
+class InferenceProfile(NamedTuple):
+    """一组推理参数"""
+    name: str
+    imgsz: int                                  # 全屏推理的输入尺寸
+    conf: Optional[float] = None                # 置信度阈值，None表示使用检测器的 conf
+    max_det: int = 300                          # 最多保留的检测框数
+    classes: Optional[Tuple[str, ...]] = None   # 只检测这些类别，None表示全部
+
+
+def default_profiles(imgsz: int = 640) -> Dict[str, InferenceProfile]:
+    """
+    默认配置
+
+    参数:
+        imgsz: 'default' 配置的输入尺寸
+    """
+    return {
+        'default': InferenceProfile('default', imgsz),
+        'menu': InferenceProfile('menu', 320, conf=0.4, max_det=20, classes=MENU_CLASSES),
+        'loot': InferenceProfile('loot', max(imgsz, 960)),
+    }
+
+
+def select_profile(current: str, names) -> str:
+    """
+    根据上一次检测到的类别选择下一次推理的配置
+
+    参数:
+        current: 上一次使用的配置名称
+        names: 上一次检测到的类别名称集合
+
+    返回:
+        配置名称
+    """
+    names = set(names)
+    if current == 'menu':
+        # 菜单配置只检测菜单类别，菜单元素消失后回到默认配置
+        return 'menu' if names & set(MENU_CLASSES) else 'default'
+    if 'props' in names:
+        return 'loot'
+    if names & set(MENU_CLASSES) and not names & set(GAMEPLAY_CLASSES):
+        return 'menu'
+    return 'default'
+
+
+class ProfileStats:
+    """按配置统计推理耗时和检测数量"""
+
+    def __init__(self):
+        self._stats: Dict[str, Dict[str, float]] = {}
+        self._lock = threading.Lock()
+
+    def record(self, name: str, elapsed_ms: float, detections: int):
+        """记录一次推理"""
+        with self._lock:
+            s = self._stats.setdefault(name, {'frames': 0, 'total_ms': 0.0, 'max_ms': 0.0, 'detections': 0})
+            s['frames'] += 1
+            s['total_ms'] += elapsed_ms
+            s['max_ms'] = max(s['max_ms'], elapsed_ms)
+            s['detections'] += detections
+
+    def get_stats(self) -> Dict[str, Dict[str, float]]:
+        """
+        返回:
+            {配置名称: {'frames': 推理次数, 'avg_ms': 平均耗时, 'max_ms': 最大耗时,
+                        'avg_detections': 平均检测框数}}
+        """
+        with self._lock:
+            return {
+                name: {
+                    'frames': s['frames'],
+                    'avg_ms': s['total_ms'] / s['frames'],
+                    'max_ms': s['max_ms'],
+                    'avg_detections': s['detections'] / s['frames'],
+                }
+                for name, s in self._stats.items()
+            }
+
+    def reset(self):
+        """重置统计"""
+        with self._lock:
+            self._stats.clear()
@@ -0,0 +1,328 @@
+"""
+异步输入执行器
+
+WindowsInput.click / press_key 在脚本线程里 time.sleep 等待按下和释放，
+一次点击就要阻塞上百毫秒，期间无法截图和推理。
+执行器在独立线程上按时间表执行输入动作，脚本提交后立即返回 Future，
+可以一边等待点击完成一边检测下一个目标:
+
+    executor = InputExecutor(game_input)
+    done = executor.click(x, y)             # 立即返回
+    next_xy = detector.get_center_by_name('props')
+    done.result()                           # 需要时再等待点击完成
+
+动作按提交顺序排队，同一次提交中的动作按各自的间隔依次执行；
+后提交的动作在前面的动作全部完成后才开始，不会穿插。
+cancel_all() 清空队列并释放仍按住的鼠标按钮和按键（GUI 停止时调用）。
+
+计时使用 time.perf_counter()，等到距离执行时刻 spin 秒时改为忙等，
+输入宏（input_macro.play_macro）也通过这里按绝对时间表执行。
+"""
+
+import threading
+import time
+from collections import deque
+from concurrent.futures import CancelledError, Future, InvalidStateError
+from typing import Deque, Iterable, List, NamedTuple
+
+
+class InputAction(NamedTuple):
+    """一个输入动作"""
+    kind: str               # 'move' / 'down' / 'up' / 'key' / 'key_down' / 'key_up' / 'wait'
+    delay: float = 0.0      # 与上一个动作的间隔（秒）
+    x: int = 0
+    y: int = 0
+    button: str = 'left'
+    vk: int = 0
+    hold: float = 0.05      # 'key' 按下到释放的时间（秒）
+
+
+def move(x, y, delay=0.0) -> InputAction:
+    return InputAction('move', delay, x=x, y=y)
+
+
+def down(button='left', delay=0.0) -> InputAction:
+    return InputAction('down', delay, button=button)
+
+
+def up(button='left', delay=0.0) -> InputAction:
+    return InputAction('up', delay, button=button)
+
+
+def key(vk, hold=0.05, delay=0.0) -> InputAction:
+    return InputAction('key', delay, vk=vk, hold=hold)
+
+
+def wait(seconds) -> InputAction:
+    return InputAction('wait', seconds)
+
+
+def apply_action(game_input, action: InputAction):
+    """立即执行一个动作（'key' 需先拆成 'key_down' / 'key_up'）"""
+    if action.kind == 'move':
+        game_input.move_mouse(action.x, action.y)
+    elif action.kind == 'down':
+        game_input.mouse_down(action.button)
+    elif action.kind == 'up':
+        game_input.mouse_up(action.button)
+    elif action.kind == 'key_down':
+        game_input.key_down(action.vk)
+    elif action.kind == 'key_up':
+        game_input.key_up(action.vk)
+    elif action.kind != 'wait':
+        raise ValueError(f"未知的输入动作: {action.kind}")
+
+
+class HeldInputs:
+    """记录仍按住的鼠标按钮和按键，取消时全部释放"""
+
+    def __init__(self):
+        self.buttons = set()
+        self.keys = set()
+
+    def track(self, action: InputAction):
+        if action.kind == 'down':
+            self.buttons.add(action.button)
+        elif action.kind == 'up':
+            self.buttons.discard(action.button)
+        elif action.kind == 'key_down':
+            self.keys.add(action.vk)
+        elif action.kind == 'key_up':
+            self.keys.discard(action.vk)
+
+    def release(self, game_input):
+        for button in list(self.buttons):
+            game_input.mouse_up(button)
+        for vk in list(self.keys):
+            game_input.key_up(vk)
+        self.buttons.clear()
+        self.keys.clear()
+
+
+class _Job:
+    """一次提交"""
+
+    def __init__(self, future: Future, count: int, absolute: bool = False):
+        self.future = future
+        self.remaining = count
+        self.started = False
+        self.absolute = absolute
+        self.offset = 0.0       # absolute: 第一个动作的实际执行时间比计划晚多少，整个时间表随之顺延
+        self.last_done = None   # 上一个动作的实际执行时间
+        self.times: List[float] = []
+
+    def finish(self, result=None, error=None):
+        """设置结果（与 cancel_all 竞争时以先到者为准）"""
+        try:
+            if error is not None:
+                self.future.set_exception(error)
+            else:
+                self.future.set_result(result)
+        except InvalidStateError:
+            pass
+
+
+class _Scheduled(NamedTuple):
+    at: float               # 计划执行时间 time.perf_counter()
+    action: InputAction
+    job: _Job
+
+
+class InputExecutor:
+    """在独立线程上按时间表执行输入动作"""
+
+    def __init__(self, game_input, spin: float = 0.002):
+        """
+        参数:
+            game_input: 提供 move_mouse / mouse_down / mouse_up / key_down / key_up 的输入控制器
+                        （如 WindowsInput）
+            spin: 忙等的时间窗口（秒）
+        """
+        self.game_input = game_input
+        self.spin = spin
+        self._queue: Deque[_Scheduled] = deque()
+        self._cond = threading.Condition()
+        self._tail = 0.0                # 队列中最后一个动作的计划时间
+        self._held = HeldInputs()
+        self._exec_lock = threading.Lock()   # 执行动作与取消后的释放互斥
+        self._closed = False
+        self.stats = {'actions': 0, 'jobs': 0, 'cancelled': 0, 'max_late_ms': 0.0}
+        self._thread = threading.Thread(target=self._worker, name="InputExecutor", daemon=True)
+        self._thread.start()
+
+    # ========== 提交 ==========
+
+    def submit(self, actions: Iterable[InputAction], start_delay: float = 0.0,
+               absolute: bool = False) -> Future:
+        """
+        提交一组动作
+
+        参数:
+            actions: 按顺序执行的动作
+            start_delay: 第一个动作最早在多少秒后执行
+            absolute: 按提交时算好的时间表执行，前一个动作晚了也不顺延后面的动作（输入宏）；
+                      默认保证相邻动作的间隔不被压缩
+
+        返回:
+            Future，最后一个动作执行后结果为完成时间（time.perf_counter()）；
+            absolute 为真时结果为每个动作开始执行的时间；
+            被取消时 result() 抛出 CancelledError
+        """
+        # 'key' 拆成按下和释放两个动作
+        steps: List[InputAction] = []
+        for action in actions:
+            if action.kind == 'key':
+                steps.append(InputAction('key_down', action.delay, vk=action.vk))
+                steps.append(InputAction('key_up', action.hold, vk=action.vk))
+            else:
+                steps.append(action)
+
+        future = Future()
+        with self._cond:
+            if self._closed:
+                future.set_exception(RuntimeError("输入执行器已关闭"))
+                return future
+            job = _Job(future, len(steps), absolute)
+            at = max(time.perf_counter() + start_delay, self._tail)
+            for action in steps:
+                at += action.delay
+                self._queue.append(_Scheduled(at, action, job))
+            self._tail = at
+            self.stats['jobs'] += 1
+            if not steps:
+                future.set_result(() if absolute else time.perf_counter())
+            self._cond.notify()
+        return future
+
+    def move(self, x, y) -> Future:
+        """移动鼠标"""
+        return self.submit([move(x, y)])
+
+    def click(self, x=None, y=None, button='left', hold=0.05, settle=0.05) -> Future:
+        """
+        点击（对应 WindowsInput.click）
+
+        参数:
+            x, y: 坐标（None则在当前位置点击）
+            hold: 按下到释放的时间（秒）
+            settle: 移动鼠标后到按下的时间（秒）
+        """
+        actions = [] if x is None or y is None else [move(x, y)]
+        actions += [down(button, settle if actions else 0.0), up(button, hold)]
+        return self.submit(actions)
+
+    def double_click(self, x=None, y=None, hold=0.05, interval=0.05, settle=0.05) -> Future:
+        """双击"""
+        actions = [] if x is None or y is None else [move(x, y)]
+        actions += [down(delay=settle if actions else 0.0), up(delay=hold),
+                    down(delay=interval), up(delay=hold)]
+        return self.submit(actions)
+
+    def press(self, vk, hold=0.05, times=1, interval=0.1) -> Future:
+        """按键，times > 1 时按 interval 间隔重复"""
+        return self.submit([key(vk, hold, delay=interval if i else 0.0) for i in range(times)])
+
+    def wait(self, seconds) -> Future:
+        """排入一段等待，之后提交的动作在其后执行"""
+        return self.submit([wait(seconds)])
+
+    # ========== 取消 ==========
+
+    @property
+    def pending(self) -> int:
+        """尚未执行的动作数"""
+        with self._cond:
+            return len(self._queue)
+
+    def cancel_all(self):
+        """取消所有未执行的动作，并释放仍按住的鼠标按钮和按键"""
+        with self._cond:
+            jobs = {id(item.job): item.job for item in self._queue}
+            self._queue.clear()
+            self._tail = 0.0
+            self.stats['cancelled'] += len(jobs)
+            self._cond.notify()
+        for job in jobs.values():
+            if not job.future.cancel():
+                # 已开始执行的提交
+                job.finish(error=CancelledError("输入动作已取消"))
+        self._release_all()
+
+    def close(self, timeout: float = 1.0):
+        """取消所有动作并停止执行线程"""
+        self.cancel_all()
+        with self._cond:
+            self._closed = True
+            self._cond.notify()
+        self._thread.join(timeout)
+
+    def _release_all(self):
+        with self._exec_lock:
+            self._held.release(self.game_input)
+
+    # ========== 执行线程 ==========
+
+    def _execute(self, action: InputAction):
+        apply_action(self.game_input, action)
+        self._held.track(action)
+
+    def _drop_job(self, job: _Job):
+        """从队列中移除某次提交剩余的动作"""
+        with self._cond:
+            self._queue = deque(item for item in self._queue if item.job is not job)
+            if not self._queue:
+                self._tail = 0.0
+
+    def _worker(self):
+        while True:
+            with self._cond:
+                while not self._queue and not self._closed:
+                    self._cond.wait()
+                if not self._queue:
+                    return
+                item = self._queue[0]
+                due = item.at
+                if item.job.absolute:
+                    due += item.job.offset
+                elif item.job.last_done is not None:
+                    # 前一个动作执行晚了也保证间隔（按住时间不会被压缩）
+                    due = max(due, item.job.last_done + item.action.delay)
+                delay = due - time.perf_counter()
+                if delay > self.spin:
+                    # 等待期间可能被取消或有更早的动作，醒来后重新检查
+                    self._cond.wait(delay - self.spin)
+                    continue
+                self._queue.popleft()
+
+            # 最后几毫秒忙等（出队后被取消由下面的检查处理）
+            while time.perf_counter() < due:
+                pass
+
+            job = item.job
+            if not job.started:
+                job.started = True
+                if not job.future.set_running_or_notify_cancel():
+                    # 提交者已取消
+                    self._drop_job(job)
+                    continue
+            started_at = time.perf_counter()
+            late = started_at - due
+            if job.absolute and not job.times:
+                job.offset = late
+            with self._exec_lock:
+                if job.future.done():
+                    # 出队后被 cancel_all 取消
+                    continue
+                try:
+                    self._execute(item.action)
+                except Exception as e:
+                    self._drop_job(job)
+                    job.finish(error=e)
+                    continue
+            job.last_done = time.perf_counter()
+            job.times.append(started_at)
+            self.stats['actions'] += 1
+            self.stats['max_late_ms'] = max(self.stats['max_late_ms'], late * 1000)
+            job.remaining -= 1
+            if job.remaining == 0:
+                job.finish(tuple(job.times) if job.absolute else job.last_done)
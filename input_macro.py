@@ -0,0 +1,310 @@
+"""
+输入宏
+
+press_a()（间隔 0.1 秒按 5 次 A）、两次 click + sleep(0.05) 拼成的双击、
+DungeonScript 步骤3 的右键闪现，都是手写的 sleep 序列，每个 sleep 的误差会累积。
+宏用文本描述定时输入序列，编译一次得到按绝对时间排好的事件表，
+交给 InputExecutor 的执行线程按表执行（sleep 到临近时刻后忙等），并报告计划与实际时间的偏差。
+与其他输入共用同一个执行队列，宏的动作不会和别的点击穿插，GUI 停止时 cancel_all() 一并取消。
+
+格式（每行或分号分隔一个步骤，# 之后为注释）:
+    move X Y                    移动鼠标（X/Y 可以是 {参数名}，播放时传入）
+    down [left|right]           按下鼠标按钮
+    up [left|right]             释放鼠标按钮
+    click [left|right] [hold T] 点击，按住 T（默认 30ms）
+    key K [hold T]              按键，K 为字母/数字、键名（space/enter/esc/tab/shift/ctrl/alt/f1-f12）或 0x41
+    wait T                      等待
+任意步骤后可加 "xN every T" 表示每隔 T 重复 N 次。时间 T 写作 100ms / 0.1s，不带单位为毫秒。
+
+用法:
+    PRESS_A = compile_macro("key a hold 30ms x5 every 100ms", name="press_a")
+    report = play_macro(executor, PRESS_A).result()
+    print(report.format())
+
+    # 没有执行器时在脚本线程里直接播放
+    run_macro(game_input, BLINK, x=960, y=216)
+"""
+
+import re
+import threading
+import time
+from concurrent.futures import Future
+from typing import Dict, List, NamedTuple, Optional, Tuple
+
+from input_executor import HeldInputs, InputAction, apply_action
+
+# 虚拟键码
+VK_NAMES: Dict[str, int] = {
+    'space': 0x20, 'enter': 0x0D, 'esc': 0x1B, 'tab': 0x09,
+    'shift': 0x10, 'ctrl': 0x11, 'alt': 0x12,
+    **{f'f{i}': 0x6F + i for i in range(1, 13)},
+}
+
+DEFAULT_HOLD = 0.03
+
+
+class MacroEvent(NamedTuple):
+    """事件表中的一项"""
+    at: float               # 相对宏开始的时间（秒）
+    action: InputAction
+
+
+class Macro(NamedTuple):
+    """编译后的宏"""
+    name: str
+    events: Tuple[MacroEvent, ...]
+    duration: float         # 最后一个事件的时间（秒）
+    params: Tuple[str, ...] # 播放时需要传入的参数名
+
+    def bind(self, **params) -> Tuple[MacroEvent, ...]:
+        """代入参数，返回可以执行的事件表"""
+        missing = set(self.params) - set(params)
+        if missing:
+            raise ValueError(f"宏 {self.name} 缺少参数: {', '.join(sorted(missing))}")
+        if not self.params:
+            return self.events
+        return tuple(
+            MacroEvent(e.at, e.action._replace(x=_value(e.action.x, params), y=_value(e.action.y, params)))
+            for e in self.events
+        )
+
+
+def _value(v, params):
+    return int(params[v[1:-1]]) if isinstance(v, str) else v
+
+
+def _parse_time(token: str) -> float:
+    """'100ms' / '0.1s' / '100' -> 秒"""
+    m = re.fullmatch(r'(\d+(?:\.\d+)?)(ms|s)?', token)
+    if not m:
+        raise ValueError(f"无法解析时间: {token}")
+    value = float(m.group(1))
+    return value if m.group(2) == 's' else value / 1000
+
+
+def _parse_key(token: str) -> int:
+    token = token.lower()
+    if token in VK_NAMES:
+        return VK_NAMES[token]
+    if token.startswith('0x'):
+        return int(token, 16)
+    if len(token) == 1 and token.isalnum():
+        return ord(token.upper())
+    raise ValueError(f"未知的按键: {token}")
+
+
+def _parse_coord(token: str):
+    if re.fullmatch(r'\{\w+\}', token):
+        return token
+    return int(token)
+
+
+def _parse_hold(args: List[str]) -> Tuple[List[str], float]:
+    if len(args) >= 2 and args[-2] == 'hold':
+        return args[:-2], _parse_time(args[-1])
+    return args, DEFAULT_HOLD
+
+
+def _parse_step(tokens: List[str]) -> Tuple[List[MacroEvent], float]:
+    """
+    解析一个步骤（不含重复后缀）
+
+    返回:
+        (相对步骤开始的事件, 步骤耗时)
+    """
+    cmd, args = tokens[0].lower(), tokens[1:]
+    if cmd == 'move':
+        if len(args) != 2:
+            raise ValueError("move 需要两个坐标")
+        return [MacroEvent(0.0, InputAction('move', x=_parse_coord(args[0]), y=_parse_coord(args[1])))], 0.0
+    if cmd in ('down', 'up'):
+        button = args[0] if args else 'left'
+        return [MacroEvent(0.0, InputAction(cmd, button=button))], 0.0
+    if cmd == 'click':
+        args, hold = _parse_hold(args)
+        button = args[0] if args else 'left'
+        return [MacroEvent(0.0, InputAction('down', button=button)),
+                MacroEvent(hold, InputAction('up', button=button))], hold
+    if cmd == 'key':
+        args, hold = _parse_hold(args)
+        if len(args) != 1:
+            raise ValueError("key 需要一个按键")
+        vk = _parse_key(args[0])
+        return [MacroEvent(0.0, InputAction('key_down', vk=vk)),
+                MacroEvent(hold, InputAction('key_up', vk=vk))], hold
+    if cmd == 'wait':
+        if len(args) != 1:
+            raise ValueError("wait 需要一个时间")
+        return [], _parse_time(args[0])
+    raise ValueError(f"未知的宏命令: {cmd}")
+
+
+def compile_macro(text: str, name: str = "macro") -> Macro:
+    """
+    把宏文本编译为按绝对时间排列的事件表
+
+    参数:
+        text: 宏文本（格式见模块说明）
+        name: 宏名称（用于报告）
+
+    返回:
+        Macro
+    """
+    events: List[MacroEvent] = []
+    t = 0.0
+    for line in text.splitlines():
+        line = line.split('#', 1)[0]
+        for step in line.split(';'):
+            tokens = step.split()
+            if not tokens:
+                continue
+            count, period = 1, 0.0
+            if len(tokens) >= 4 and tokens[-2] == 'every' and re.fullmatch(r'x\d+', tokens[-3]):
+                count, period = int(tokens[-3][1:]), _parse_time(tokens[-1])
+                tokens = tokens[:-3]
+            try:
+                step_events, duration = _parse_step(tokens)
+            except ValueError as e:
+                raise ValueError(f"宏 {name} 第 {len(events)} 个事件附近: {step.strip()}: {e}") from None
+            if count > 1 and period < duration:
+                raise ValueError(f"宏 {name}: 重复间隔 {period * 1000:.0f}ms 小于步骤耗时 {duration * 1000:.0f}ms")
+            for k in range(count):
+                start = t + k * period
+                events.extend(MacroEvent(start + e.at, e.action) for e in step_events)
+            t += (count - 1) * period + duration
+
+    params = sorted({v[1:-1] for e in events for v in (e.action.x, e.action.y) if isinstance(v, str)})
+    return Macro(name, tuple(events), t, tuple(params))
+
+
+# ========== 常用宏 ==========
+
+# game_utils.press_a: 间隔 0.1 秒按 5 次 A
+PRESS_A = compile_macro("key a hold 30ms x5 every 100ms", name="press_a")
+# 双击（按住 30ms，两次按下间隔 80ms）
+DOUBLE_CLICK = compile_macro("click hold 30ms; wait 50ms; click hold 30ms", name="double_click")
+# DungeonScript 步骤3: 移到目标位置后右键闪现
+BLINK = compile_macro("move {x} {y}; wait 200ms; click right", name="blink")
+
+
+# ========== 执行 ==========
+
+class MacroReport(NamedTuple):
+    """一次播放的计划时间与实际时间（相对开始，毫秒）"""
+    name: str
+    scheduled: Tuple[float, ...]
+    actual: Tuple[float, ...]
+    cancelled: bool = False
+
+    @property
+    def errors(self) -> Tuple[float, ...]:
+        """每个事件的延迟（毫秒）"""
+        return tuple(a - s for s, a in zip(self.scheduled, self.actual))
+
+    @property
+    def max_error_ms(self) -> float:
+        return max(self.errors, default=0.0)
+
+    @property
+    def mean_error_ms(self) -> float:
+        errors = self.errors
+        return sum(errors) / len(errors) if errors else 0.0
+
+    def format(self) -> str:
+        """单行摘要"""
+        planned = self.scheduled[-1] if self.scheduled else 0.0
+        actual = self.actual[-1] if self.actual else 0.0
+        status = "（已取消）" if self.cancelled else ""
+        return (f"{self.name}: {len(self.actual)}/{len(self.scheduled)} 个事件, 计划 {planned:.1f}ms, "
+                f"实际 {actual:.1f}ms, 延迟 平均 {self.mean_error_ms:.2f}ms / 最大 {self.max_error_ms:.2f}ms{status}")
+
+
+def _sleep_until(deadline: float, cancel: threading.Event, spin: float) -> bool:
+    """等到 deadline（perf_counter），sleep 到剩余 spin 秒后忙等；被取消时返回 False"""
+    while True:
+        if cancel.is_set():
+            return False
+        remaining = deadline - time.perf_counter()
+        if remaining <= 0:
+            return True
+        if remaining > spin:
+            # 分段 sleep，保证取消能及时生效
+            time.sleep(min(remaining - spin, 0.05))
+
+
+def _play_events(game_input, name: str, events: Tuple[MacroEvent, ...], held: HeldInputs,
+                 cancel: threading.Event, spin: float) -> MacroReport:
+    """按事件表执行，取消或出错时释放仍按住的按钮和按键"""
+    actual: List[float] = []
+    start = time.perf_counter()
+    cancelled = False
+    try:
+        for event in events:
+            if not _sleep_until(start + event.at, cancel, spin):
+                cancelled = True
+                break
+            apply_action(game_input, event.action)
+            actual.append((time.perf_counter() - start) * 1000)
+            held.track(event.action)
+    except Exception:
+        held.release(game_input)
+        raise
+    if cancelled:
+        held.release(game_input)
+    return MacroReport(name, tuple(e.at * 1000 for e in events), tuple(actual), cancelled)
+
+
+def run_macro(game_input, macro: Macro, cancel: Optional[threading.Event] = None,
+              spin: float = 0.002, **params) -> MacroReport:
+    """
+    在当前线程播放宏并等待完成
+
+    参数:
+        game_input: 提供 move_mouse / mouse_down / mouse_up / key_down / key_up 的输入控制器
+        macro: 编译后的宏
+        cancel: 设置后中止播放（可选）
+        spin: 忙等的时间窗口（秒）
+        **params: 宏参数，如 x=100, y=200
+
+    返回:
+        MacroReport
+    """
+    return _play_events(game_input, macro.name, macro.bind(**params), HeldInputs(),
+                        cancel or threading.Event(), spin)
+
+
+def play_macro(executor, macro: Macro, **params) -> Future:
+    """
+    把宏排入输入执行器（与其他输入动作按提交顺序执行，不会穿插）
+
+    参数:
+        executor: InputExecutor
+        macro: 编译后的宏
+        **params: 宏参数，如 x=100, y=200
+
+    返回:
+        Future，结果为 MacroReport；被 cancel_all() 取消时 result() 抛出 CancelledError
+    """
+    events = macro.bind(**params)
+    actions, prev = [], 0.0
+    for event in events:
+        actions.append(event.action._replace(delay=event.at - prev))
+        prev = event.at
+    inner = executor.submit(actions, absolute=True)
+    future = Future()
+
+    def on_done(f: Future):
+        if f.cancelled():
+            future.cancel()
+            return
+        error = f.exception()
+        if error is not None:
+            future.set_exception(error)
+            return
+        times = f.result()
+        start = times[0] - events[0].at if times else 0.0
+        future.set_result(MacroReport(macro.name, tuple(e.at * 1000 for e in events),
+                                      tuple((t - start) * 1000 for t in times)))
+
+    inner.add_done_callback(on_done)
+    return future
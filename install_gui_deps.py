@@ -23,6 +23,7 @@ def main():
 
     packages = [
         "keyboard",  # 全局快捷键支持
+        "mss",       # 快速截屏
     ]
 
     print("\n需要安装的包:")
@@ -0,0 +1,108 @@
+"""
+分阶段耗时统计
+
+检测热路径（截图、颜色转换、预处理、推理、后处理、解析、合并）的每个阶段
+把耗时写入固定长度的滚动窗口，查询时计算 p50/p95/p99。
+记录一次只需两次 perf_counter 和一次数组写入，开销可以忽略。
+
+用法:
+    latency = LatencyRecorder()
+    with latency.measure('capture'):
+        frame = grab()
+    latency.record('inference', 12.3)
+    print(latency.summary())
+    latency.dump_json('latency.json')
+"""
+
+import json
+import threading
+import time
+from contextlib import contextmanager
+from typing import Dict, Iterable, Optional
+
+import numpy as np
+
+
+class LatencyRecorder:
+    """按阶段记录耗时（毫秒）"""
+
+    def __init__(self, window: int = 1024, enabled: bool = True):
+        """
+        参数:
+            window: 每个阶段保留的最近样本数
+            enabled: False 时不记录
+        """
+        self.window = window
+        self.enabled = enabled
+        self._samples: Dict[str, np.ndarray] = {}   # 阶段 -> 环形缓冲区
+        self._counts: Dict[str, int] = {}           # 阶段 -> 累计记录次数
+        self._lock = threading.Lock()
+
+    def record(self, stage: str, elapsed_ms: float):
+        """记录一次耗时"""
+        if not self.enabled:
+            return
+        with self._lock:
+            samples = self._samples.get(stage)
+            if samples is None:
+                samples = self._samples[stage] = np.empty(self.window, dtype=np.float64)
+                self._counts[stage] = 0
+            count = self._counts[stage]
+            samples[count % self.window] = elapsed_ms
+            self._counts[stage] = count + 1
+
+    def record_since(self, stage: str, start: float) -> float:
+        """记录从 start（time.perf_counter()）到现在的耗时，返回当前时间"""
+        now = time.perf_counter()
+        self.record(stage, (now - start) * 1000)
+        return now
+
+    @contextmanager
+    def measure(self, stage: str):
+        """统计 with 代码块的耗时"""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.record_since(stage, start)
+
+    def summary(self, stages: Optional[Iterable[str]] = None) -> Dict[str, Dict[str, float]]:
+        """
+        返回:
+            {阶段: {'count': 累计次数, 'mean': 平均, 'p50', 'p95', 'p99', 'max'}}（窗口内样本，毫秒）
+        """
+        with self._lock:
+            names = list(self._samples) if stages is None else [s for s in stages if s in self._samples]
+            data = {name: (self._samples[name][:min(self._counts[name], self.window)].copy(),
+                           self._counts[name]) for name in names}
+
+        result = {}
+        for name, (samples, count) in data.items():
+            if not len(samples):
+                continue
+            p50, p95, p99 = np.percentile(samples, [50, 95, 99])
+            result[name] = {
+                'count': count,
+                'mean': float(samples.mean()),
+                'p50': float(p50),
+                'p95': float(p95),
+                'p99': float(p99),
+                'max': float(samples.max()),
+            }
+        return result
+
+    def format_summary(self, stages: Optional[Iterable[str]] = None) -> str:
+        """单行摘要，例如 'capture 8.1/12.0ms | inference 35.2/41.7ms'（p50/p95）"""
+        return " | ".join(f"{name} {s['p50']:.1f}/{s['p95']:.1f}ms"
+                          for name, s in self.summary(stages).items())
+
+    def dump_json(self, path: str):
+        """把统计结果写入 JSON 文件"""
+        with open(path, 'w', encoding='utf-8') as f:
+            json.dump({'window': self.window, 'stages': self.summary()}, f, ensure_ascii=False, indent=2)
+
+    def reset(self):
+        """清除所有样本"""
+        with self._lock:
+            self._samples.clear()
+            self._counts.clear()
@@ -0,0 +1,132 @@
+"""
+进程级模型缓存
+
+按（模型真实路径, 文件修改时间, 引擎, 线程数）缓存已加载并预热的推理引擎，
+GUI 多次启动/停止脚本时不再重复加载模型。模型文件被替换后修改时间变化，会自动重新加载。
+
+用法:
+    model_registry.preload("hjzgv1.pt")        # GUI 打开时在后台加载并预热
+    engine = model_registry.get_engine("hjzgv1.pt")  # 已加载则立即返回
+"""
+
+import os
+import threading
+import time
+from concurrent.futures import Future
+from typing import Callable, Dict, NamedTuple, Optional, Tuple
+
+import numpy as np
+
+from inference_engines import InferenceEngine, create_engine, engine_for_path
+
+
+class LoadedModel(NamedTuple):
+    """已加载的模型"""
+    engine: InferenceEngine
+    load_seconds: float     # 加载耗时
+    warmup_seconds: float   # 预热耗时
+
+
+_lock = threading.Lock()
+_entries: Dict[Tuple, Future] = {}
+
+
+def _model_key(model_path: str, engine: str, threads: Optional[int]) -> Tuple:
+    path = os.path.realpath(model_path)
+    mtime = os.path.getmtime(path)
+    if engine == 'auto':
+        engine = engine_for_path(path)
+    return (path, mtime, engine, threads or 0)
+
+
+def _load(key: Tuple, future: Future, warmup_imgsz: int):
+    """加载并预热模型，结果写入 future"""
+    path, _, engine, threads = key
+    try:
+        t0 = time.perf_counter()
+        instance = create_engine(path, engine, threads or None)
+        t1 = time.perf_counter()
+        if warmup_imgsz:
+            instance.detect([np.zeros((warmup_imgsz, warmup_imgsz, 3), dtype=np.uint8)], imgsz=warmup_imgsz)
+        t2 = time.perf_counter()
+        future.set_result(LoadedModel(instance, t1 - t0, t2 - t1))
+    except BaseException as e:
+        # 加载失败不缓存，下次重试
+        with _lock:
+            if _entries.get(key) is future:
+                del _entries[key]
+        future.set_exception(e)
+
+
+def _get_or_create(model_path: str, engine: str, threads: Optional[int]) -> Tuple[Tuple, Future, bool]:
+    key = _model_key(model_path, engine, threads)
+    with _lock:
+        future = _entries.get(key)
+        if future is not None:
+            return key, future, False
+        # 同一文件的旧版本（修改时间不同）不再需要
+        for old in [k for k in _entries if k[0] == key[0] and k[1] != key[1]]:
+            del _entries[old]
+        future = Future()
+        _entries[key] = future
+        return key, future, True
+
+
+def preload(model_path: str, engine: str = 'auto', threads: Optional[int] = None,
+            warmup_imgsz: int = 640, callback: Optional[Callable[[Future], None]] = None) -> Future:
+    """
+    在后台线程加载并预热模型
+
+    参数:
+        model_path: 模型路径
+        engine: 推理引擎名称
+        threads: CPU 推理线程数
+        warmup_imgsz: 预热用空白图像的尺寸，0表示不预热
+        callback: 加载完成（或失败）后调用 callback(future)，在后台线程中执行
+
+    返回:
+        Future，结果为 LoadedModel
+    """
+    key, future, created = _get_or_create(model_path, engine, threads)
+    if created:
+        threading.Thread(target=_load, args=(key, future, warmup_imgsz),
+                         name="ModelPreload", daemon=True).start()
+    if callback is not None:
+        future.add_done_callback(callback)
+    return future
+
+
+def load(model_path: str, engine: str = 'auto', threads: Optional[int] = None,
+         warmup_imgsz: int = 640, timeout: Optional[float] = None) -> LoadedModel:
+    """
+    获取模型，未加载时在当前线程加载，正在后台加载时等待其完成
+
+    返回:
+        LoadedModel
+    """
+    key, future, created = _get_or_create(model_path, engine, threads)
+    if created:
+        _load(key, future, warmup_imgsz)
+    return future.result(timeout)
+
+
+def get_engine(model_path: str, engine: str = 'auto', threads: Optional[int] = None) -> InferenceEngine:
+    """获取已缓存（或新加载）的推理引擎"""
+    return load(model_path, engine, threads).engine
+
+
+def is_loaded(model_path: str, engine: str = 'auto', threads: Optional[int] = None) -> bool:
+    """模型是否已加载完成（可以立即使用）"""
+    try:
+        key = _model_key(model_path, engine, threads)
+    except OSError:
+        return False
+    with _lock:
+        future = _entries.get(key)
+    return future is not None and future.done() and future.exception() is None
+
+
+def clear():
+    """清空缓存"""
+    with _lock:
+        _entries.clear()
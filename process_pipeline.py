@@ -0,0 +1,598 @@
+"""
+多进程检测流水线
+
+后台连续检测在同一进程内用线程截图+推理时，Python 部分（预处理、解析、NMS、截图转换）
+与脚本线程争抢 GIL，推理越慢脚本的输入操作越卡顿。多进程模式把两者移出主进程:
+
+    截图进程 --(共享内存帧环)--> 推理进程 --(共享内存结果区)--> 主进程（只读）
+
+- 帧环: K 个预分配的 高x宽x3 uint8 槽位，截图进程只写推理进程未在读的槽位，
+  推理进程直接在共享内存上建立 numpy 视图推理，不经过 pickle/管道拷贝
+- 结果区: 两个槽位的 DETECTION_DTYPE 数组，推理进程交替写入，写完后才发布序号；
+  主进程按序号读取并在读完后复核序号（seqlock），读到的结果不会半新半旧
+- 控制区: 一个 float64 数组存放序号、耗时等，x86 上 8 字节对齐写入是原子的
+
+所有进程都使用 spawn 方式启动（与 Windows 一致），子进程入口必须是模块级函数。
+
+用法:
+    pipeline = ProcessPipeline('hjzgv1.pt', frame_source='mss', target_fps=15)
+    pipeline.start()
+    result = pipeline.wait_result(after_seq=0)      # (序号, 截图时间, Detections)
+    pipeline.stop()
+
+对比单进程（线程）模式:
+    python process_pipeline.py hjzgv1.pt --seconds 10
+"""
+
+import multiprocessing as mp
+import threading
+import time
+from multiprocessing import shared_memory
+from typing import Dict, Optional, Tuple
+
+import numpy as np
+
+from detections import DETECTION_DTYPE, Detections
+from frame_sources import FrameSource, create_frame_source
+
+Region = Tuple[int, int, int, int]
+
+# 控制区布局（float64 下标）
+_FRAME_SEQ = 0          # 最新一帧的序号
+_FRAME_SLOT = 1         # 最新一帧所在槽位
+_READING_SLOT = 2       # 推理进程正在读取的槽位，-1 表示没有
+_RESULT_SEQ = 3         # 最新结果的序号
+_CAPTURE_MS = 4         # 最近一次截图耗时
+_INFERENCE_MS = 5       # 最近一次推理耗时
+_FRAMES_CAPTURED = 6
+_FRAMES_DROPPED = 7     # 推理期间槽位被覆盖而丢弃的结果
+_READY = 8              # 推理进程模型加载完成为 1，加载失败为 -1
+_CAPTURE_FAILED = 9     # 截图进程连续失败而退出时为 1
+_HEADER = 16
+# 每个帧槽位: 序号、截图时间
+_SLOT_FIELDS = 2
+# 每个结果槽位: 序号、对应帧序号、截图时间、检测数量
+_RESULT_FIELDS = 4
+_RESULT_SLOTS = 2
+
+
+def frame_source_spec(source) -> str:
+    """子进程重新创建图像来源所需的名称或路径"""
+    if isinstance(source, FrameSource):
+        return getattr(source, 'path', None) or getattr(source, 'directory', None) or source.name
+    return source or 'auto'
+
+
+def _attach(name: str) -> shared_memory.SharedMemory:
+    """
+    子进程连接已有的共享内存（由主进程负责释放）
+
+    spawn 出的子进程与主进程共用同一个 resource_tracker，连接时的重复登记不会导致误删
+    """
+    return shared_memory.SharedMemory(name=name)
+
+
+class SharedBuffers:
+    """帧环、结果区和控制区的共享内存布局（主进程创建，子进程按名称连接）"""
+
+    def __init__(self, frame_shape: Tuple[int, int, int], slots: int = 3, max_det: int = 300,
+                 names: Optional[Tuple[str, str, str]] = None):
+        """
+        参数:
+            frame_shape: 帧尺寸 (高, 宽, 3)
+            slots: 帧环槽位数（至少 3: 最新帧、正在推理的帧、正在写入的帧）
+            max_det: 每帧最多保存的检测框数
+            names: 子进程连接时传入主进程创建的共享内存名称
+        """
+        if slots < 3:
+            raise ValueError("帧环至少需要 3 个槽位")
+        self.frame_shape = tuple(frame_shape)
+        self.slots = slots
+        self.max_det = max_det
+        frame_bytes = int(np.prod(self.frame_shape))
+        control_len = _HEADER + slots * _SLOT_FIELDS + _RESULT_SLOTS * _RESULT_FIELDS
+        sizes = (slots * frame_bytes, _RESULT_SLOTS * max_det * DETECTION_DTYPE.itemsize, control_len * 8)
+
+        self._size_warned = None    # 已提示过的不匹配帧尺寸
+        self.owner = names is None
+        if self.owner:
+            self._shm = [shared_memory.SharedMemory(create=True, size=size) for size in sizes]
+        else:
+            self._shm = [_attach(name) for name in names]
+        frames_shm, results_shm, control_shm = self._shm
+
+        self.frames = np.ndarray((slots,) + self.frame_shape, dtype=np.uint8, buffer=frames_shm.buf)
+        self.results = np.ndarray((_RESULT_SLOTS, max_det), dtype=DETECTION_DTYPE, buffer=results_shm.buf)
+        self.control = np.ndarray(control_len, dtype=np.float64, buffer=control_shm.buf)
+        self.slot_meta = self.control[_HEADER:_HEADER + slots * _SLOT_FIELDS].reshape(slots, _SLOT_FIELDS)
+        self.result_meta = self.control[_HEADER + slots * _SLOT_FIELDS:].reshape(_RESULT_SLOTS, _RESULT_FIELDS)
+        if self.owner:
+            self.control[:] = 0
+            self.control[_READING_SLOT] = -1
+            self.control[_FRAME_SLOT] = -1
+
+    @property
+    def names(self) -> Tuple[str, str, str]:
+        return tuple(shm.name for shm in self._shm)
+
+    @property
+    def nbytes(self) -> int:
+        return sum(shm.size for shm in self._shm)
+
+    # ----- 截图进程 -----
+
+    def write_frame(self, frame: np.ndarray, timestamp: float) -> int:
+        """
+        把一帧写入推理进程未在读取的槽位并发布（尺寸与槽位不同时裁剪或填黑）
+
+        返回:
+            帧序号
+        """
+        control = self.control
+        latest = int(control[_FRAME_SLOT])
+        reading = int(control[_READING_SLOT])
+        slot = (latest + 1) % self.slots
+        while slot == latest or slot == reading:
+            slot = (slot + 1) % self.slots
+
+        seq = int(control[_FRAME_SEQ]) + 1
+        dst = self.frames[slot]
+        fh, fw = self.frame_shape[:2]
+        h, w = min(frame.shape[0], fh), min(frame.shape[1], fw)
+        self.slot_meta[slot, 0] = 0           # 写入期间标记为无效
+        if frame.shape[:2] != (fh, fw):
+            # 窗口或分辨率在启动后变化: 超出槽位的部分裁掉，不足的部分填黑
+            if self._size_warned != frame.shape[:2]:
+                self._size_warned = frame.shape[:2]
+                print(f"截图尺寸 {frame.shape[1]}x{frame.shape[0]} 与启动时的 {fw}x{fh} 不一致，"
+                      f"已裁剪/填充，重新开始后台检测可恢复")
+            dst[h:] = 0
+            dst[:h, w:] = 0
+        np.copyto(dst[:h, :w], frame[:h, :w])
+        self.slot_meta[slot, 1] = timestamp
+        self.slot_meta[slot, 0] = seq
+        control[_FRAME_SLOT] = slot
+        control[_FRAME_SEQ] = seq
+        return seq
+
+    # ----- 推理进程 -----
+
+    def acquire_latest(self) -> Optional[Tuple[int, int, float]]:
+        """
+        锁定最新一帧供推理读取
+
+        返回:
+            (槽位, 帧序号, 截图时间)，尚无新帧时返回 None
+        """
+        slot = int(self.control[_FRAME_SLOT])
+        if slot < 0:
+            return None
+        self.control[_READING_SLOT] = slot
+        seq = int(self.slot_meta[slot, 0])
+        if seq == 0:
+            # 锁定前槽位恰好被重新写入，下次再取
+            self.control[_READING_SLOT] = -1
+            return None
+        return slot, seq, float(self.slot_meta[slot, 1])
+
+    def release(self, slot: int, seq: int) -> bool:
+        """结束读取，返回读取期间槽位是否未被覆盖"""
+        valid = int(self.slot_meta[slot, 0]) == seq
+        self.control[_READING_SLOT] = -1
+        return valid
+
+    def write_result(self, detections: Detections, frame_seq: int, timestamp: float):
+        """写入检测结果并发布"""
+        seq = int(self.control[_RESULT_SEQ]) + 1
+        r = seq % _RESULT_SLOTS
+        n = min(len(detections), self.max_det)
+        meta = self.result_meta[r]
+        meta[0] = 0
+        self.results[r, :n] = detections.data[:n]
+        meta[1] = frame_seq
+        meta[2] = timestamp
+        meta[3] = n
+        meta[0] = seq
+        self.control[_RESULT_SEQ] = seq
+
+    # ----- 主进程 -----
+
+    @property
+    def result_seq(self) -> int:
+        return int(self.control[_RESULT_SEQ])
+
+    def read_result(self, class_names) -> Optional[Tuple[int, float, Detections]]:
+        """
+        读取最新检测结果（拷贝，通常不超过几 KB）
+
+        返回:
+            (结果序号, 截图时间, Detections)，尚无结果时返回 None
+        """
+        while True:
+            seq = self.result_seq
+            if seq == 0:
+                return None
+            meta = self.result_meta[seq % _RESULT_SLOTS]
+            timestamp, n = float(meta[2]), int(meta[3])
+            data = self.results[seq % _RESULT_SLOTS, :n].copy()
+            if int(meta[0]) == seq:
+                return seq, timestamp, Detections(data, class_names)
+            # 读取期间推理进程又写了两次，重读
+
+    def close(self):
+        """断开共享内存，创建者同时释放"""
+        self.frames = self.results = self.control = self.slot_meta = self.result_meta = None
+        for shm in self._shm:
+            try:
+                shm.close()
+            except BufferError:
+                # 仍有视图引用（例如推理库缓存了输入图像），进程退出时自动释放
+                pass
+            if self.owner:
+                try:
+                    shm.unlink()
+                except FileNotFoundError:
+                    pass
+        self._shm = []
+
+
+# ========== 子进程入口 ==========
+
+def _capture_main(names, frame_shape, slots, max_det, source, region, target_fps, stop, pause, frame_ready,
+                  max_failures=10):
+    """截图进程: 按目标帧率截图写入帧环，连续失败 max_failures 次后退出（主进程据此报错）"""
+    buffers = SharedBuffers(frame_shape, slots, max_det, names)
+    frame_source = create_frame_source(source)
+    interval = 1.0 / target_fps if target_fps > 0 else 0.0
+    failures = 0
+    try:
+        while not stop.is_set():
+            if pause.is_set():
+                stop.wait(0.1)
+                continue
+            t0 = time.monotonic()
+            try:
+                frame = frame_source.grab(region)
+                buffers.write_frame(frame, t0)
+            except Exception as e:
+                failures += 1
+                print(f"截图进程出错: {e}")
+                if failures >= max_failures:
+                    buffers.control[_CAPTURE_FAILED] = 1
+                    return
+                stop.wait(0.5)
+                continue
+            failures = 0
+            buffers.control[_CAPTURE_MS] = (time.monotonic() - t0) * 1000
+            buffers.control[_FRAMES_CAPTURED] += 1
+            frame_ready.set()
+
+            remaining = interval - (time.monotonic() - t0)
+            if remaining > 0:
+                stop.wait(remaining)
+    finally:
+        frame_source.close()
+        buffers.close()
+
+
+def _inference_main(names, frame_shape, slots, max_det, model_path, engine, threads,
+                    conf, imgsz, region, stop, frame_ready, result_ready):
+    """推理进程: 对帧环中的最新帧推理，结果写入结果区"""
+    from inference_engines import create_engine
+
+    buffers = SharedBuffers(frame_shape, slots, max_det, names)
+    try:
+        try:
+            model = create_engine(model_path, engine, threads)
+            model.warmup(imgsz)
+        except Exception as e:
+            print(f"推理进程加载模型失败: {e}")
+            buffers.control[_READY] = -1
+            result_ready.set()
+            return
+        buffers.control[_READY] = 1
+        result_ready.set()
+
+        last_seq = 0
+        while not stop.is_set():
+            if not frame_ready.wait(0.1):
+                continue
+            frame_ready.clear()
+            latest = buffers.acquire_latest()
+            if latest is None:
+                continue
+            slot, seq, timestamp = latest
+            if seq == last_seq:
+                buffers.release(slot, seq)
+                continue
+
+            t0 = time.perf_counter()
+            try:
+                # 直接传入共享内存上的视图，不拷贝
+                detections = model.detect([buffers.frames[slot]], conf, imgsz, max_det=max_det)[0]
+                if region is not None:
+                    detections = detections.offset(region[0], region[1])
+            except Exception as e:
+                buffers.release(slot, seq)
+                print(f"推理进程出错: {e}")
+                stop.wait(0.5)
+                continue
+            if not buffers.release(slot, seq):
+                buffers.control[_FRAMES_DROPPED] += 1
+                continue
+            buffers.control[_INFERENCE_MS] = (time.perf_counter() - t0) * 1000
+            buffers.write_result(detections, seq, timestamp)
+            last_seq = seq
+            result_ready.set()
+    finally:
+        buffers.close()
+
+
+class ProcessPipeline:
+    """截图进程 + 推理进程，主进程通过共享内存读取最新检测结果"""
+
+    def __init__(self, model_path: str, class_names: Dict[int, str], frame_source='auto',
+                 region: Optional[Region] = None, conf: float = 0.25, imgsz: int = 640,
+                 engine: str = 'auto', threads: Optional[int] = None, target_fps: float = 10.0,
+                 slots: int = 3, max_det: int = 300):
+        """
+        参数:
+            model_path: 模型路径
+            class_names: 类别ID -> 类别名称
+            frame_source: 图像来源名称或路径（FrameSource 实例按 frame_source_spec 转换）
+            region: 截图区域 (x1, y1, x2, y2)，None表示全屏；检测结果为全屏坐标
+            conf: 置信度阈值
+            imgsz: 推理尺寸
+            engine: 推理引擎名称
+            threads: 推理进程的 CPU 线程数，None表示默认
+            target_fps: 截图帧率
+            slots: 帧环槽位数
+            max_det: 每帧最多保留的检测框数
+        """
+        self.model_path = model_path
+        self.class_names = class_names
+        self.frame_source = frame_source_spec(frame_source)
+        self.region = region
+        self.conf = conf
+        self.imgsz = imgsz
+        self.engine = engine
+        self.threads = threads
+        self.target_fps = target_fps
+        self.slots = slots
+        self.max_det = max_det
+        self.buffers: Optional[SharedBuffers] = None
+        self._processes = []
+        self._lock = threading.Lock()
+        self._ctx = mp.get_context('spawn')
+        self._stop = self._pause = self._frame_ready = self._result_ready = None
+
+    def _probe_frame_shape(self) -> Tuple[int, int, int]:
+        """在主进程中截一帧确定帧环槽位尺寸"""
+        source = create_frame_source(self.frame_source)
+        try:
+            return source.grab(self.region).shape
+        finally:
+            source.close()
+
+    def start(self, timeout: float = 60.0) -> bool:
+        """
+        创建共享内存并启动子进程，等待推理进程加载模型
+
+        参数:
+            timeout: 等待模型加载的最长时间（秒）
+
+        返回:
+            模型是否加载成功
+        """
+        if self._processes:
+            return True
+        frame_shape = self._probe_frame_shape()
+        self.buffers = SharedBuffers(frame_shape, self.slots, self.max_det)
+        ctx = self._ctx
+        self._stop, self._pause = ctx.Event(), ctx.Event()
+        self._frame_ready, self._result_ready = ctx.Event(), ctx.Event()
+        common = (self.buffers.names, frame_shape, self.slots, self.max_det)
+
+        inference = ctx.Process(
+            target=_inference_main, name="DetectorInference", daemon=True,
+            args=common + (self.model_path, self.engine, self.threads, self.conf, self.imgsz, self.region,
+                           self._stop, self._frame_ready, self._result_ready))
+        inference.start()
+        self._processes.append(inference)
+        # 模型加载完成后再开始截图，避免启动期间的帧全部作废
+        deadline = time.monotonic() + timeout
+        while self.buffers.control[_READY] == 0 and inference.is_alive() and time.monotonic() < deadline:
+            self._result_ready.wait(0.1)
+        self._result_ready.clear()
+        if self.buffers.control[_READY] != 1:
+            self.stop()
+            return False
+
+        capture = ctx.Process(
+            target=_capture_main, name="DetectorCapture", daemon=True,
+            args=common + (self.frame_source, self.region, self.target_fps,
+                           self._stop, self._pause, self._frame_ready))
+        capture.start()
+        self._processes.append(capture)
+        return True
+
+    def stop(self, timeout: float = 2.0):
+        """停止子进程并释放共享内存（可重复调用）"""
+        with self._lock:
+            if self._stop is not None:
+                self._stop.set()
+            for process in self._processes:
+                process.join(timeout)
+                if process.is_alive():
+                    process.terminate()
+                    process.join(timeout)
+            self._processes = []
+            if self.buffers is not None:
+                self.buffers.close()
+                self.buffers = None
+
+    def pause(self, paused: bool = True):
+        """暂停/恢复截图（推理进程没有新帧时自然空闲）"""
+        if self._pause is not None:
+            self._pause.set() if paused else self._pause.clear()
+
+    @property
+    def is_alive(self) -> bool:
+        return bool(self._processes) and all(p.is_alive() for p in self._processes)
+
+    def failure(self) -> Optional[str]:
+        """子进程退出的原因，仍在运行时返回 None"""
+        if not self._processes or self.is_alive:
+            return None
+        if self.buffers is not None and self.buffers.control[_CAPTURE_FAILED]:
+            return "截图进程连续出错已退出"
+        dead = [p for p in self._processes if not p.is_alive()]
+        return "、".join(f"{p.name} 已退出（退出码 {p.exitcode}）" for p in dead)
+
+    def latest(self) -> Optional[Tuple[int, float, Detections]]:
+        """
+        最新检测结果，不等待
+
+        返回:
+            (结果序号, 截图时间 time.monotonic(), Detections)，尚无结果时返回 None
+        """
+        if self.buffers is None:
+            return None
+        return self.buffers.read_result(self.class_names)
+
+    def wait_result(self, after_seq: int = 0, timeout: float = 1.0) -> Optional[Tuple[int, float, Detections]]:
+        """
+        等待序号大于 after_seq 的结果
+
+        返回:
+            同 latest()，超时返回 None
+        """
+        deadline = time.monotonic() + timeout
+        while self.buffers is not None:
+            if self.buffers.result_seq > after_seq:
+                return self.latest()
+            remaining = deadline - time.monotonic()
+            if remaining <= 0 or not self.is_alive:
+                return None
+            if self._result_ready.wait(min(remaining, 0.1)):
+                self._result_ready.clear()
+        return None
+
+    def get_stats(self) -> Dict[str, float]:
+        """
+        返回:
+            {'captured': 截图帧数, 'results': 结果数, 'dropped': 丢弃的结果数,
+             'capture_ms' / 'inference_ms': 最近一次耗时}
+        """
+        if self.buffers is None:
+            return {}
+        control = self.buffers.control
+        return {
+            'captured': int(control[_FRAMES_CAPTURED]),
+            'results': int(control[_RESULT_SEQ]),
+            'dropped': int(control[_FRAMES_DROPPED]),
+            'capture_ms': float(control[_CAPTURE_MS]),
+            'inference_ms': float(control[_INFERENCE_MS]),
+        }
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, *exc):
+        self.stop()
+
+
+# ========== 与单进程模式对比 ==========
+
+def _script_workload(seconds: float) -> float:
+    """模拟脚本线程的纯 Python 负载，返回每秒完成的迭代数（受 GIL 争抢影响）"""
+    end = time.perf_counter() + seconds
+    count = 0
+    while time.perf_counter() < end:
+        sum(range(200))
+        count += 1
+    return count / seconds
+
+
+def benchmark(model_path: str, frame_source='auto', seconds: float = 10.0, target_fps: float = 30.0,
+              imgsz: int = 640, threads: Optional[int] = None) -> Dict[str, Dict[str, float]]:
+    """
+    对比单进程（后台线程）和多进程模式
+
+    两种模式下主线程都运行相同的纯 Python 负载，比较检测帧率、结果延迟和主线程吞吐量
+
+    返回:
+        {'idle' / 'thread' / 'process': {'fps': 检测帧率, 'age_ms': 读取时结果的平均年龄,
+                                         'script_rate': 主线程每秒迭代数}}
+    """
+    from screen_detector import ScreenDetector
+
+    report = {'idle': {'fps': 0.0, 'age_ms': 0.0, 'script_rate': _script_workload(seconds / 2)}}
+
+    def sample_ages(get_timestamp, stop_at):
+        ages = []
+        while time.perf_counter() < stop_at:
+            ts = get_timestamp()
+            if ts is not None:
+                ages.append((time.monotonic() - ts) * 1000)
+            time.sleep(0.01)
+        return ages
+
+    # 单进程: ScreenDetector 后台线程
+    detector = ScreenDetector(model_path, frame_source=frame_source, imgsz=imgsz, threads=threads,
+                              change_threshold=None, template_classes=None)
+    detector.start_continuous(target_fps)
+    detector.get_snapshot()
+    ages = []
+    sampler = threading.Thread(target=lambda: ages.extend(sample_ages(
+        lambda: detector._snapshots.get(None) and detector._snapshots[None].timestamp,
+        time.perf_counter() + seconds)), daemon=True)
+    sampler.start()
+    rate = _script_workload(seconds)
+    sampler.join()
+    stats = detector.get_pipeline_stats()
+    detector.stop_continuous()
+    report['thread'] = {'fps': stats['fps'], 'age_ms': float(np.mean(ages)) if ages else 0.0,
+                        'script_rate': rate}
+
+    # 多进程
+    pipeline = ProcessPipeline(model_path, detector.class_names, frame_source, imgsz=imgsz,
+                               engine=detector.engine.name, threads=threads, target_fps=target_fps)
+    if not pipeline.start():
+        raise RuntimeError("推理进程启动失败")
+    try:
+        first = pipeline.wait_result(0, timeout=30.0)
+        start_seq = first[0] if first else 0
+        started = time.perf_counter()
+        ages = []
+        sampler = threading.Thread(target=lambda: ages.extend(sample_ages(
+            lambda: (pipeline.latest() or (None, None))[1], time.perf_counter() + seconds)), daemon=True)
+        sampler.start()
+        rate = _script_workload(seconds)
+        sampler.join()
+        results = pipeline.buffers.result_seq - start_seq
+        report['process'] = {'fps': results / (time.perf_counter() - started),
+                             'age_ms': float(np.mean(ages)) if ages else 0.0, 'script_rate': rate}
+    finally:
+        pipeline.stop()
+    return report
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="对比单进程和多进程后台检测")
+    parser.add_argument('model', nargs='?', default='hjzgv1.pt')
+    parser.add_argument('--source', default='auto', help="截图方式或录像/图片目录路径")
+    parser.add_argument('--seconds', type=float, default=10.0)
+    parser.add_argument('--fps', type=float, default=30.0, help="目标帧率")
+    parser.add_argument('--imgsz', type=int, default=640)
+    parser.add_argument('--threads', type=int, default=None)
+    args = parser.parse_args()
+
+    result = benchmark(args.model, args.source, args.seconds, args.fps, args.imgsz, args.threads)
+    idle_rate = result['idle']['script_rate']
+    print(f"{'模式':<10}{'检测FPS':>10}{'结果年龄':>12}{'脚本吞吐':>12}")
+    for mode, r in result.items():
+        print(f"{mode:<10}{r['fps']:>10.1f}{r['age_ms']:>10.1f}ms{r['script_rate'] / idle_rate:>11.0%}")
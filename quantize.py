@@ -0,0 +1,253 @@
+"""
+INT8 训练后量化
+
+用 yolo_dataset.yaml 验证集的图片校准，把训练好的 .pt 模型量化为 INT8，
+并与 FP32 模型对比 mAP 和 CPU 推理延迟，决定本次发布是否使用量化模型。
+
+- 'openvino': 通过 ultralytics 导出（NNCF 量化），生成 *_int8_openvino_model 目录
+- 'onnx':     ONNX Runtime 静态量化（QDQ），生成 *_int8.onnx
+
+两种结果都可以直接作为 ScreenDetector 的 model_path。
+
+需要安装: pip install openvino nncf 或 pip install onnx onnxruntime
+"""
+
+import glob
+import os
+import time
+
+import cv2
+import numpy as np
+import yaml
+from ultralytics import YOLO
+
+from inference_engines import create_engine, letterbox
+
+
+def get_split_images(data_yaml, split='val'):
+    """
+    获取数据集某个划分的图片路径
+
+    参数:
+        data_yaml: 数据集配置文件路径
+        split: 'train' / 'val' / 'test'
+    """
+    with open(data_yaml, encoding='utf-8') as f:
+        data = yaml.safe_load(f)
+    root = data.get('path') or ''
+    if not os.path.isabs(root):
+        root = os.path.join(os.path.dirname(os.path.abspath(data_yaml)), root)
+    entries = data.get(split) or []
+    if isinstance(entries, str):
+        entries = [entries]
+
+    images = []
+    for entry in entries:
+        path = os.path.join(root, entry)
+        if os.path.isdir(path):
+            for ext in ('*.jpg', '*.jpeg', '*.png', '*.bmp'):
+                images.extend(glob.glob(os.path.join(path, ext)))
+        elif path.endswith('.txt') and os.path.exists(path):
+            with open(path, encoding='utf-8') as f:
+                images.extend(os.path.join(root, line.strip()) for line in f if line.strip())
+    return sorted(images)
+
+
+def export_fp32(model_path, backend, imgsz=640):
+    """导出 FP32 模型（作为量化输入和对比基线）"""
+    return YOLO(model_path).export(format=backend, imgsz=imgsz, dynamic=False)
+
+
+def quantize_openvino(model_path, data_yaml, imgsz=640):
+    """
+    OpenVINO INT8 量化（ultralytics 使用 data 的验证集做 NNCF 校准）
+
+    返回:
+        *_int8_openvino_model 目录
+    """
+    return YOLO(model_path).export(format='openvino', imgsz=imgsz, int8=True, data=data_yaml)
+
+
+def quantize_onnx(fp32_onnx, data_yaml, imgsz=640, calib_images=200):
+    """
+    ONNX Runtime 静态量化
+
+    参数:
+        fp32_onnx: FP32 ONNX 模型路径
+        data_yaml: 数据集配置文件路径（使用验证集校准）
+        imgsz: 模型输入尺寸
+        calib_images: 最多使用的校准图片数
+
+    返回:
+        *_int8.onnx 路径
+    """
+    import onnx
+    from onnxruntime.quantization import (CalibrationDataReader, CalibrationMethod, QuantFormat,
+                                          QuantType, quantize_static)
+
+    images = get_split_images(data_yaml, 'val')[:calib_images]
+    if not images:
+        raise FileNotFoundError(f"验证集中没有图片: {data_yaml}")
+    input_name = onnx.load(fp32_onnx, load_external_data=False).graph.input[0].name
+
+    class ValReader(CalibrationDataReader):
+        """与 OnnxEngine 相同的预处理"""
+
+        def __init__(self):
+            self._iter = iter(images)
+
+        def get_next(self):
+            for path in self._iter:
+                frame = cv2.imread(path)
+                if frame is None:
+                    continue
+                img, _, _ = letterbox(frame, (imgsz, imgsz))
+                batch = img[None, ..., ::-1].transpose(0, 3, 1, 2)
+                return {input_name: np.ascontiguousarray(batch, dtype=np.float32) / 255.0}
+            return None
+
+    output = os.path.splitext(fp32_onnx)[0] + '_int8.onnx'
+    print(f"使用 {len(images)} 张验证集图片校准...")
+    quantize_static(fp32_onnx, output, ValReader(),
+                    quant_format=QuantFormat.QDQ,
+                    op_types_to_quantize=['Conv'],   # 检测头的拼接/解码保持 FP32，精度损失更小
+                    per_channel=True,
+                    activation_type=QuantType.QUInt8,
+                    weight_type=QuantType.QInt8,
+                    calibrate_method=CalibrationMethod.MinMax)
+
+    # 保留类别名称等元数据，OnnxEngine 和 ultralytics 都依赖它
+    src, dst = onnx.load(fp32_onnx), onnx.load(output)
+    del dst.metadata_props[:]
+    dst.metadata_props.extend(src.metadata_props)
+    onnx.save(dst, output)
+    return output
+
+
+def evaluate_map(model_path, data_yaml, imgsz=640):
+    """
+    在验证集上评估 mAP（CPU）
+
+    返回:
+        (mAP50, mAP50-95)
+    """
+    metrics = YOLO(model_path, task='detect').val(data=data_yaml, imgsz=imgsz, batch=1,
+                                                  device='cpu', plots=False, verbose=False)
+    return float(metrics.box.map50), float(metrics.box.map)
+
+
+def measure_latency(model_path, images, imgsz=640, runs=50, threads=None):
+    """
+    测量 ScreenDetector 实际使用的推理引擎在 CPU 上的单张延迟
+
+    返回:
+        {'median_ms': 中位数, 'p95_ms': 95分位}
+    """
+    engine = create_engine(model_path, threads=threads)
+    frames = [f for f in (cv2.imread(p) for p in images[:10]) if f is not None]
+    if not frames:
+        raise FileNotFoundError("没有可用于测速的图片")
+    engine.detect([frames[0]], imgsz=imgsz)  # 预热
+
+    times = []
+    for i in range(runs):
+        t0 = time.perf_counter()
+        engine.detect([frames[i % len(frames)]], imgsz=imgsz)
+        times.append((time.perf_counter() - t0) * 1000)
+    return {'median_ms': float(np.median(times)), 'p95_ms': float(np.percentile(times, 95))}
+
+
+def compare_models(fp32_path, int8_path, data_yaml, imgsz=640, runs=50, threads=None):
+    """
+    对比 FP32 与 INT8 模型的 mAP 和 CPU 延迟
+
+    返回:
+        报告字典
+    """
+    images = get_split_images(data_yaml, 'val')
+    report = {}
+    for label, path in (('fp32', fp32_path), ('int8', int8_path)):
+        print(f"\n评估 {label}: {path}")
+        map50, map50_95 = evaluate_map(path, data_yaml, imgsz)
+        latency = measure_latency(path, images, imgsz, runs, threads)
+        report[label] = {'path': path, 'map50': map50, 'map50_95': map50_95, **latency}
+
+    fp32, int8 = report['fp32'], report['int8']
+    report['delta'] = {
+        'map50': int8['map50'] - fp32['map50'],
+        'map50_95': int8['map50_95'] - fp32['map50_95'],
+        'median_ms': int8['median_ms'] - fp32['median_ms'],
+        'speedup': fp32['median_ms'] / int8['median_ms'] if int8['median_ms'] else 0.0,
+    }
+    return report
+
+
+def print_report(report):
+    """打印对比报告"""
+    print("\n" + "=" * 70)
+    print(f"{'模型':<6}{'mAP50':>10}{'mAP50-95':>12}{'延迟中位数':>12}{'延迟P95':>12}")
+    print("-" * 70)
+    for label in ('fp32', 'int8'):
+        r = report[label]
+        print(f"{label:<6}{r['map50']:>10.4f}{r['map50_95']:>12.4f}"
+              f"{r['median_ms']:>10.1f}ms{r['p95_ms']:>10.1f}ms")
+    d = report['delta']
+    print("-" * 70)
+    print(f"mAP50 变化: {d['map50']:+.4f}, mAP50-95 变化: {d['map50_95']:+.4f}")
+    print(f"延迟变化: {d['median_ms']:+.1f}ms (加速 {d['speedup']:.2f}x)")
+    print("=" * 70)
+
+
+def quantize_model(model_path, data_yaml, backend='openvino', imgsz=640, calib_images=200,
+                   runs=50, threads=None):
+    """
+    量化模型并输出对比报告
+
+    参数:
+        model_path: 训练好的 .pt 模型
+        data_yaml: 数据集配置文件（验证集用于校准和评估）
+        backend: 'openvino' 或 'onnx'
+        imgsz: 输入尺寸
+        calib_images: ONNX 量化最多使用的校准图片数
+        runs: 测速次数
+        threads: 测速时的 CPU 线程数，None表示默认
+
+    返回:
+        (INT8 模型路径, 报告字典)
+    """
+    if backend not in ('openvino', 'onnx'):
+        raise ValueError(f"不支持的量化后端: {backend}（可选: openvino, onnx）")
+
+    print(f"导出 FP32 {backend} 模型...")
+    fp32_path = export_fp32(model_path, backend, imgsz)
+
+    print("量化为 INT8...")
+    if backend == 'openvino':
+        int8_path = quantize_openvino(model_path, data_yaml, imgsz)
+    else:
+        int8_path = quantize_onnx(fp32_path, data_yaml, imgsz, calib_images)
+    print(f"INT8 模型: {int8_path}")
+
+    report = compare_models(fp32_path, int8_path, data_yaml, imgsz, runs, threads)
+    print_report(report)
+    return int8_path, report
+
+
+if __name__ == "__main__":
+    # 需要量化的模型和数据集
+    model_path = 'hjzgv1.pt'
+    data_yaml = 'yolo_dataset.yaml'
+
+    # 'openvino' - Intel CPU 上最快（推荐）
+    # 'onnx'     - ONNX Runtime，适用于其他 CPU
+    int8_path, report = quantize_model(
+        model_path=model_path,
+        data_yaml=data_yaml,
+        backend='openvino',
+        imgsz=640,
+        runs=50,
+    )
+
+    # mAP 下降在可接受范围内时，把 GUI 中的模型路径改为 int8_path 即可使用
+    if report['delta']['map50_95'] < -0.02:
+        print("\n警告: INT8 模型 mAP50-95 下降超过 0.02，建议继续使用 FP32 模型")
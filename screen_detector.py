@@ -1,17 +1,51 @@
-from ultralytics import YOLO
 import numpy as np
-from PIL import ImageGrab
 import cv2
-from typing import Optional, Tuple, List, Dict
+from typing import Optional, Tuple, List, Dict, NamedTuple, Union, Sequence, Iterable, FrozenSet
+import fnmatch
+import math
 import os
 import sys
+import threading
+import time
 import urllib3
 
+from detections import Detections
+from frame_gate import FrameChangeGate
+from frame_recorder import FrameRingBuffer
+from frame_sources import FrameSource, create_frame_source
+from inference_engines import InferenceEngine
+from inference_profiles import InferenceProfile, ProfileStats, default_profiles, select_profile
+from latency import LatencyRecorder
+import model_registry
+from process_pipeline import ProcessPipeline
+from template_matcher import TemplateMatcher
+from tiling import TileConfig, tile_grid
+from tracker import ObjectTracker, TrackState
+
 # 禁用 SSL 警告和验证
 urllib3.disable_warnings(urllib3.exceptions.InsecureRequestWarning)
 os.environ['CURL_CA_BUNDLE'] = ''
 os.environ['REQUESTS_CA_BUNDLE'] = ''
 
+Region = Tuple[int, int, int, int]
+# 单个区域，或多个区域（多个区域合并为一次批量推理）
+RegionSpec = Union[None, Region, Sequence[Region]]
+
+
+def normalize_regions(region: RegionSpec) -> Optional[Tuple[Region, ...]]:
+    """
+    统一区域参数格式
+
+    返回:
+        None 表示全屏，否则为区域元组 ((x1, y1, x2, y2), ...)
+    """
+    if not region:
+        return None
+    if isinstance(region[0], (int, np.integer)):
+        return (tuple(int(v) for v in region),)
+    return tuple(tuple(int(v) for v in r) for r in region)
+
+
 def get_resource_path(relative_path):
     """获取资源文件的绝对路径，支持打包后的环境"""
     try:
@@ -22,6 +56,57 @@ def get_resource_path(relative_path):
 
     return os.path.join(base_path, relative_path)
 
+
+class DetectionSnapshot(NamedTuple):
+    """
+    一帧的检测快照（不可变）
+
+    一次截图+推理的结果，所有查询方法在有效期内复用同一个快照
+    """
+    frame_id: int                                   # 帧序号（每次推理递增）
+    timestamp: float                                # 截图时间 (time.monotonic)
+    region: Optional[Tuple[Region, ...]]            # 检测区域（None为全屏）
+    detections: Detections                          # 检测结果（同 detect_screen 的格式）
+    classes: Optional[FrozenSet[str]] = None        # 只检测了这些类别（None为全部类别）
+
+    def covers(self, classes: Optional[FrozenSet[str]]) -> bool:
+        """快照是否包含这些类别的检测结果"""
+        return self.classes is None or (classes is not None and classes <= self.classes)
+
+    @property
+    def age(self) -> float:
+        """快照已存在的时间（秒）"""
+        return time.monotonic() - self.timestamp
+
+    def first_center(self, name: str) -> Optional[Tuple[int, int]]:
+        """获取指定类别的第一个中心点"""
+        return self.detections.first_center(name)
+
+    def centers_by_name(self, name: str) -> List[Tuple[int, int]]:
+        """获取指定类别的所有中心点"""
+        return self.detections.centers_by_name(name)
+
+    def group_by_name(self) -> Dict[str, List[Tuple[int, int]]]:
+        """按类别分组的中心点 {'类别名': [(x, y), ...]}"""
+        return self.detections.group_by_name()
+
+    def nearest(self, name: Optional[str], point: Tuple[int, int]) -> Optional[Tuple[int, int]]:
+        """距离 point 最近的指定类别中心点"""
+        return self.detections.nearest_center(name, point)
+
+    def k_nearest(self, name: Optional[str], point: Tuple[int, int], k: int) -> List[Tuple[int, int]]:
+        """距离 point 最近的 k 个指定类别中心点（由近到远）"""
+        return self.detections.k_nearest_centers(name, point, k)
+
+    def within_radius(self, name: Optional[str], point: Tuple[int, int], radius: float) -> List[Tuple[int, int]]:
+        """与 point 距离不超过 radius 的指定类别中心点（由近到远）"""
+        return self.detections.centers_within_radius(name, point, radius)
+
+    def within_box(self, name: Optional[str], box: Region) -> List[Tuple[int, int]]:
+        """位于矩形 (x1, y1, x2, y2) 内的指定类别中心点"""
+        return self.detections.centers_within_box(name, box)
+
+
 class ScreenDetector:
     """
     屏幕目标检测类
@@ -32,13 +117,44 @@ class ScreenDetector:
     3. 获取指定对象的中心点位置
     """
 
-    def __init__(self, model_path: str = "hjzgv1.pt", conf: float = 0.25):
+    def __init__(self, model_path: str = "hjzgv1.pt", conf: float = 0.25,
+                 cache_max_age: float = 0.2, frame_source: Union[str, FrameSource] = 'auto',
+                 imgsz: int = 640, class_rois: Optional[Dict[str, Region]] = None,
+                 change_threshold: Optional[float] = None,
+                 template_classes: Optional[Iterable[str]] = (),
+                 engine: Union[str, InferenceEngine] = 'auto', threads: Optional[int] = None,
+                 profiles: Optional[Dict[str, InferenceProfile]] = None, profile: str = 'default',
+                 tiling: Optional[Sequence[TileConfig]] = None,
+                 class_conf: Optional[Dict[str, float]] = None, filter_classes: bool = False,
+                 record_frames: int = 0):
         """
         初始化检测器
 
         参数:
-            model_path: YOLO模型路径
+            model_path: 模型路径（.pt / .onnx / *_openvino_model）
             conf: 置信度阈值
+            cache_max_age: 检测快照的最大有效期（秒），0表示不缓存
+            frame_source: 图像来源，名称（'auto'/'mss'/'imagegrab'/'xshm'）、
+                          视频文件或图片目录路径，或 FrameSource 实例
+            imgsz: 全屏推理的输入尺寸
+            class_rois: 按类别限定检测区域，键支持通配符，例如
+                        {'button*': (0, 540, 1920, 1080), 'portal*': (0, 100, 1920, 900)}
+            change_threshold: 画面变化阈值（缩小灰度图的最大格子差，0-255，建议 8），
+                              画面变化小于该值时复用上一次结果，None表示关闭（默认）
+            template_classes: 优先使用模板匹配的静态界面类别（如 template_matcher.DEFAULT_TEMPLATE_CLASSES），
+                              None或空表示关闭（默认）
+            engine: 推理引擎 'auto'（按模型文件类型）/ 'ultralytics' / 'onnx' / 'openvino'，
+                    或 InferenceEngine 实例
+            threads: CPU 推理线程数，None表示默认
+            profiles: 推理配置 {名称: InferenceProfile}，None表示使用 default_profiles(imgsz)
+            profile: 初始使用的配置名称，'auto' 表示按场景自动选择
+            tiling: 切片推理设置，例如 [TileConfig(('props',), tile_size=640, overlap=0.2)]，
+                    None表示关闭
+            class_conf: 按类别的置信度阈值，例如 {'portal1': 0.7, 'props': 0.3}，
+                        未列出的类别使用 conf
+            filter_classes: 按名称查询时只推理查询过的类别（减少解析和 NMS 开销）。
+                            同一区域查询过的类别会累积，快照始终包含所有查询过的类别
+            record_frames: 在内存中保留最近多少帧画面和检测结果（用于 dump_frames），0表示关闭
         """
         # 禁用 SSL 验证
         import ssl
@@ -47,12 +163,79 @@ class ScreenDetector:
         # 获取模型文件的正确路径（支持打包后的环境）
         model_path = get_resource_path(model_path)
 
-        self.model = YOLO(model_path)
+        if isinstance(engine, InferenceEngine):
+            self.engine = engine
+        else:
+            # 进程级缓存，重复创建检测器不会重新加载模型
+            self.engine = model_registry.get_engine(model_path, engine, threads)
+        self.model = getattr(self.engine, 'model', None)  # ultralytics 引擎的 YOLO 对象
+        self.model_path = model_path
+        self.threads = threads
         self.conf = conf
-        self.class_names = self.model.names  # 获取类别名称
-        print(f"模型加载成功: {model_path}")
+        self.class_names = self.engine.names  # 获取类别名称
+        print(f"模型加载成功: {model_path} ({self.engine.name})")
         print(f"支持的类别: {self.class_names}")
 
+        self.frame_source = create_frame_source(frame_source)
+        print(f"图像来源: {self.frame_source}")
+
+        self._init_detection_state(cache_max_age, imgsz, class_rois, change_threshold, template_classes,
+                                   profiles, profile, tiling, class_conf, filter_classes)
+        self.frame_source.latency = self.latency
+        if record_frames:
+            self.frame_recorder = FrameRingBuffer(record_frames)
+
+    def _init_detection_state(self, cache_max_age: float = 0.2, imgsz: int = 640,
+                              class_rois: Optional[Dict[str, Region]] = None,
+                              change_threshold: Optional[float] = None,
+                              template_classes: Optional[Iterable[str]] = (),
+                              profiles: Optional[Dict[str, InferenceProfile]] = None,
+                              profile: str = 'default',
+                              tiling: Optional[Sequence[TileConfig]] = None,
+                              class_conf: Optional[Dict[str, float]] = None,
+                              filter_classes: bool = False):
+        """初始化快照缓存、后台检测和区域设置（子类不调用父类构造函数时也需要调用）"""
+        self.imgsz = imgsz
+        self.class_conf = dict(class_conf or {})
+        self.filter_classes = filter_classes
+        # 推理配置
+        self.profiles = dict(profiles or default_profiles(imgsz))
+        self.profile = self.profiles['default'] if 'default' in self.profiles else next(iter(self.profiles.values()))
+        self.auto_profile = False
+        self.profile_stats = ProfileStats()
+        self.tile_configs: List[TileConfig] = list(tiling or [])
+        # 分阶段耗时
+        self.latency = LatencyRecorder()
+        # 最近画面记录（None表示关闭）
+        self.frame_recorder: Optional[FrameRingBuffer] = None
+        self.change_gate = FrameChangeGate(change_threshold) if change_threshold is not None else None
+        self.template_matcher = TemplateMatcher(template_classes) if template_classes else None
+        self.class_rois = dict(class_rois or {})
+        self.cache_max_age = cache_max_age
+        self._snapshots = {}            # region -> DetectionSnapshot
+        self._queried_classes = {}      # region -> 查询过的类别（filter_classes 时累积）
+        self._uncovered_queries = set()  # 已提示过"配置不检测"的 (配置, 类别)
+        self._snapshot_lock = threading.Lock()
+        self._frame_id = 0
+        self.cache_hits = 0
+        self.cache_misses = 0
+        self.inferences = 0             # 实际推理次数（含后台检测，不含画面未变化时的复用）
+        # 后台连续检测模式
+        self._frame_cond = threading.Condition(self._snapshot_lock)
+        self._invalidated_at = 0.0
+        self._pipeline_thread = None
+        self._pipeline_stop = threading.Event()
+        self._pipeline_region = None
+        self._pipeline_stats = {}
+        self._process_pipeline: Optional[ProcessPipeline] = None
+        self._pipeline_error: Optional[Exception] = None   # 检测进程意外退出，下次 get_snapshot 抛出
+        self._screen_shape = None       # 最近一次全屏截图的 (高, 宽)
+        # 目标跟踪（按检测区域分别跟踪）
+        self._trackers: Dict[Optional[Tuple[Region, ...]], ObjectTracker] = {}
+        self._tracked_frames: Dict[Optional[Tuple[Region, ...]], int] = {}
+        self._tracker_lock = threading.Lock()
+        self.set_profile(profile)
+
     def capture_screen(self, region: Optional[Tuple[int, int, int, int]] = None) -> np.ndarray:
         """
         截取屏幕
@@ -61,67 +244,718 @@ class ScreenDetector:
             region: 截取区域 (x1, y1, x2, y2)，None表示全屏
 
         返回:
-            numpy数组格式的图像 (BGR)
+            numpy数组格式的图像 (BGR)，复用图像来源的缓冲区，
+            下一次截图前有效，需要保存请 copy()
         """
-        if region:
-            screenshot = ImageGrab.grab(bbox=region)
-        else:
-            screenshot = ImageGrab.grab()
+        return self.frame_source.grab(region)
 
-        # 转换为numpy数组并从RGB转为BGR
-        frame = np.array(screenshot)
-        frame = cv2.cvtColor(frame, cv2.COLOR_RGB2BGR)
-        return frame
-
-    def detect_screen(self, region: Optional[Tuple[int, int, int, int]] = None) -> List[Dict]:
+    def detect_screen(self, region: RegionSpec = None, classes: Optional[Iterable[str]] = None) -> Detections:
         """
         检测屏幕中的目标
 
         参数:
-            region: 检测区域 (x1, y1, x2, y2)，None表示全屏
+            region: 检测区域 (x1, y1, x2, y2)，None表示全屏；
+                    也可以是多个区域的列表，所有区域合并为一次批量推理
+            classes: 只检测这些类别，None表示全部类别
 
         返回:
-            检测结果列表，每个元素包含:
+            Detections（数组存储，坐标均为全屏坐标），遍历时每个元素为字典:
             {
                 'name': 类别名称,
                 'confidence': 置信度,
                 'bbox': [x1, y1, x2, y2],
                 'center': (center_x, center_y)
             }
+            需要 list 时使用 detections.to_dicts()
+        """
+        t0 = time.perf_counter()
+        regions = normalize_regions(region)
+        frames, offsets = self._capture_regions(regions)
+        self.latency.record_since('capture', t0)
+        detections = self._detect_gated(regions, frames, offsets,
+                                        frozenset(classes) if classes is not None else None)
+        self.latency.record_since('total', t0)
+        if self.frame_recorder is not None:
+            self.frame_recorder.add(frames, offsets, detections, self._screen_shape)
+        return detections
+
+    def detect_frame(self, frame: np.ndarray) -> Detections:
+        """
+        对已截取的图像进行检测
+
+        参数:
+            frame: BGR图像
+
+        返回:
+            Detections（格式同 detect_screen，坐标相对于 frame）
+        """
+        return self._detect_frames([frame], [(0, 0)])
+
+    def _capture_regions(self, regions: Optional[Tuple[Region, ...]]):
         """
-        # 截取屏幕
-        frame = self.capture_screen(region)
+        按区域截图
 
-        # YOLO检测
-        results = self.model.predict(source=frame, conf=self.conf, verbose=False)
+        返回:
+            (图像列表, 每张图像在屏幕上的偏移 [(x, y), ...])
+        """
+        if regions is None:
+            frame = self.capture_screen()
+            self._screen_shape = frame.shape[:2]
+            return [frame], [(0, 0)]
+
+        if len(regions) == 1:
+            x1, y1, _, _ = regions[0]
+            return [self.capture_screen(regions[0])], [(x1, y1)]
+
+        # 多个区域: 截一次全屏再裁剪（视图，不拷贝）
+        frame = self.capture_screen()
+        self._screen_shape = frame.shape[:2]
+        crops = [frame[y1:y2, x1:x2] for x1, y1, x2, y2 in regions]
+        return crops, [(x1, y1) for x1, y1, _, _ in regions]
+
+    def _inference_size(self, frames: List[np.ndarray], offsets) -> int:
+        """
+        推理输入尺寸
 
-        # 解析结果
-        detections = []
-        for result in results:
-            boxes = result.boxes
-            for box in boxes:
-                # 获取边界框坐标
-                x1, y1, x2, y2 = box.xyxy[0].cpu().numpy()
+        区域推理时按区域大小缩小输入尺寸，保持与全屏推理相同的缩放比例，
+        这样小区域的推理开销也随之减小
+        """
+        imgsz = self.profile.imgsz
+        if self._screen_shape is None or offsets == [(0, 0)]:
+            return imgsz
+        scale = imgsz / max(self._screen_shape)
+        longest = max(max(f.shape[:2]) for f in frames)
+        size = int(math.ceil(longest * scale / 32)) * 32
+        return min(max(size, 64), imgsz)
+
+    def _detect_gated(self, regions, frames: List[np.ndarray], offsets,
+                      classes: Optional[FrozenSet[str]] = None) -> Detections:
+        """画面没有明显变化时复用上一次结果，否则推理"""
+        if self.change_gate is None:
+            return self._detect_frames(frames, offsets, classes)
+
+        # 不同配置、不同类别筛选的结果不能互相复用
+        key = (regions, self.profile.name, classes)
+        t0 = time.perf_counter()
+        sig = self.change_gate.signature(frames)
+        detections = self.change_gate.lookup(key, sig)
+        self.latency.record_since('gate', t0)
+        if detections is None:
+            detections = self._detect_frames(frames, offsets, classes)
+            self.change_gate.store(key, sig, detections)
+        return detections
 
-                # 计算中心点
-                center_x = int((x1 + x2) / 2)
-                center_y = int((y1 + y2) / 2)
+    def get_gate_stats(self) -> Dict[str, float]:
+        """
+        画面变化门控统计
 
-                # 获取类别和置信度
-                cls_id = int(box.cls[0])
-                conf = float(box.conf[0])
-                name = self.class_names[cls_id]
+        返回:
+            {'checks': 检查次数, 'skips': 因画面未变化而跳过推理的次数, 'skip_rate': 跳过比例}
+        """
+        if self.change_gate is None:
+            return {'checks': 0, 'skips': 0, 'skip_rate': 0.0}
+        return self.change_gate.get_stats()
 
-                detections.append({
-                    'name': name,
-                    'confidence': conf,
-                    'bbox': [int(x1), int(y1), int(x2), int(y2)],
-                    'center': (center_x, center_y)
-                })
+    def _detect_frames(self, frames: List[np.ndarray], offsets,
+                       classes: Optional[FrozenSet[str]] = None) -> Detections:
+        """
+        对一批图像做一次推理，并把结果平移回全屏坐标
 
+        参数:
+            classes: 只检测这些类别（在模型后处理中筛选），None表示全部类别
+        """
+        profile = self.profile
+        if self.auto_profile:
+            # 自动选择配置需要看到画面中的全部类别
+            classes = None
+        if profile.classes is not None:
+            if classes is not None and not classes & set(profile.classes):
+                # 与检测不到相同，返回空结果（脚本把 None 当作"没找到"处理）
+                key = (profile.name, classes)
+                if key not in self._uncovered_queries:
+                    self._uncovered_queries.add(key)
+                    print(f"推理配置 {profile.name} 不检测这些类别: {', '.join(sorted(classes))}")
+                return Detections.empty(self.class_names)
+            classes = classes & set(profile.classes) if classes is not None else frozenset(profile.classes)
+        images, jobs = self._tile_inputs(frames, offsets, classes)
+        base_conf = self.conf if profile.conf is None else profile.conf
+        thresholds = self._conf_thresholds(base_conf)
+        class_ids = self._class_ids(classes)
+        # 模型使用相关类别中最低的阈值，之后再按类别筛选
+        model_conf = float(thresholds[class_ids].min()) if class_ids else float(thresholds.min())
+        t0 = time.perf_counter()
+        results = self.engine.detect(images,
+                                     conf=model_conf,
+                                     imgsz=self._inference_size(frames, offsets),
+                                     classes=class_ids,
+                                     max_det=profile.max_det)
+        t1 = time.perf_counter()
+        elapsed = (t1 - t0) * 1000
+        with self._snapshot_lock:
+            self.inferences += 1
+        for stage, ms in self.engine.last_timings.items():
+            self.latency.record(stage, ms)
+
+        parts = []
+        for image, local, (dx, dy, class_ids, exclude) in zip(images, results, jobs):
+            if class_ids is not None:
+                local = local.filter_classes(class_ids, exclude)
+            if self.template_matcher is not None and (class_ids is None or exclude):
+                self.template_matcher.harvest(image, local, (dx, dy))
+            parts.append(local.offset(dx, dy))
+        detections = Detections.concatenate(parts, self.class_names)
+        if len(images) > len(frames):
+            # 切片边缘被截断的框与完整的框 IoU 很低，按较小框面积计算重叠
+            detections = detections.nms(metric='ios')
+        elif len(parts) > 1:
+            # 区域之间可能重叠，去掉重复的框
+            detections = detections.nms()
+        if self.class_conf:
+            detections = detections.filter_confidence(thresholds)
+        self.latency.record_since('merge', t1)
+
+        self.profile_stats.record(profile.name, elapsed, len(detections))
+        if self.auto_profile:
+            names = {self.class_names[int(cid)] for cid in np.unique(detections.class_id)}
+            self.profile = self.profiles.get(select_profile(profile.name, names), profile)
         return detections
 
-    def get_center_by_name(self, name: str, region: Optional[Tuple[int, int, int, int]] = None) -> Optional[Tuple[int, int]]:
+    def _conf_thresholds(self, base_conf: float) -> np.ndarray:
+        """按类别ID索引的置信度阈值"""
+        thresholds = np.full(max(self.class_names) + 1, base_conf, dtype=np.float32)
+        for cid, name in self.class_names.items():
+            if name in self.class_conf:
+                thresholds[cid] = self.class_conf[name]
+        return thresholds
+
+    def set_class_conf(self, name: str, conf: Optional[float]):
+        """
+        设置某个类别的置信度阈值
+
+        参数:
+            name: 类别名称
+            conf: 阈值，None表示恢复使用全局 conf
+        """
+        if conf is None:
+            self.class_conf.pop(name, None)
+        else:
+            self.class_conf[name] = conf
+        self.invalidate_cache()
+
+    def _query_classes(self, name: str) -> Optional[FrozenSet[str]]:
+        """按名称查询时下推到模型的类别筛选"""
+        return frozenset((name,)) if self.filter_classes else None
+
+    def _class_ids(self, names: Optional[Iterable[str]]) -> Optional[List[int]]:
+        """类别名称 -> 类别ID，None表示全部类别"""
+        if names is None:
+            return None
+        wanted = set(names)
+        return [cid for cid, name in self.class_names.items() if name in wanted]
+
+    # ========== 切片推理 ==========
+
+    def _tile_inputs(self, frames: List[np.ndarray], offsets, classes: Optional[FrozenSet[str]]):
+        """
+        展开切片
+
+        参数:
+            classes: 本次推理的类别，None表示全部
+
+        返回:
+            (推理图像列表, [(屏幕偏移x, 屏幕偏移y, 类别ID筛选或None, 是否排除这些类别), ...])
+        """
+        configs = self.tile_configs
+        if classes is not None:
+            # 本次不检测的类别不需要切片
+            configs = [c for c in configs if set(c.classes) & classes]
+        if not configs:
+            return frames, [(dx, dy, None, False) for dx, dy in offsets]
+
+        images, jobs = [], []
+        for frame, (dx, dy) in zip(frames, offsets):
+            h, w = frame.shape[:2]
+            tiled_ids = set()
+            tiles = []
+            for config in configs:
+                if max(h, w) <= config.tile_size:
+                    continue
+                ids = self._class_ids(config.classes)
+                tiled_ids.update(ids)
+                for x1, y1, x2, y2 in tile_grid(w, h, config.tile_size, config.overlap):
+                    # 视图，不拷贝
+                    tiles.append((frame[y1:y2, x1:x2], (dx + x1, dy + y1, ids, False)))
+
+            # 整幅图像: 切片类别以切片结果为准
+            images.append(frame)
+            jobs.append((dx, dy, tiled_ids or None, bool(tiled_ids)))
+            for image, job in tiles:
+                images.append(image)
+                jobs.append(job)
+        return images, jobs
+
+    def set_tiling(self, classes: Sequence[str], tile_size: int = 640, overlap: float = 0.2):
+        """
+        对指定类别启用切片推理（替换已有的同类别设置）
+
+        参数:
+            classes: 类别名称，例如 ('props',)
+            tile_size: 切片边长（像素）
+            overlap: 相邻切片的重叠比例
+        """
+        classes = tuple(classes)
+        self.tile_configs = [c for c in self.tile_configs if not set(c.classes) & set(classes)]
+        self.tile_configs.append(TileConfig(classes, tile_size, overlap))
+        self.invalidate_cache()
+
+    def clear_tiling(self):
+        """关闭切片推理"""
+        self.tile_configs = []
+        self.invalidate_cache()
+
+    # ========== 推理配置 ==========
+
+    def set_profile(self, name: str):
+        """
+        切换推理配置
+
+        参数:
+            name: self.profiles 中的配置名称，'auto' 表示根据上一次检测到的类别自动选择
+        """
+        if name == 'auto':
+            self.auto_profile = True
+            return
+        if name not in self.profiles:
+            raise ValueError(f"未知的推理配置: {name}（可选: auto, {', '.join(self.profiles)}）")
+        self.auto_profile = False
+        if self.profile.name != name:
+            self.profile = self.profiles[name]
+            # 旧配置的结果可能缺少新配置需要的类别
+            self.invalidate_cache()
+
+    def add_profile(self, profile: InferenceProfile):
+        """添加或替换推理配置"""
+        self.profiles[profile.name] = profile
+        if self.profile.name == profile.name:
+            self.profile = profile
+            self.invalidate_cache()
+
+    def get_profile_stats(self) -> Dict[str, Dict[str, float]]:
+        """
+        各推理配置的统计
+
+        返回:
+            {配置名称: {'frames': 推理次数, 'avg_ms': 平均耗时, 'max_ms': 最大耗时,
+                        'avg_detections': 平均检测框数}}
+        """
+        return self.profile_stats.get_stats()
+
+    # ========== 模板匹配 ==========
+
+    def set_class_mode(self, name: str, mode: str):
+        """
+        设置类别的检测方式: 'template' 优先模板匹配（失败时回退到 YOLO），'model' 始终使用 YOLO
+        """
+        if self.template_matcher is None:
+            self.template_matcher = TemplateMatcher(())
+        self.template_matcher.set_mode(name, mode)
+
+    def match_template(self, name: str) -> Optional[Tuple[int, int]]:
+        """
+        静态界面元素的快速查找: 在上次位置附近模板匹配
+
+        没有开启模板匹配、处于后台连续检测模式、没有模板或匹配失败时返回 None，
+        调用方应回退到检测快照（get_center_by_name 和 game_utils 的等待函数都先调用这里）
+        """
+        if self.template_matcher is None or self.is_continuous:
+            return None
+        return self._match_template(name)
+
+    def _match_template(self, name: str) -> Optional[Tuple[int, int]]:
+        """在上次位置附近模板匹配，没有模板或匹配失败返回 None"""
+        window = self.template_matcher.search_window(name)
+        if window is None:
+            return None
+        if self._screen_shape is not None:
+            h, w = self._screen_shape
+            x1, y1, x2, y2 = window
+            window = (x1, y1, min(x2, w), min(y2, h))
+        t0 = time.perf_counter()
+        frame = self.capture_screen(window)
+        center = self.template_matcher.match(name, frame, window[:2])
+        self.latency.record_since('template', t0)
+        return center
+
+    def get_template_stats(self) -> Dict[str, Dict[str, float]]:
+        """
+        模板匹配统计
+
+        返回:
+            {类别: {'hits', 'misses', 'hit_rate', 'avg_match_ms'}}
+        """
+        if self.template_matcher is None:
+            return {}
+        return self.template_matcher.get_stats()
+
+    # ========== 按类别的检测区域 ==========
+
+    def set_class_roi(self, name: str, region: Optional[Region]):
+        """
+        设置某个类别（支持通配符，如 'portal*'）的检测区域，None表示取消
+        """
+        if region is None:
+            self.class_rois.pop(name, None)
+        else:
+            self.class_rois[name] = tuple(region)
+        self.invalidate_cache()
+
+    def _resolve_region(self, name: str, region: RegionSpec) -> RegionSpec:
+        """未显式指定区域时，使用该类别配置的检测区域"""
+        if region is not None or not self.class_rois or self.is_continuous:
+            # 后台连续检测已有全屏结果，不再单独推理区域
+            return region
+        if name in self.class_rois:
+            return self.class_rois[name]
+        for pattern, roi in self.class_rois.items():
+            if fnmatch.fnmatchcase(name, pattern):
+                return roi
+        return None
+
+    def get_snapshot(self, region: RegionSpec = None, max_age: Optional[float] = None,
+                     classes: Optional[Iterable[str]] = None) -> DetectionSnapshot:
+        """
+        获取检测快照，有效期内直接复用，否则重新截图+推理
+
+        参数:
+            region: 检测区域 (x1, y1, x2, y2) 或区域列表，None表示全屏
+            max_age: 本次允许的最大快照年龄（秒），None表示使用 cache_max_age
+            classes: 只需要这些类别（缓存的快照包含这些类别时可复用），None表示全部类别
+
+        返回:
+            DetectionSnapshot
+        """
+        error, self._pipeline_error = self._pipeline_error, None
+        if error is not None:
+            # 检测进程退出后不再返回旧结果，报告一次后回到同步检测
+            raise error
+        if max_age is None:
+            max_age = self.cache_max_age
+        region = normalize_regions(region)
+        if classes is not None:
+            classes = frozenset(classes)
+
+        if self.is_continuous and region == self._pipeline_region:
+            snapshot = self._wait_pipeline_snapshot()
+            if snapshot is not None:
+                return snapshot
+
+        with self._snapshot_lock:
+            snapshot = self._snapshots.get(region)
+            if (snapshot is not None and max_age > 0 and snapshot.age <= max_age
+                    and snapshot.covers(classes)):
+                self.cache_hits += 1
+                return snapshot
+            self.cache_misses += 1
+            if classes is not None:
+                if self.auto_profile:
+                    classes = None
+                else:
+                    # 推理所有查询过的类别，交替查询不同类别时仍能复用同一个快照
+                    classes = self._queried_classes[region] = classes | self._queried_classes.get(region, frozenset())
+
+        timestamp = time.monotonic()
+        detections = self.detect_screen(region, classes)
+        return self._publish_snapshot(region, detections, timestamp, classes)
+
+    def _publish_snapshot(self, region, detections, timestamp,
+                          classes: Optional[FrozenSet[str]] = None) -> DetectionSnapshot:
+        """生成新快照并放入缓存"""
+        with self._frame_cond:
+            self._frame_id += 1
+            snapshot = DetectionSnapshot(
+                frame_id=self._frame_id,
+                timestamp=timestamp,
+                region=region,
+                detections=detections,
+                classes=classes
+            )
+            self._snapshots[region] = snapshot
+            self._frame_cond.notify_all()
+        return snapshot
+
+    def invalidate_cache(self):
+        """使所有检测快照失效（例如在点击、按键等输入操作之后调用）"""
+        with self._snapshot_lock:
+            self._snapshots.clear()
+            self._invalidated_at = time.monotonic()
+        if self.change_gate is not None:
+            # 阈值、切片、配置变化或输入操作之后，画面没变也不能复用之前的结果
+            self.change_gate.clear()
+
+    # ========== 后台连续检测模式 ==========
+
+    @property
+    def is_continuous(self) -> bool:
+        """是否处于后台连续检测模式"""
+        return self._pipeline_thread is not None and self._pipeline_thread.is_alive()
+
+    def start_continuous(self, target_fps: float = 10.0, should_run=None, should_pause=None,
+                         region: RegionSpec = None, processes: bool = False):
+        """
+        启动后台连续检测：生产者线程不断截图+推理并发布最新快照，
+        查询方法直接读取最新结果而不等待推理
+
+        参数:
+            target_fps: 目标帧率
+            should_run: 返回 False 时线程退出（如 lambda: gui.is_running）
+            should_pause: 返回 True 时暂停截图和推理（如 lambda: gui.is_paused）
+            region: 检测区域，None表示全屏
+            processes: 截图和推理放到独立进程，通过共享内存传递画面和结果，
+                       不与脚本线程争抢 GIL（见 process_pipeline.py）。
+                       只支持单个区域，不使用画面变化检测、模板匹配、切片和画面记录
+        """
+        if self.is_continuous:
+            return
+
+        self._pipeline_region = normalize_regions(region)
+        target, args = self._pipeline_loop, (target_fps, should_run, should_pause)
+        if processes:
+            regions = self._pipeline_region
+            if regions is not None and len(regions) > 1:
+                raise ValueError("多进程检测只支持单个检测区域")
+            pipeline = ProcessPipeline(
+                self.model_path, self.class_names, self.frame_source,
+                region=regions[0] if regions else None,
+                conf=float(self._conf_thresholds(self.conf).min()),
+                imgsz=self.profile.imgsz,
+                engine=self.engine.name,
+                threads=self.threads,
+                target_fps=target_fps
+            )
+            if not pipeline.start():
+                raise RuntimeError("检测进程启动失败")
+            self._pipeline_error = None
+            self._process_pipeline = pipeline
+            target, args = self._process_reader_loop, (pipeline, should_run, should_pause)
+
+        self._pipeline_stop.clear()
+        self._pipeline_stats = {
+            'frames': 0,
+            'fps': 0.0,
+            'capture_ms': 0.0,
+            'inference_ms': 0.0,
+            'total_ms': 0.0,
+        }
+        self._pipeline_thread = threading.Thread(
+            target=target,
+            args=args,
+            name="ScreenDetectorPipeline",
+            daemon=True
+        )
+        self._pipeline_thread.start()
+
+    def stop_continuous(self, timeout: float = 2.0):
+        """停止后台连续检测"""
+        self._pipeline_stop.set()
+        thread = self._pipeline_thread
+        if thread is not None and thread is not threading.current_thread():
+            thread.join(timeout)
+        self._pipeline_thread = None
+        if self._process_pipeline is not None:
+            self._process_pipeline.stop()
+            self._process_pipeline = None
+        with self._frame_cond:
+            self._frame_cond.notify_all()
+
+    def close(self):
+        """停止后台检测并释放图像来源"""
+        self.stop_continuous()
+        self.frame_source.close()
+
+    @property
+    def is_multiprocess(self) -> bool:
+        """后台检测是否运行在独立进程中"""
+        return self._process_pipeline is not None and self.is_continuous
+
+    def get_pipeline_stats(self) -> Dict[str, float]:
+        """
+        获取后台检测统计
+
+        返回:
+            {'frames': 已处理帧数, 'fps': 实际帧率,
+             'capture_ms' / 'inference_ms' / 'total_ms': 各阶段平均耗时（毫秒）}
+        """
+        return dict(self._pipeline_stats)
+
+    def _pipeline_loop(self, target_fps, should_run, should_pause):
+        """生产者线程主循环"""
+        interval = 1.0 / target_fps if target_fps > 0 else 0.0
+        stats = self._pipeline_stats
+        started = time.monotonic()
+
+        while not self._pipeline_stop.is_set():
+            if should_run is not None and not should_run():
+                break
+            if should_pause is not None and should_pause():
+                self._pipeline_stop.wait(0.1)
+                continue
+
+            t0 = time.monotonic()
+            try:
+                frames, offsets = self._capture_regions(self._pipeline_region)
+                t1 = time.monotonic()
+                detections = self._detect_gated(self._pipeline_region, frames, offsets)
+            except Exception as e:
+                print(f"后台检测出错: {e}")
+                self._pipeline_stop.wait(0.5)
+                continue
+            t2 = time.monotonic()
+            self.latency.record('capture', (t1 - t0) * 1000)
+            self.latency.record('total', (t2 - t0) * 1000)
+            if self.frame_recorder is not None:
+                self.frame_recorder.add(frames, offsets, detections, self._screen_shape)
+
+            self._publish_snapshot(self._pipeline_region, detections, t0)
+
+            # 累计平均耗时
+            n = stats['frames']
+            stats['capture_ms'] = (stats['capture_ms'] * n + (t1 - t0) * 1000) / (n + 1)
+            stats['inference_ms'] = (stats['inference_ms'] * n + (t2 - t1) * 1000) / (n + 1)
+            stats['total_ms'] = (stats['total_ms'] * n + (t2 - t0) * 1000) / (n + 1)
+            stats['frames'] = n + 1
+            stats['fps'] = stats['frames'] / max(t2 - started, 1e-6)
+
+            remaining = interval - (time.monotonic() - t0)
+            if remaining > 0:
+                self._pipeline_stop.wait(remaining)
+
+        with self._frame_cond:
+            self._frame_cond.notify_all()
+
+    def _process_reader_loop(self, pipeline: ProcessPipeline, should_run, should_pause):
+        """多进程模式下的读取线程: 等待推理进程的新结果并发布为快照（不截图、不推理）"""
+        stats = self._pipeline_stats
+        started = time.monotonic()
+        last_seq = 0
+
+        try:
+            while not self._pipeline_stop.is_set():
+                if should_run is not None and not should_run():
+                    break
+                pipeline.pause(should_pause is not None and should_pause())
+                result = pipeline.wait_result(last_seq, timeout=0.1)
+                if result is None:
+                    if not pipeline.is_alive:
+                        reason = pipeline.failure() or "检测进程已退出"
+                        print(f"后台检测已停止: {reason}")
+                        self._pipeline_error = RuntimeError(f"后台检测已停止: {reason}")
+                        break
+                    continue
+
+                last_seq, timestamp, detections = result
+                if self.class_conf:
+                    detections = detections.filter_confidence(self._conf_thresholds(self.conf))
+                self._publish_snapshot(self._pipeline_region, detections, timestamp)
+                with self._snapshot_lock:
+                    self.inferences += 1
+
+                now = time.monotonic()
+                process_stats = pipeline.get_stats()
+                self.latency.record('capture', process_stats['capture_ms'])
+                self.latency.record('inference', process_stats['inference_ms'])
+                self.latency.record('total', (now - timestamp) * 1000)
+                n = stats['frames']
+                stats['capture_ms'] = (stats['capture_ms'] * n + process_stats['capture_ms']) / (n + 1)
+                stats['inference_ms'] = (stats['inference_ms'] * n + process_stats['inference_ms']) / (n + 1)
+                stats['total_ms'] = (stats['total_ms'] * n + (now - timestamp) * 1000) / (n + 1)
+                stats['frames'] = n + 1
+                stats['fps'] = stats['frames'] / max(now - started, 1e-6)
+        finally:
+            # 随读取线程一起结束子进程（脚本停止时 should_run 返回 False）
+            self._pipeline_stop.set()
+            pipeline.stop()
+            with self._frame_cond:
+                self._frame_cond.notify_all()
+
+    def _wait_pipeline_snapshot(self, timeout: float = 2.0) -> Optional[DetectionSnapshot]:
+        """
+        读取后台线程发布的最新快照
+
+        正常情况下不阻塞；只有尚无结果或快照早于最近一次 invalidate_cache 时，
+        才等待下一帧（约一帧延迟）。后台线程不可用时返回 None
+        """
+        deadline = time.monotonic() + timeout
+        with self._frame_cond:
+            while True:
+                snapshot = self._snapshots.get(self._pipeline_region)
+                if snapshot is not None and snapshot.timestamp >= self._invalidated_at:
+                    self.cache_hits += 1
+                    return snapshot
+                remaining = deadline - time.monotonic()
+                if remaining <= 0 or not self.is_continuous:
+                    return None
+                self._frame_cond.wait(remaining)
+
+    def get_latency_stats(self) -> Dict[str, Dict[str, float]]:
+        """
+        分阶段耗时统计（最近 1024 次，毫秒）
+
+        阶段: capture 截图（含 convert 颜色转换）、gate 画面变化检查、preprocess 预处理、
+        inference 推理、postprocess 后处理（NMS）、parse 解析、merge 合并与筛选、
+        template 模板匹配、total 一次 detect_screen 的总耗时
+
+        返回:
+            {阶段: {'count', 'mean', 'p50', 'p95', 'p99', 'max'}}
+        """
+        return self.latency.summary()
+
+    def dump_latency(self, path: str = "latency.json"):
+        """把分阶段耗时统计写入 JSON 文件"""
+        self.latency.dump_json(path)
+
+    def dump_frames(self, directory: str = "frame_dumps", annotate: bool = False) -> Optional[str]:
+        """
+        导出最近记录的画面和检测结果（需要 record_frames > 0）
+
+        参数:
+            directory: 上级目录
+            annotate: 是否在图片上画出检测框
+
+        返回:
+            导出目录，没有记录时返回 None
+        """
+        if self.frame_recorder is None or not len(self.frame_recorder):
+            return None
+        return self.frame_recorder.dump(directory, self.class_names, annotate)
+
+    def get_cache_stats(self) -> Dict[str, float]:
+        """
+        获取快照缓存统计
+
+        返回:
+            {'hits': 命中次数, 'misses': 未命中次数, 'hit_rate': 命中率,
+             'inferences': 实际推理次数（含后台检测）}
+        """
+        total = self.cache_hits + self.cache_misses
+        return {
+            'hits': self.cache_hits,
+            'misses': self.cache_misses,
+            'hit_rate': self.cache_hits / total if total else 0.0,
+            'inferences': self.inferences
+        }
+
+    def reset_cache_stats(self):
+        """重置缓存统计"""
+        self.cache_hits = 0
+        self.cache_misses = 0
+        self.inferences = 0
+        if self.change_gate is not None:
+            self.change_gate.reset_stats()
+        if self.template_matcher is not None:
+            self.template_matcher.reset_stats()
+        self.profile_stats.reset()
+
+    def get_center_by_name(self, name: str, region: RegionSpec = None) -> Optional[Tuple[int, int]]:
         """
         获取指定名称对象的中心点位置
 
@@ -132,16 +966,15 @@ class ScreenDetector:
         返回:
             (center_x, center_y) 或 None（未检测到）
         """
-        detections = self.detect_screen(region)
+        if region is None:
+            center = self.match_template(name)
+            if center is not None:
+                return center
 
-        # 查找匹配的目标
-        for det in detections:
-            if det['name'] == name:
-                return det['center']
-
-        return None
+        return self.get_snapshot(self._resolve_region(name, region),
+                                 classes=self._query_classes(name)).first_center(name)
 
-    def get_all_centers_by_name(self, name: str, region: Optional[Tuple[int, int, int, int]] = None) -> List[Tuple[int, int]]:
+    def get_all_centers_by_name(self, name: str, region: RegionSpec = None) -> List[Tuple[int, int]]:
         """
         获取所有指定名称对象的中心点位置（可能有多个）
 
@@ -152,17 +985,11 @@ class ScreenDetector:
         返回:
             中心点列表 [(x1, y1), (x2, y2), ...]
         """
-        detections = self.detect_screen(region)
-
-        centers = []
-        for det in detections:
-            if det['name'] == name:
-                centers.append(det['center'])
-
-        return centers
+        return self.get_snapshot(self._resolve_region(name, region),
+                                 classes=self._query_classes(name)).centers_by_name(name)
 
     def get_closest_center_by_name(self, name: str, reference_point: Tuple[int, int],
-                                   region: Optional[Tuple[int, int, int, int]] = None) -> Optional[Tuple[int, int]]:
+                                   region: RegionSpec = None) -> Optional[Tuple[int, int]]:
         """
         获取距离参考点最近的指定对象中心点
 
@@ -174,49 +1001,120 @@ class ScreenDetector:
         返回:
             最近的中心点 (x, y) 或 None
         """
-        centers = self.get_all_centers_by_name(name, region)
+        return self.get_snapshot(self._resolve_region(name, region),
+                                 classes=self._query_classes(name)).nearest(name, reference_point)
 
-        if not centers:
-            return None
+    def get_k_closest_centers_by_name(self, name: str, reference_point: Tuple[int, int], k: int,
+                                      region: RegionSpec = None) -> List[Tuple[int, int]]:
+        """
+        获取距离参考点最近的 k 个指定对象中心点
+
+        参数:
+            name: 目标类别名称
+            reference_point: 参考点坐标 (x, y)
+            k: 数量
+            region: 检测区域
+
+        返回:
+            中心点列表（由近到远）
+        """
+        return self.get_snapshot(self._resolve_region(name, region),
+                                 classes=self._query_classes(name)).k_nearest(name, reference_point, k)
 
-        # 计算距离并找到最近的点
-        ref_x, ref_y = reference_point
-        min_distance = float('inf')
-        closest_center = None
+    def get_centers_within_radius(self, name: str, reference_point: Tuple[int, int], radius: float,
+                                  region: RegionSpec = None) -> List[Tuple[int, int]]:
+        """
+        获取参考点周围 radius 像素内的指定对象中心点（如角色附近的物品）
 
-        for center in centers:
-            cx, cy = center
-            distance = np.sqrt((cx - ref_x)**2 + (cy - ref_y)**2)
-            if distance < min_distance:
-                min_distance = distance
-                closest_center = center
+        参数:
+            name: 目标类别名称
+            reference_point: 参考点坐标 (x, y)
+            radius: 半径（像素）
+            region: 检测区域
 
-        return closest_center
+        返回:
+            中心点列表（由近到远）
+        """
+        return self.get_snapshot(self._resolve_region(name, region),
+                                 classes=self._query_classes(name)).within_radius(name, reference_point, radius)
 
-    def get_all_detections(self, region: Optional[Tuple[int, int, int, int]] = None) -> Dict[str, List[Tuple[int, int]]]:
+    def get_centers_within_box(self, name: str, box: Region,
+                               region: RegionSpec = None) -> List[Tuple[int, int]]:
         """
-        获取所有检测到的对象，按类别分组
+        获取中心点位于矩形 box 内的指定对象
+
+        与 region 不同，box 只过滤结果，不缩小推理范围
 
         参数:
+            name: 目标类别名称
+            box: 矩形 (x1, y1, x2, y2)
             region: 检测区域
 
         返回:
-            字典 {'类别名': [(x1, y1), (x2, y2), ...]}
+            中心点列表
         """
-        detections = self.detect_screen(region)
+        return self.get_snapshot(self._resolve_region(name, region),
+                                 classes=self._query_classes(name)).within_box(name, box)
 
-        result = {}
-        for det in detections:
-            name = det['name']
-            center = det['center']
+    def get_tracks(self, name: Optional[str] = None, region: RegionSpec = None,
+                   max_age: Optional[float] = None) -> List[TrackState]:
+        """
+        获取目标轨迹（持续的目标编号、速度），位置外推到当前时刻
+
+        由于位置会按速度外推，max_age 可以比 cache_max_age 大（例如隔帧推理）。
+
+        参数:
+            name: 目标类别名称，None表示全部
+            region: 检测区域
+            max_age: 本次允许的最大快照年龄（秒），None表示使用 cache_max_age
+
+        返回:
+            TrackState 列表
+        """
+        region = normalize_regions(region)
+        snapshot = self.get_snapshot(region, max_age)
+        with self._tracker_lock:
+            tracker = self._trackers.get(region)
+            if tracker is None:
+                tracker = self._trackers[region] = ObjectTracker()
+            tracker.high_conf, tracker.low_conf, tracker.new_track_conf = self._tracker_conf()
+            # 同一快照只更新一次
+            if self._tracked_frames.get(region) != snapshot.frame_id:
+                self._tracked_frames[region] = snapshot.frame_id
+                tracker.update(snapshot.detections, snapshot.timestamp)
+            return tracker.tracks(name, time.monotonic())
+
+    def _tracker_conf(self) -> Tuple[float, float, float]:
+        """
+        跟踪器的置信度分层 (high_conf, low_conf, new_track_conf)
 
-            if name not in result:
-                result[name] = []
-            result[name].append(center)
+        低于检测阈值的框在推理后已被丢弃，跟踪器的阈值必须从检测阈值推出:
+        达到全局阈值的框参与第一轮匹配；class_conf 放宽了阈值的类别中低于全局阈值的框
+        参与第二轮匹配；检测器报告的框都可以生成新轨迹。
+        """
+        base_conf = self.conf if self.profile.conf is None else self.profile.conf
+        low_conf = float(self._conf_thresholds(base_conf).min())
+        return max(base_conf, low_conf), low_conf, low_conf
 
-        return result
+    def reset_tracks(self):
+        """清除所有轨迹（切换场景后调用）"""
+        with self._tracker_lock:
+            self._trackers.clear()
+            self._tracked_frames.clear()
 
-    def visualize_detections(self, region: Optional[Tuple[int, int, int, int]] = None,
+    def get_all_detections(self, region: RegionSpec = None) -> Dict[str, List[Tuple[int, int]]]:
+        """
+        获取所有检测到的对象，按类别分组
+
+        参数:
+            region: 检测区域
+
+        返回:
+            字典 {'类别名': [(x1, y1), (x2, y2), ...]}
+        """
+        return self.get_snapshot(region).group_by_name()
+
+    def visualize_detections(self, region: RegionSpec = None,
                             show_time: int = 0) -> np.ndarray:
         """
         可视化检测结果
@@ -228,8 +1126,15 @@ class ScreenDetector:
         返回:
             标注后的图像
         """
-        frame = self.capture_screen(region)
-        detections = self.detect_screen(region)
+        # 截图复用图像来源的缓冲区，拷贝后再绘制；指定区域时从同一帧裁剪
+        frame = self.capture_screen().copy()
+        self._screen_shape = frame.shape[:2]
+        regions = normalize_regions(region)
+        if regions is None:
+            detections = self.detect_frame(frame)
+        else:
+            crops = [frame[y1:y2, x1:x2] for x1, y1, x2, y2 in regions]
+            detections = self._detect_frames(crops, [(x1, y1) for x1, y1, _, _ in regions])
 
         # 绘制检测框和中心点
         for det in detections:
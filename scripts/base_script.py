@@ -25,6 +25,7 @@ class BaseScript(ABC):
                 - gui_app.is_paused - 是否暂停
                 - gui_app.detector - 屏幕检测器
                 - gui_app.game_input - 游戏输入控制器
+                - gui_app.input_executor - 异步输入执行器（提交后立即返回 Future）
         """
         self.app = gui_app
         self.run_count = 0
@@ -99,6 +100,11 @@ class BaseScript(ABC):
         """获取游戏输入控制器"""
         return self.app.game_input
 
+    @property
+    def input_executor(self):
+        """获取异步输入执行器（不阻塞脚本线程的点击和按键）"""
+        return getattr(self.app, 'input_executor', None)
+
     @property
     def is_running(self):
         """是否正在运行"""
@@ -4,8 +4,11 @@
 自动执行副本刷图流程
 """
 
+from concurrent.futures import CancelledError
+
 from .base_script import BaseScript
-from game_utils import get_pos_by_name, click_pos, pick_up_items, press_a
+from game_utils import get_pos_by_name, click_pos, click_and_confirm, pick_up_items, press_a, wait_for
+from input_macro import BLINK, play_macro, run_macro
 
 
 class DungeonScript(BaseScript):
@@ -22,32 +25,37 @@ class DungeonScript(BaseScript):
         try:
             # 步骤1: 前往传送门
             self.log("\n[步骤1] 前往传送门...", "INFO")
-            portal2_xy = get_pos_by_name(self.detector, 'portal2')
+            portal2_xy = get_pos_by_name(self.detector, 'portal2', app=self.app)
             button1_xy = self.detector.get_center_by_name(name='button1')
             while not button1_xy and self.is_running:
-                click_pos(portal2_xy, click_type='double', duration=0.3, game_input=self.game_input)
-                if not self.sleep(1):
-                    return False
-                button1_xy = self.detector.get_center_by_name(name='button1')
+                click_pos(portal2_xy, click_type='double', duration=0.3, game_input=self.game_input, detector=self.detector, executor=self.input_executor)
+                # 按钮出现即继续，最多等 1 秒后重新点击
+                button1_xy = wait_for(self.detector, 'button1', timeout=1, app=self.app).pos
 
             # 步骤2: 进入传送门
             self.log("\n[步骤2] 进入传送门...", "INFO")
-            button1_xy = get_pos_by_name(self.detector, 'button1')
+            button1_xy = get_pos_by_name(self.detector, 'button1', app=self.app)
             while button1_xy and self.is_running:
-                click_pos(button1_xy, click_type='double', game_input=self.game_input)
-                if not self.sleep(1):
-                    return False
+                # 按钮消失即进入成功，1 秒内没消失就重新点击按钮当前的位置
+                result = click_and_confirm(self.detector, button1_xy, disappear='button1', click_type='double',
+                                           game_input=self.game_input, app=self.app, timeout=1, retries=0,
+                                           executor=self.input_executor)
+                if result:
+                    self.log(f"按钮1已消失 (反应 {result.reaction_time:.2f}s)", "DEBUG")
+                    break
                 button1_xy = self.detector.get_center_by_name(name='button1')
 
-            dungeon_xy = get_pos_by_name(self.detector, 'dungeon')
+            dungeon_xy = get_pos_by_name(self.detector, 'dungeon', app=self.app)
             if dungeon_xy and self.is_running:
-                click_pos(dungeon_xy, click_type='single', game_input=self.game_input)
-                if not self.sleep(1):
+                click_and_confirm(self.detector, dungeon_xy, appear='startButton',
+                                  game_input=self.game_input, app=self.app, timeout=1, retries=0,
+                                  executor=self.input_executor)
+                if not self.is_running:
                     return False
 
-            startButton_xy = get_pos_by_name(self.detector, 'startButton')
+            startButton_xy = get_pos_by_name(self.detector, 'startButton', app=self.app)
             if startButton_xy and self.is_running:
-                click_pos(startButton_xy, click_type='single', game_input=self.game_input)
+                click_pos(startButton_xy, click_type='single', game_input=self.game_input, detector=self.detector, executor=self.input_executor)
                 if not self.sleep(2):
                     return False
 
@@ -56,52 +64,64 @@ class DungeonScript(BaseScript):
             screen_width, screen_height = self.game_input.get_screen_size()
             screen_center = (screen_width // 2, screen_height // 5)
 
-            person_xy = get_pos_by_name(self.detector, 'person')
+            person_xy = get_pos_by_name(self.detector, 'person', app=self.app)
             if person_xy and self.is_running:
                 self.log(f"检测到人物位置: {person_xy}", "DEBUG")
                 if not self.sleep(3):
                     return False
 
             if self.is_running:
-                self.game_input.move_mouse(screen_center[0], screen_center[1])
-                if not self.sleep(0.2):
-                    return False
-                self.game_input.click(button ='right')
-                self.log(f"右键闪现到: {screen_center}", "DEBUG")
+                if self.input_executor is not None:
+                    report = play_macro(self.input_executor, BLINK, x=screen_center[0], y=screen_center[1]).result()
+                elif hasattr(self.game_input, 'mouse_down'):
+                    report = run_macro(self.game_input, BLINK, x=screen_center[0], y=screen_center[1])
+                else:
+                    # 远程输入（RemoteGameInput）只有 move_mouse / click
+                    report = None
+                    self.game_input.move_mouse(screen_center[0], screen_center[1])
+                    if not self.sleep(0.2):
+                        return False
+                    self.game_input.click(button='right')
+                self.detector.invalidate_cache()
+                self.log(f"右键闪现到: {screen_center}" + (f"（{report.format()}）" if report else ""), "DEBUG")
                 if not self.sleep(3):
                     return False
 
             # 步骤4: 拾取物品并退出
             self.log("\n[步骤4] 拾取物品并退出副本...", "INFO")
-            portal1_xy = get_pos_by_name(self.detector, 'portal1')
+            portal1_xy = get_pos_by_name(self.detector, 'portal1', app=self.app)
             if portal1_xy and self.is_running:
-                pick_up_items(self.detector, 'props', game_input=self.game_input)
+                pick_up_items(self.detector, 'props', game_input=self.game_input, app=self.app, executor=self.input_executor)
                 if not self.sleep(1):
                     return False
 
-                portal1_xy = get_pos_by_name(self.detector, 'portal1')
-                click_pos(portal1_xy, click_type='double', duration=0.3, game_input=self.game_input)
+                portal1_xy = get_pos_by_name(self.detector, 'portal1', app=self.app)
+                if portal1_xy:
+                    click_pos(portal1_xy, click_type='double', duration=0.3, game_input=self.game_input, detector=self.detector, executor=self.input_executor)
                 if not self.sleep(1):
                     return False
 
             portal2_xy = self.detector.get_center_by_name(name='portal2')
             while not portal2_xy and self.is_running:
                 portal1_xy = self.detector.get_center_by_name(name='portal1')
-                press_a()
+                press_a(self.game_input, self.input_executor)
                 self.log(f"点击传送门: {portal1_xy}", "INFO")
                 if portal1_xy and self.is_running:
-                    click_pos((portal1_xy[0], portal1_xy[1] + 100), click_type='double', duration=0.3, game_input=self.game_input)
+                    click_pos((portal1_xy[0], portal1_xy[1] + 100), click_type='double', duration=0.3, game_input=self.game_input, detector=self.detector, executor=self.input_executor)
                     for _ in range(2):
                         if not self.sleep(0.1):
                             return False
                         button2_xy = self.detector.get_center_by_name(name='button2')
                         self.log(f"检测到按钮2位置: {button2_xy}", "INFO")
                         if button2_xy and self.is_running:
-                            click_pos(button2_xy, click_type='double', game_input=self.game_input)
+                            click_pos(button2_xy, click_type='double', game_input=self.game_input, detector=self.detector, executor=self.input_executor)
                             self.log("点击了按钮2", "INFO")
                 portal2_xy = self.detector.get_center_by_name(name='portal2')
             return True
 
+        except CancelledError:
+            # 停止时排队的输入被取消
+            return False
         except Exception as e:
             self.log(f"执行步骤出错: {e}", "ERROR")
             return False
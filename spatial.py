@@ -0,0 +1,110 @@
+"""
+检测结果的空间查询
+
+在一帧检测结果的中心点上回答最近邻、k 近邻、半径内和矩形内查询。
+距离计算全部向量化；同一类别的点较多时使用 KD 树（需要 scipy，
+ultralytics 已依赖 scipy，缺少时自动退回到 numpy 暴力计算）。
+
+用法:
+    index = detections.spatial
+    i = index.nearest((960, 540), 'props')           # 检测框下标
+    idx = index.within_radius((960, 540), 300, 'props')
+"""
+
+from typing import Dict, Optional, Tuple
+
+import numpy as np
+
+try:
+    from scipy.spatial import cKDTree
+except ImportError:
+    cKDTree = None
+
+# 点数达到该值时使用 KD 树
+KDTREE_MIN_POINTS = 64
+
+Point = Tuple[float, float]
+Box = Tuple[int, int, int, int]
+
+
+class SpatialIndex:
+    """一帧检测结果中心点的空间索引（只读，查询返回检测框下标，按距离从近到远排序）"""
+
+    def __init__(self, detections):
+        """
+        参数:
+            detections: Detections
+        """
+        self.detections = detections
+        self._points = detections.centers.astype(np.float64)
+        self._trees: Dict[Optional[str], tuple] = {}   # 类别 -> (下标, KD 树)
+
+    def _candidates(self, name: Optional[str]) -> np.ndarray:
+        if name is None:
+            return np.arange(len(self._points))
+        return self.detections.indices_of(name)
+
+    def _tree(self, name: Optional[str], idx: np.ndarray):
+        """点数足够多时返回该类别的 KD 树，否则返回 None"""
+        if cKDTree is None or len(idx) < KDTREE_MIN_POINTS:
+            return None
+        entry = self._trees.get(name)
+        if entry is None:
+            entry = self._trees[name] = (idx, cKDTree(self._points[idx]))
+        return entry[1]
+
+    def _distances(self, point: Point, idx: np.ndarray) -> np.ndarray:
+        diff = self._points[idx] - np.asarray(point, dtype=np.float64)
+        return np.hypot(diff[:, 0], diff[:, 1])
+
+    def k_nearest(self, point: Point, k: int, name: Optional[str] = None) -> np.ndarray:
+        """距离 point 最近的 k 个检测框"""
+        idx = self._candidates(name)
+        k = min(k, len(idx))
+        if k <= 0:
+            return np.empty(0, dtype=np.int64)
+
+        tree = self._tree(name, idx)
+        if tree is not None:
+            _, pos = tree.query(point, k=k)
+            return idx[np.atleast_1d(pos)]
+
+        dist = self._distances(point, idx)
+        if k < len(idx):
+            part = np.argpartition(dist, k - 1)[:k]
+            order = part[np.argsort(dist[part], kind='stable')]
+        else:
+            order = np.argsort(dist, kind='stable')
+        return idx[order]
+
+    def nearest(self, point: Point, name: Optional[str] = None) -> Optional[int]:
+        """距离 point 最近的检测框，没有时返回 None"""
+        idx = self.k_nearest(point, 1, name)
+        return int(idx[0]) if len(idx) else None
+
+    def within_radius(self, point: Point, radius: float, name: Optional[str] = None) -> np.ndarray:
+        """中心点与 point 距离不超过 radius 的检测框"""
+        idx = self._candidates(name)
+        if not len(idx):
+            return idx
+
+        tree = self._tree(name, idx)
+        if tree is not None:
+            pos = np.asarray(tree.query_ball_point(point, radius), dtype=np.int64)
+            idx = idx[pos]
+            return idx[np.argsort(self._distances(point, idx), kind='stable')]
+
+        dist = self._distances(point, idx)
+        mask = dist <= radius
+        idx, dist = idx[mask], dist[mask]
+        return idx[np.argsort(dist, kind='stable')]
+
+    def within_box(self, box: Box, name: Optional[str] = None) -> np.ndarray:
+        """中心点位于矩形 (x1, y1, x2, y2) 内（含边界）的检测框，按原顺序"""
+        idx = self._candidates(name)
+        if not len(idx):
+            return idx
+        x1, y1, x2, y2 = box
+        pts = self._points[idx]
+        mask = (pts[:, 0] >= x1) & (pts[:, 0] <= x2) & (pts[:, 1] >= y1) & (pts[:, 1] <= y2)
+        return idx[mask]
@@ -0,0 +1,180 @@
+"""
+静态界面元素的模板匹配
+
+按钮、入口等界面元素在屏幕上外观和位置基本固定，不必每次都跑 YOLO。
+流程:
+1. 从置信度高的 YOLO 检测结果中自动截取模板
+2. 之后在上次位置附近的小窗口内用 cv2.matchTemplate 查找
+3. 匹配分数低于阈值时返回 None，由调用方回退到 YOLO，并在下次推理时刷新模板
+"""
+
+import threading
+import time
+from typing import Dict, Iterable, Optional, Tuple
+
+import cv2
+import numpy as np
+
+Region = Tuple[int, int, int, int]
+
+# yolo_dataset.yaml 中外观固定的界面类别
+DEFAULT_TEMPLATE_CLASSES = ('button1', 'button2', 'startButton', 'dungeon')
+
+
+class TemplateMatcher:
+    """模板缓存与匹配"""
+
+    def __init__(self, classes: Iterable[str] = DEFAULT_TEMPLATE_CLASSES,
+                 harvest_conf: float = 0.8, match_threshold: float = 0.85,
+                 search_margin: int = 40):
+        """
+        参数:
+            classes: 使用模板匹配的类别
+            harvest_conf: 只从置信度不低于该值的检测结果中截取模板
+            match_threshold: 归一化相关系数低于该值视为匹配失败
+            search_margin: 在上次位置四周扩展的搜索范围（像素）
+        """
+        self.classes = set(classes)
+        self.harvest_conf = harvest_conf
+        self.match_threshold = match_threshold
+        self.search_margin = search_margin
+        self._templates: Dict[str, np.ndarray] = {}  # 类别 -> 灰度模板
+        self._bboxes: Dict[str, Region] = {}          # 类别 -> 上次所在位置（全屏坐标）
+        self._stale = set()                           # 需要刷新模板的类别
+        self._lock = threading.Lock()
+        self._stats: Dict[str, Dict[str, float]] = {}
+
+    # ========== 配置 ==========
+
+    def set_mode(self, name: str, mode: str):
+        """
+        设置某个类别的检测方式
+
+        参数:
+            mode: 'template' 优先模板匹配，'model' 始终使用 YOLO
+        """
+        if mode == 'template':
+            self.classes.add(name)
+        elif mode == 'model':
+            self.classes.discard(name)
+            with self._lock:
+                self._templates.pop(name, None)
+                self._bboxes.pop(name, None)
+        else:
+            raise ValueError(f"未知的检测方式: {mode}（可选: 'template', 'model'）")
+
+    def has_template(self, name: str) -> bool:
+        """是否已有可用模板"""
+        return name in self.classes and name in self._templates
+
+    # ========== 模板收集 ==========
+
+    def harvest(self, frame: np.ndarray, detections, offset: Tuple[int, int] = (0, 0)):
+        """
+        从检测结果中截取模板
+
+        参数:
+            frame: 推理使用的 BGR 图像
+            detections: 该图像的 Detections（坐标相对于 frame）
+            offset: frame 在屏幕上的偏移
+        """
+        if not self.classes or not len(detections):
+            return
+        dx, dy = offset
+        h, w = frame.shape[:2]
+        for name in self.classes:
+            if name in self._templates and name not in self._stale:
+                continue
+            idx = detections.indices_of(name)
+            if len(idx) != 1:
+                # 同类有多个实例时无法确定匹配哪一个
+                continue
+            rec = detections.data[idx[0]]
+            if rec['conf'] < self.harvest_conf:
+                continue
+            x1, y1 = max(int(rec['x1']), 0), max(int(rec['y1']), 0)
+            x2, y2 = min(int(rec['x2']), w), min(int(rec['y2']), h)
+            if x2 - x1 < 8 or y2 - y1 < 8:
+                continue
+            # 帧缓冲区会被复用，模板必须拷贝
+            template = cv2.cvtColor(frame[y1:y2, x1:x2], cv2.COLOR_BGR2GRAY)
+            with self._lock:
+                self._templates[name] = template
+                self._bboxes[name] = (x1 + dx, y1 + dy, x2 + dx, y2 + dy)
+                self._stale.discard(name)
+
+    # ========== 匹配 ==========
+
+    def search_window(self, name: str) -> Optional[Region]:
+        """模板匹配需要截取的屏幕区域，没有模板时返回 None"""
+        if not self.has_template(name):
+            return None
+        with self._lock:
+            x1, y1, x2, y2 = self._bboxes[name]
+        m = self.search_margin
+        return (max(x1 - m, 0), max(y1 - m, 0), x2 + m, y2 + m)
+
+    def match(self, name: str, window: np.ndarray, origin: Tuple[int, int]) -> Optional[Tuple[int, int]]:
+        """
+        在搜索窗口内匹配模板
+
+        参数:
+            name: 类别名称
+            window: search_window() 区域的 BGR 截图
+            origin: 窗口左上角的屏幕坐标
+
+        返回:
+            匹配到的中心点（全屏坐标），失败返回 None
+        """
+        with self._lock:
+            template = self._templates.get(name)
+        if template is None:
+            return None
+
+        t0 = time.perf_counter()
+        gray = cv2.cvtColor(window, cv2.COLOR_BGR2GRAY)
+        th, tw = template.shape
+        if gray.shape[0] < th or gray.shape[1] < tw:
+            score, loc = 0.0, (0, 0)
+        else:
+            scores = cv2.matchTemplate(gray, template, cv2.TM_CCOEFF_NORMED)
+            _, score, _, loc = cv2.minMaxLoc(scores)
+        elapsed = (time.perf_counter() - t0) * 1000
+
+        x1, y1 = origin[0] + loc[0], origin[1] + loc[1]
+        with self._lock:
+            stats = self._stats.setdefault(name, {'hits': 0, 'misses': 0, 'match_ms': 0.0})
+            stats['match_ms'] += elapsed
+            if score < self.match_threshold:
+                stats['misses'] += 1
+                self._stale.add(name)
+                return None
+            stats['hits'] += 1
+            self._bboxes[name] = (x1, y1, x1 + tw, y1 + th)
+        return (int(x1 + tw / 2), int(y1 + th / 2))
+
+    # ========== 统计 ==========
+
+    def get_stats(self) -> Dict[str, Dict[str, float]]:
+        """
+        返回:
+            {类别: {'hits': 命中次数, 'misses': 回退到 YOLO 的次数,
+                    'hit_rate': 命中率, 'avg_match_ms': 平均匹配耗时}}
+        """
+        result = {}
+        with self._lock:
+            stats = {name: dict(s) for name, s in self._stats.items()}
+        for name, s in stats.items():
+            total = s['hits'] + s['misses']
+            result[name] = {
+                'hits': s['hits'],
+                'misses': s['misses'],
+                'hit_rate': s['hits'] / total if total else 0.0,
+                'avg_match_ms': s['match_ms'] / total if total else 0.0,
+            }
+        return result
+
+    def reset_stats(self):
+        """重置统计"""
+        with self._lock:
+            self._stats.clear()
@@ -0,0 +1,60 @@
+"""
+测试多实例批量推理
+"""
+import threading
+
+import numpy as np
+
+from batch_inference import BatchInferenceService
+from detections import Detections
+from inference_engines import InferenceEngine
+
+CLASS_NAMES = {0: 'person', 3: 'button1', 9: 'props'}
+
+
+class RecordingEngine(InferenceEngine):
+    """每张图像返回固定的两个框，记录每次调用的批大小"""
+
+    name = "recording"
+
+    def __init__(self):
+        super().__init__()
+        self.names = CLASS_NAMES
+        self.calls = []
+
+    def _detect(self, frames, conf=0.25, imgsz=640, classes=None, max_det=300):
+        self.calls.append((len(frames), conf, classes))
+        boxes = np.array([[0, 0, 10, 10, 0.9, 9], [20, 20, 40, 40, 0.5, 3]], dtype=np.float32)
+        return [Detections.from_boxes_array(boxes, CLASS_NAMES) for _ in frames]
+
+
+def test_requests_are_batched_and_routed():
+    """多个会话的请求合并为一次推理，结果按各自的阈值和类别分发"""
+    print("测试批量推理服务...")
+    engine = RecordingEngine()
+    with BatchInferenceService(engine, max_batch=3, max_wait=1.0) as service:
+        results = {}
+        requests = {'vm1': (0.25, None), 'vm2': (0.6, None), 'vm3': (0.25, [3])}
+
+        def run(session):
+            conf, classes = requests[session]
+            results[session] = service.client(session).detect([np.zeros((90, 160, 3), np.uint8)],
+                                                              conf=conf, classes=classes)
+        threads = [threading.Thread(target=run, args=(s,)) for s in requests]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+
+        # 批满 3 张立即推理，使用最低阈值和全部类别
+        assert engine.calls == [(3, 0.25, None)]
+        assert len(results['vm1'][0]) == 2
+        assert results['vm2'][0].centers_by_name('button1') == []
+        assert results['vm3'][0].centers_by_name('props') == [] and len(results['vm3'][0]) == 1
+        assert service.get_stats()['service']['avg_batch'] == 3
+    print("  ✓ 请求合并与分发正确")
+
+
+if __name__ == "__main__":
+    test_requests_are_batched_and_routed()
+    print("\n测试完成！")
@@ -0,0 +1,135 @@
+"""
+测试紧凑检测结果类型
+"""
+import numpy as np
+
+from detections import Detections
+from tiling import tile_grid
+
+CLASS_NAMES = {0: 'person', 1: 'portal1', 3: 'button1', 9: 'props'}
+
+
+def make_detections():
+    boxes = np.array([
+        [10.6, 20.2, 30.9, 40.7, 0.9, 9],
+        [100.0, 100.0, 120.0, 110.0, 0.8, 0],
+        [50.2, 60.4, 71.5, 80.1, 0.7, 9],
+        [200.0, 300.0, 260.0, 340.0, 0.6, 3],
+    ], dtype=np.float32)
+    return boxes, Detections.from_boxes_array(boxes, CLASS_NAMES)
+
+
+def test_dict_view_matches_legacy_parsing():
+    """字典视图与旧版逐框解析结果一致"""
+    print("测试字典视图...")
+    boxes, detections = make_detections()
+
+    legacy = []
+    for x1, y1, x2, y2, conf, cls_id in boxes:
+        legacy.append({
+            'name': CLASS_NAMES[int(cls_id)],
+            'confidence': float(conf),
+            'bbox': [int(x1), int(y1), int(x2), int(y2)],
+            'center': (int((x1 + x2) / 2), int((y1 + y2) / 2))
+        })
+
+    assert len(detections) == 4
+    assert detections.to_dicts() == legacy
+    assert list(detections) == legacy
+    assert detections[1] == legacy[1]
+    print("  ✓ 字典视图一致")
+
+
+def test_class_queries():
+    """按类别查询"""
+    print("测试按类别查询...")
+    _, detections = make_detections()
+
+    assert detections.centers_by_name('props') == [(20, 30), (60, 70)]
+    assert detections.first_center('button1') == (230, 320)
+    assert detections.first_center('portal1') is None
+    assert detections.centers_by_name('portal1') == []
+    assert len(detections.by_name('props')) == 2
+    assert detections.group_by_name() == {
+        'props': [(20, 30), (60, 70)],
+        'person': [(110, 105)],
+        'button1': [(230, 320)],
+    }
+    print("  ✓ 按类别查询正确")
+
+
+def test_empty_and_readonly():
+    """空结果与只读数组"""
+    print("测试空结果...")
+    empty = Detections.empty(CLASS_NAMES)
+    assert not empty
+    assert empty.to_dicts() == []
+    assert empty.first_center('props') is None
+    assert empty.group_by_name() == {}
+
+    _, detections = make_detections()
+    try:
+        detections.data['conf'][0] = 0.0
+    except ValueError:
+        pass
+    else:
+        raise AssertionError("检测结果应为只读")
+    print("  ✓ 空结果与只读检查通过")
+
+
+def test_spatial_queries():
+    """最近邻、k 近邻、半径和矩形查询与逐点计算一致（点数多时走 KD 树）"""
+    print("测试空间查询...")
+    _, detections = make_detections()
+    assert detections.nearest_center('props', (55, 65)) == (60, 70)
+    assert detections.nearest_center(None, (120, 100)) == (110, 105)
+    assert detections.nearest_center('portal1', (0, 0)) is None
+    assert detections.k_nearest_centers('props', (0, 0), 5) == [(20, 30), (60, 70)]
+    assert detections.centers_within_radius('props', (20, 30), 10) == [(20, 30)]
+    assert detections.centers_within_box(None, (0, 0, 120, 120)) == [(20, 30), (110, 105), (60, 70)]
+
+    rng = np.random.default_rng(0)
+    xy = rng.uniform(0, 1900, size=(500, 2)).astype(np.float32)
+    boxes = np.column_stack([xy, xy + 20, np.full(500, 0.9), np.full(500, 9)]).astype(np.float32)
+    many = Detections.from_boxes_array(boxes, CLASS_NAMES)
+    centers = many.centers.astype(float)
+    dist = np.hypot(centers[:, 0] - 960, centers[:, 1] - 540)
+    order = np.argsort(dist, kind='stable')
+
+    assert many.nearest_center('props', (960, 540)) == tuple(many.centers[order[0]])
+    nearest5 = many.k_nearest_centers('props', (960, 540), 5)
+    assert [d for d in np.sort(dist)[:5]] == [float(np.hypot(x - 960, y - 540)) for x, y in nearest5]
+    assert len(many.centers_within_radius('props', (960, 540), 300)) == int((dist <= 300).sum())
+    print("  ✓ 空间查询正确")
+
+
+def test_tile_merge():
+    """切片覆盖整个画面，跨切片被截断的框被完整的框抑制"""
+    print("测试切片合并...")
+    tiles = tile_grid(2560, 1440, 640, 0.2)
+    covered = np.zeros((1440, 2560), dtype=bool)
+    for x1, y1, x2, y2 in tiles:
+        assert x2 - x1 == 640 and y2 - y1 == 640
+        covered[y1:y2, x1:x2] = True
+    assert covered.all()
+
+    boxes = np.array([
+        [500, 100, 530, 130, 0.9, 9],   # 切片内完整的框
+        [522, 100, 530, 130, 0.6, 9],   # 相邻切片中被截断的同一物品
+        [100, 100, 130, 130, 0.8, 0],
+    ], dtype=np.float32)
+    merged = Detections.from_boxes_array(boxes, CLASS_NAMES)
+    assert len(merged.nms()) == 3
+    assert merged.nms(metric='ios').centers_by_name('props') == [(515, 115)]
+    assert merged.filter_classes([9], exclude=True).centers_by_name('person') == [(115, 115)]
+    assert len(merged.filter_classes([9])) == 2
+    print("  ✓ 切片合并正确")
+
+
+if __name__ == "__main__":
+    test_dict_view_matches_legacy_parsing()
+    test_class_queries()
+    test_empty_and_readonly()
+    test_spatial_queries()
+    test_tile_merge()
+    print("\n所有测试通过！")
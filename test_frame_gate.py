@@ -0,0 +1,46 @@
+"""
+测试画面变化门控
+"""
+import numpy as np
+
+from frame_gate import FrameChangeGate
+
+
+def test_reuse_until_change_or_clear():
+    """画面未变化时复用结果，画面变化、过期或清除后重新推理"""
+    print("测试画面变化门控...")
+    gate = FrameChangeGate(threshold=8.0, max_reuse_age=10)
+    frame = np.zeros((108, 192, 3), dtype=np.uint8)
+    key = ('full', 'default', None)
+
+    sig = gate.signature([frame])
+    assert gate.lookup(key, sig) is None
+    gate.store(key, sig, 'result')
+
+    # 轻微噪声: 复用
+    noisy = frame.copy()
+    noisy[::7, ::7] = 3
+    assert gate.lookup(key, gate.signature([noisy])) == 'result'
+    # 其他配置的结果不复用
+    assert gate.lookup(('full', 'menu', None), sig) is None
+    print("  ✓ 画面未变化时复用")
+
+    # 一块区域明显变化: 不复用
+    changed = frame.copy()
+    changed[40:80, 60:120] = 255
+    assert gate.lookup(key, gate.signature([changed])) is None
+    print("  ✓ 画面变化时重新推理")
+
+    gate.clear()
+    assert gate.lookup(key, sig) is None
+    assert gate.get_stats() == {'checks': 5, 'skips': 1, 'skip_rate': 0.2}
+
+    gate = FrameChangeGate(max_reuse_age=0)
+    gate.store(key, sig, 'result')
+    assert gate.lookup(key, sig) is None
+    print("  ✓ 清除或过期后重新推理")
+
+
+if __name__ == "__main__":
+    test_reuse_until_change_or_clear()
+    print("\n测试完成！")
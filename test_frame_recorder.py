@@ -0,0 +1,52 @@
+"""
+测试最近画面记录
+"""
+import json
+import os
+import tempfile
+
+import numpy as np
+
+from detections import Detections
+from frame_recorder import FrameRingBuffer
+
+CLASS_NAMES = {0: 'person', 1: 'portal1', 9: 'props'}
+
+
+def test_ring_buffer_wraps_and_dumps():
+    """只保留最近 capacity 帧，内存不变，按时间顺序导出"""
+    print("测试画面环形缓冲区...")
+    recorder = FrameRingBuffer(capacity=3, frame_size=(192, 108))
+    frames_before = recorder.frames
+    nbytes = recorder.nbytes
+
+    for i in range(5):
+        frame = np.full((1080, 1920, 3), i * 40, dtype=np.uint8)
+        boxes = np.array([[100 * i, 100, 100 * i + 50, 150, 0.9, 9]], dtype=np.float32)
+        recorder.add([frame], [(0, 0)], Detections.from_boxes_array(boxes, CLASS_NAMES),
+                     timestamp=1000.0 + i)
+
+    assert len(recorder) == 3
+    assert recorder.frames is frames_before and recorder.nbytes == nbytes
+    # 区域截图按屏幕位置放入缓冲区
+    recorder.add([np.full((100, 200, 3), 255, dtype=np.uint8)], [(960, 540)], Detections.empty(CLASS_NAMES),
+                 screen_shape=(1080, 1920), timestamp=1005.0)
+    slot = recorder.frames[2]
+    assert slot[54:64, 96:116].min() == 255 and slot[:54].max() == 0
+
+    out_dir = recorder.dump(tempfile.mkdtemp(), CLASS_NAMES)
+    with open(os.path.join(out_dir, 'detections.json'), encoding='utf-8') as f:
+        index = json.load(f)
+    assert [item['timestamp'] for item in index] == [1003.0, 1004.0, 1005.0]
+    assert index[0]['detections'][0]['bbox'] == [300, 100, 350, 150]
+    assert index[2]['detections'] == []
+    assert all(os.path.exists(os.path.join(out_dir, item['file'])) for item in index)
+    # 连续导出不覆盖之前的目录
+    dirs = {recorder.dump(os.path.dirname(out_dir), CLASS_NAMES) for _ in range(3)}
+    assert len(dirs | {out_dir}) == 4
+    print("  ✓ 环形缓冲区正确")
+
+
+if __name__ == "__main__":
+    test_ring_buffer_wraps_and_dumps()
+    print("\n测试完成！")
@@ -0,0 +1,93 @@
+"""
+测试录像和图片目录回放（不需要屏幕）
+"""
+import os
+import tempfile
+import threading
+
+import cv2
+import numpy as np
+
+from frame_sources import FrameSource, ImageDirFrameSource, VideoFrameSource, create_frame_source
+
+
+class BgraFrameSource(FrameSource):
+    """把 BGRA 数组转换为 BGR，测试缓冲区复用"""
+
+    name = "bgra"
+
+    def grab(self, region=None):
+        x1, y1, x2, y2 = region
+        return self._bgra_to_bgr(np.zeros((y2 - y1, x2 - x1, 4), dtype=np.uint8))
+
+
+def test_image_dir_source():
+    """按文件名顺序回放，区域为视图，循环播放"""
+    print("测试图片目录回放...")
+    with tempfile.TemporaryDirectory() as directory:
+        for i in range(3):
+            cv2.imwrite(os.path.join(directory, f"{i}.png"), np.full((60, 80, 3), i * 50, dtype=np.uint8))
+        open(os.path.join(directory, "notes.txt"), "w").close()
+
+        source = create_frame_source(directory)
+        assert isinstance(source, ImageDirFrameSource) and len(source.files) == 3
+        assert [int(source.grab()[0, 0, 0]) for _ in range(4)] == [0, 50, 100, 0]
+        assert source.grab((10, 20, 40, 30)).shape == (10, 30, 3)
+
+        once = ImageDirFrameSource(directory, loop=False)
+        for _ in range(3):
+            once.grab()
+        try:
+            once.grab()
+            assert False, "应当报错"
+        except EOFError:
+            pass
+    print("  ✓ 图片目录回放正确")
+
+
+def test_video_source():
+    """逐帧读取视频，播放完毕后循环"""
+    print("测试视频回放...")
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, "clip.avi")
+        writer = cv2.VideoWriter(path, cv2.VideoWriter_fourcc(*'MJPG'), 10, (64, 48))
+        for i in range(3):
+            writer.write(np.full((48, 64, 3), i * 100, dtype=np.uint8))
+        writer.release()
+
+        source = create_frame_source(path)
+        try:
+            assert isinstance(source, VideoFrameSource)
+            levels = [int(source.grab()[24, 32].mean()) for _ in range(4)]
+            # MJPG 有损，允许少量误差
+            assert all(abs(a - b) < 10 for a, b in zip(levels, [0, 100, 200, 0])), levels
+            assert source.grab((0, 0, 32, 16)).shape == (16, 32, 3)
+        finally:
+            source.close()
+    print("  ✓ 视频回放正确")
+
+
+def test_buffers_bounded():
+    """同尺寸复用缓冲区，尺寸数有上限，退出线程的缓冲区被释放"""
+    print("测试截图缓冲区...")
+    source = BgraFrameSource()
+    first = source.grab((0, 0, 20, 10))
+    assert source.grab((5, 5, 25, 15)) is first
+    for w in range(1, 20):
+        source.grab((0, 0, w, 10))
+    assert len(source._buffers[threading.get_ident()]) == source.max_buffers
+
+    for _ in range(3):
+        worker = threading.Thread(target=source.grab, args=((0, 0, 8, 8),))
+        worker.start()
+        worker.join()
+    # 只剩主线程和最后一个线程的缓冲区
+    assert len(source._buffers) == 2
+    print("  ✓ 缓冲区数量有上限")
+
+
+if __name__ == "__main__":
+    test_image_dir_source()
+    test_video_source()
+    test_buffers_bounded()
+    print("\n测试完成！")
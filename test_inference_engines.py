@@ -0,0 +1,184 @@
+"""
+测试推理引擎
+
+- 预处理/后处理的坐标映射
+- ONNX / OpenVINO 引擎与 .pt 模型在样例画面上的一致性
+  （需要 hjzgv1.pt、导出的模型和样例图片，缺少时跳过）
+"""
+import glob
+import os
+import sys
+import threading
+import types
+import time
+
+import cv2
+import numpy as np
+import pytest
+
+from detections import Detections
+from inference_engines import InferenceEngine, UltralyticsEngine, create_engine, decode_yolo_output, letterbox
+
+MODEL_PATH = os.environ.get("HJZG_MODEL", "hjzgv1.pt")
+SAMPLE_DIR = os.environ.get("HJZG_SAMPLES", os.path.join("hjzg", "images", "val"))
+SAMPLE_COUNT = 20
+
+
+def test_letterbox_and_decode():
+    """letterbox 后的坐标能正确映射回原图"""
+    print("测试 letterbox 与输出解析...")
+    frame = np.zeros((540, 960, 3), dtype=np.uint8)
+    img, ratio, pad = letterbox(frame, (640, 640))
+    assert img.shape == (640, 640, 3)
+    assert ratio == pytest.approx(640 / 960)
+    assert pad == (0, 140)
+
+    # 原图中的框 (96, 54, 192, 108) 在模型输入中的 cx, cy, w, h
+    x1, y1, x2, y2 = np.array([96, 54, 192, 108]) * ratio + [0, 140, 0, 140]
+    output = np.zeros((4 + 3, 2), dtype=np.float32)
+    output[:4, 0] = [(x1 + x2) / 2, (y1 + y2) / 2, x2 - x1, y2 - y1]
+    output[4 + 2, 0] = 0.9
+    output[:4, 1] = output[:4, 0] + [1, 0, 0, 0]   # 重复框，应被 NMS 去掉
+    output[4 + 2, 1] = 0.8
+
+    xyxy, scores, cls_ids = decode_yolo_output(output, 3, 0.25, ratio, pad, frame.shape[:2])
+    assert len(xyxy) == 1
+    assert xyxy[0] == pytest.approx([96, 54, 192, 108], abs=0.5)
+    assert scores[0] == pytest.approx(0.9)
+    assert cls_ids[0] == 2
+
+    # 只保留类别 0 时，最高分为类别 2 的框被丢弃
+    xyxy, _, _ = decode_yolo_output(output, 3, 0.25, ratio, pad, frame.shape[:2], classes=[0])
+    assert len(xyxy) == 0
+    print("  ✓ 坐标映射正确")
+
+
+def _iou(a, b):
+    w = max(0.0, min(a[2], b[2]) - max(a[0], b[0]))
+    h = max(0.0, min(a[3], b[3]) - max(a[1], b[1]))
+    inter = w * h
+    union = (a[2] - a[0]) * (a[3] - a[1]) + (b[2] - b[0]) * (b[3] - b[1]) - inter
+    return inter / union if union > 0 else 0.0
+
+
+def _exported_paths():
+    base = os.path.splitext(MODEL_PATH)[0]
+    return [("onnx", base + ".onnx"), ("openvino", base + "_openvino_model")]
+
+
+@pytest.mark.parametrize("engine_name,exported_path", _exported_paths())
+def test_exported_model_matches_pt(engine_name, exported_path):
+    """导出模型与 .pt 模型的检测结果一致"""
+    if not os.path.exists(MODEL_PATH):
+        pytest.skip(f"缺少模型: {MODEL_PATH}")
+    if not os.path.exists(exported_path):
+        pytest.skip(f"缺少导出模型: {exported_path}（yolo export model={MODEL_PATH} format={engine_name}）")
+    samples = sorted(glob.glob(os.path.join(SAMPLE_DIR, "*.jpg")) + glob.glob(os.path.join(SAMPLE_DIR, "*.png")))
+    if not samples:
+        pytest.skip(f"缺少样例图片: {SAMPLE_DIR}")
+    pytest.importorskip("ultralytics")
+    pytest.importorskip("onnxruntime" if engine_name == "onnx" else "openvino")
+
+    print(f"测试 {engine_name} 与 .pt 一致性...")
+    reference = create_engine(MODEL_PATH, "ultralytics")
+    candidate = create_engine(exported_path, engine_name)
+    assert candidate.names == reference.names
+
+    matched = total = 0
+    for path in samples[:SAMPLE_COUNT]:
+        frame = cv2.imread(path)
+        # 与导出尺寸一致，避免 rect 推理造成的差异
+        ref = reference.detect([frame], conf=0.25, imgsz=640)[0]
+        out = candidate.detect([frame], conf=0.25, imgsz=640)[0]
+
+        for det in ref:
+            if det['confidence'] < 0.5:
+                # 阈值附近的框可能因数值误差出现或消失
+                continue
+            total += 1
+            if any(o['name'] == det['name'] and _iou(o['bbox'], det['bbox']) > 0.9
+                   and abs(o['confidence'] - det['confidence']) < 0.05 for o in out):
+                matched += 1
+
+    print(f"  匹配 {matched}/{total}")
+    assert total == 0 or matched / total >= 0.95
+
+
+class SlowEngine(InferenceEngine):
+    """记录同时进行的推理数"""
+
+    name = "slow"
+
+    def __init__(self):
+        super().__init__()
+        self.names = {0: 'person'}
+        self.active = 0
+        self.max_active = 0
+
+    def _detect(self, frames, conf=0.25, imgsz=640, classes=None, max_det=300):
+        self.active += 1
+        self.max_active = max(self.max_active, self.active)
+        time.sleep(0.01)
+        self.active -= 1
+        return [Detections.empty(self.names) for _ in frames]
+
+
+def test_detect_is_serialized():
+    """多个线程共用一个引擎时依次推理"""
+    print("测试引擎并发调用...")
+    engine = SlowEngine()
+    frame = np.zeros((32, 32, 3), dtype=np.uint8)
+    threads = [threading.Thread(target=lambda: [engine.detect([frame]) for _ in range(3)]) for _ in range(4)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    assert engine.max_active == 1
+    print("  ✓ 没有同时进行的推理")
+
+
+def test_torch_threads_scoped():
+    """threads 只在本引擎推理期间生效，结束后恢复原值"""
+    print("测试 PyTorch 线程数作用范围...")
+    torch = types.SimpleNamespace(num_threads=8)
+    torch.get_num_threads = lambda: torch.num_threads
+    torch.set_num_threads = lambda n: setattr(torch, 'num_threads', n)
+
+    seen = []
+
+    class FakeModel:
+        names = {0: 'person'}
+
+        def predict(self, **kwargs):
+            seen.append(torch.num_threads)
+            return []
+
+    previous = sys.modules.get('torch')
+    sys.modules['torch'] = torch
+    try:
+        engine = UltralyticsEngine('fake.pt', threads=2, model=FakeModel())
+        assert torch.num_threads == 8
+        engine.detect([np.zeros((32, 32, 3), dtype=np.uint8)])
+        assert seen == [2]
+        assert torch.num_threads == 8
+
+        UltralyticsEngine('fake.pt', model=FakeModel()).detect([np.zeros((32, 32, 3), dtype=np.uint8)])
+        assert seen == [2, 8]
+    finally:
+        if previous is None:
+            del sys.modules['torch']
+        else:
+            sys.modules['torch'] = previous
+    print("  ✓ 推理结束后恢复进程线程数")
+
+
+if __name__ == "__main__":
+    test_letterbox_and_decode()
+    test_detect_is_serialized()
+    test_torch_threads_scoped()
+    for name, path in _exported_paths():
+        try:
+            test_exported_model_matches_pt(name, path)
+        except pytest.skip.Exception as e:
+            print(f"跳过 {name}: {e}")
+    print("\n测试完成！")
@@ -0,0 +1,86 @@
+"""
+测试异步输入执行器
+"""
+import threading
+import time
+from concurrent.futures import CancelledError
+
+from input_executor import InputExecutor
+
+
+class RecordingInput:
+    """记录每个动作及其执行时间"""
+
+    def __init__(self):
+        self.events = []
+        self.lock = threading.Lock()
+
+    def _record(self, *event):
+        with self.lock:
+            self.events.append(event + (time.perf_counter(),))
+
+    def move_mouse(self, x, y):
+        self._record('move', x, y)
+
+    def mouse_down(self, button='left'):
+        self._record('down', button)
+
+    def mouse_up(self, button='left'):
+        self._record('up', button)
+
+    def key_down(self, vk):
+        self._record('key_down', vk)
+
+    def key_up(self, vk):
+        self._record('key_up', vk)
+
+
+def test_actions_run_in_order_without_blocking():
+    """提交立即返回，动作按顺序和间隔执行，提交之间不穿插"""
+    print("测试异步输入执行器...")
+    game_input = RecordingInput()
+    executor = InputExecutor(game_input)
+    try:
+        start = time.perf_counter()
+        click = executor.click(100, 200, hold=0.03, settle=0.02)
+        keys = executor.press(ord('A'), hold=0.01, times=2, interval=0.02)
+        assert time.perf_counter() - start < 0.01
+        finished = keys.result(1.0)
+        assert click.done() and click.result() <= finished
+
+        events = [e[:-1] for e in game_input.events]
+        assert events == [('move', 100, 200), ('down', 'left'), ('up', 'left'),
+                          ('key_down', 65), ('key_up', 65), ('key_down', 65), ('key_up', 65)]
+        times = [e[-1] for e in game_input.events]
+        assert times[2] - times[1] >= 0.03 and times[1] - times[0] >= 0.02
+    finally:
+        executor.close()
+    print("  ✓ 动作顺序与间隔正确")
+
+
+def test_cancel_releases_held_inputs():
+    """取消时未执行的动作不再执行，按住的按钮被释放"""
+    print("测试取消输入动作...")
+    game_input = RecordingInput()
+    executor = InputExecutor(game_input)
+    future = executor.click(1, 1, hold=1.0, settle=0.0)
+    later = executor.move(5, 5)
+    time.sleep(0.05)
+    executor.cancel_all()
+    for f in (future, later):
+        try:
+            f.result(0.5)
+            assert False, "应当被取消"
+        except CancelledError:
+            pass
+    executor.close()
+    events = [e[:-1] for e in game_input.events]
+    assert events == [('move', 1, 1), ('down', 'left'), ('up', 'left')]
+    assert executor.submit([]).exception() is not None
+    print("  ✓ 取消后按钮已释放")
+
+
+if __name__ == "__main__":
+    test_actions_run_in_order_without_blocking()
+    test_cancel_releases_held_inputs()
+    print("\n测试完成！")
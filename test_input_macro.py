@@ -0,0 +1,99 @@
+"""
+测试输入宏的编译与播放
+"""
+import time
+from concurrent.futures import CancelledError
+
+from input_executor import InputExecutor
+from input_macro import BLINK, PRESS_A, compile_macro, play_macro, run_macro
+
+
+class RecordingInput:
+    """记录每个动作"""
+
+    def __init__(self):
+        self.events = []
+
+    def move_mouse(self, x, y):
+        self.events.append(('move', x, y))
+
+    def mouse_down(self, button='left'):
+        self.events.append(('down', button))
+
+    def mouse_up(self, button='left'):
+        self.events.append(('up', button))
+
+    def key_down(self, vk):
+        self.events.append(('key_down', vk))
+
+    def key_up(self, vk):
+        self.events.append(('key_up', vk))
+
+
+def test_compile():
+    """文本编译为绝对时间的事件表"""
+    print("测试宏编译...")
+    assert [round(e.at * 1000) for e in PRESS_A.events] == [0, 30, 100, 130, 200, 230, 300, 330, 400, 430]
+    assert {e.action.vk for e in PRESS_A.events} == {ord('A')}
+    assert BLINK.params == ('x', 'y') and round(BLINK.duration * 1000) == 230
+
+    macro = compile_macro("""
+        key space hold 20ms   # 跳
+        wait 0.1s; down right; wait 50; up right
+    """)
+    assert [(round(e.at * 1000), e.action.kind) for e in macro.events] == \
+        [(0, 'key_down'), (20, 'key_up'), (120, 'down'), (170, 'up')]
+    for bad in ("jump 1 2", "key a x3 every 10ms", "wait soon"):
+        try:
+            compile_macro(bad)
+            assert False, bad
+        except ValueError:
+            pass
+    try:
+        BLINK.bind(x=1)
+        assert False
+    except ValueError:
+        pass
+    print("  ✓ 编译正确")
+
+
+def test_playback():
+    """按计划时间播放并报告偏差，取消时释放按住的按键"""
+    print("测试宏播放...")
+    game_input = RecordingInput()
+    report = run_macro(game_input, BLINK, x=960, y=216)
+    assert game_input.events == [('move', 960, 216), ('down', 'right'), ('up', 'right')]
+    assert len(report.actual) == 3 and not report.cancelled
+    # 只检查宽松的上限，避免机器负载导致误报
+    assert 0 <= report.max_error_ms < 50, report.format()
+    print(f"  ✓ {report.format()}")
+
+    game_input = RecordingInput()
+    executor = InputExecutor(game_input)
+    try:
+        # 宏与普通点击共用一个队列，按提交顺序执行
+        executor.click(5, 5, hold=0.01, settle=0.0)
+        report = play_macro(executor, PRESS_A).result(2)
+        assert game_input.events[:3] == [('move', 5, 5), ('down', 'left'), ('up', 'left')]
+        assert len(game_input.events) == 13 and report.actual[-1] >= 430
+        assert 0 <= report.max_error_ms < 50, report.format()
+
+        del game_input.events[:]
+        future = play_macro(executor, compile_macro("key a hold 1s"))
+        time.sleep(0.1)
+        executor.cancel_all()
+        try:
+            future.result(1)
+            assert False, "应当被取消"
+        except CancelledError:
+            pass
+        assert game_input.events == [('key_down', 65), ('key_up', 65)]
+    finally:
+        executor.close()
+    print("  ✓ 取消后释放按键")
+
+
+if __name__ == "__main__":
+    test_compile()
+    test_playback()
+    print("\n测试完成！")
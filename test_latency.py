@@ -0,0 +1,43 @@
+"""
+测试分阶段耗时统计
+"""
+import json
+import os
+import tempfile
+
+import numpy as np
+
+from latency import LatencyRecorder
+
+
+def test_percentiles_and_window():
+    """分位数只统计最近 window 个样本，可导出为 JSON"""
+    print("测试耗时统计...")
+    latency = LatencyRecorder(window=100)
+    for ms in range(1000):
+        latency.record('inference', float(ms))
+    with latency.measure('capture'):
+        pass
+
+    stats = latency.summary()
+    inference = stats['inference']
+    assert inference['count'] == 1000
+    # 窗口内是 900..999
+    assert inference['p50'] == np.percentile(np.arange(900, 1000), 50)
+    assert inference['p99'] <= inference['max'] == 999
+    assert stats['capture']['count'] == 1
+    assert latency.format_summary(['inference']).startswith('inference 949.5/')
+
+    path = os.path.join(tempfile.mkdtemp(), 'latency.json')
+    latency.dump_json(path)
+    with open(path, encoding='utf-8') as f:
+        assert json.load(f)['stages']['inference']['max'] == 999
+
+    latency.reset()
+    assert latency.summary() == {}
+    print("  ✓ 耗时统计正确")
+
+
+if __name__ == "__main__":
+    test_percentiles_and_window()
+    print("\n测试完成！")
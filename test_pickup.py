@@ -0,0 +1,111 @@
+"""
+测试批量拾取
+"""
+from types import SimpleNamespace
+
+import game_utils
+from game_utils import PickupBlacklist, pick_up_items, plan_pickup_route
+from input_executor import InputExecutor
+
+
+class RecordingInput:
+    def __init__(self):
+        self.clicks = []
+
+    def click(self, x, y):
+        self.clicks.append((x, y))
+
+    def get_screen_size(self):
+        return 1920, 1080
+
+
+class ScriptedDetector:
+    """按顺序返回预设的物品坐标"""
+
+    def __init__(self, rounds, person=(500, 500)):
+        self.rounds = rounds
+        self.person = person
+        self.calls = 0
+
+    def get_snapshot(self, region=None, max_age=None, classes=None):
+        items = self.rounds[min(self.calls, len(self.rounds) - 1)]
+        self.calls += 1
+        return SimpleNamespace(centers_by_name=lambda name: list(items),
+                               first_center=lambda name: self.person)
+
+    def invalidate_cache(self):
+        pass
+
+
+def test_route_and_blacklist():
+    """最近邻路线，一轮点击所有物品，拾不起的物品进入黑名单"""
+    print("测试批量拾取...")
+    route = plan_pickup_route([(900, 500), (510, 500), (700, 500), (520, 900)], (500, 500))
+    assert route == [(510, 500), (700, 500), (900, 500), (520, 900)]
+
+    blacklist = PickupBlacklist(radius=10, max_attempts=2)
+    blacklist.attempt((100, 100))
+    assert not blacklist.is_blocked((105, 100))
+    blacklist.attempt((104, 98))
+    assert blacklist.is_blocked((100, 100)) and not blacklist.is_blocked((200, 100))
+
+    press_a, sleep = game_utils.press_a, game_utils.sleep
+    game_utils.press_a = lambda game_input=None, executor=None: None
+    game_utils.sleep = lambda seconds: None
+    try:
+        game_input = RecordingInput()
+        # 第一轮 3 个物品，之后一直剩一个拾不起的物品
+        detector = ScriptedDetector([[(600, 500), (800, 500), (700, 500)], [(801, 502)]])
+        stats = pick_up_items(detector, 'props', game_input=game_input, max_attempts=2)
+    finally:
+        game_utils.press_a, game_utils.sleep = press_a, sleep
+    assert game_input.clicks == [(600, 500), (700, 500), (800, 500), (801, 502)]
+    assert stats == {'rounds': 3, 'clicks': 4, 'remaining': 0, 'blacklisted': 1}
+    print("  ✓ 拾取路线与黑名单正确")
+
+
+class ActionInput:
+    """记录执行器发出的动作"""
+
+    def __init__(self):
+        self.events = []
+
+    def move_mouse(self, x, y):
+        self.events.append(('move', x, y))
+
+    def mouse_down(self, button='left'):
+        pass
+
+    def mouse_up(self, button='left'):
+        pass
+
+    def key_down(self, vk):
+        self.events.append(('key', vk))
+
+    def key_up(self, vk):
+        pass
+
+
+def test_executor_route():
+    """整条路线排入执行器，按键在所有点击之后，脚本线程不 sleep"""
+    print("测试执行器拾取...")
+    sleep = game_utils.sleep
+    game_utils.sleep = lambda seconds: None
+    game_input = ActionInput()
+    executor = InputExecutor(game_input)
+    try:
+        detector = ScriptedDetector([[(600, 500), (700, 500)], []])
+        stats = pick_up_items(detector, 'props', executor=executor, walk_speed=0, click_interval=0.01)
+        assert executor.pending == 0
+    finally:
+        executor.close()
+        game_utils.sleep = sleep
+    assert stats['clicks'] == 2 and stats['rounds'] == 2
+    assert game_input.events[5:] == [('move', 600, 500), ('move', 700, 500)] + [('key', 65)] * 5
+    print("  ✓ 点击与按键按顺序执行")
+
+
+if __name__ == "__main__":
+    test_route_and_blacklist()
+    test_executor_route()
+    print("\n测试完成！")
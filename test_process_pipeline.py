@@ -0,0 +1,71 @@
+"""
+测试多进程检测的共享内存布局
+"""
+from types import SimpleNamespace
+
+import numpy as np
+
+from detections import Detections
+from process_pipeline import _CAPTURE_FAILED, ProcessPipeline, SharedBuffers
+
+CLASS_NAMES = {0: 'person', 3: 'button1', 9: 'props'}
+
+
+def test_frame_ring_and_results():
+    """截图不覆盖正在推理的槽位，结果按序号发布"""
+    print("测试共享内存帧环...")
+    owner = SharedBuffers((90, 160, 3), slots=3, max_det=4)
+    reader = SharedBuffers((90, 160, 3), slots=3, max_det=4, names=owner.names)
+    try:
+        assert reader.acquire_latest() is None and owner.read_result(CLASS_NAMES) is None
+
+        owner.write_frame(np.full((90, 160, 3), 1, dtype=np.uint8), 10.0)
+        slot, seq, ts = reader.acquire_latest()
+        assert (seq, ts) == (1, 10.0) and reader.frames[slot].max() == 1
+        # 推理期间连续写入多帧，不会写到正在读取的槽位
+        for i in range(2, 8):
+            owner.write_frame(np.full((90, 160, 3), i, dtype=np.uint8), 10.0 + i)
+        assert reader.frames[slot].max() == 1
+        assert reader.release(slot, seq)
+
+        boxes = np.array([[0, 0, 10, 10, 0.9, 9]] * 6, dtype=np.float32)
+        reader.write_result(Detections.from_boxes_array(boxes, CLASS_NAMES), seq, ts)
+        result_seq, timestamp, detections = owner.read_result(CLASS_NAMES)
+        assert (result_seq, timestamp) == (1, 10.0)
+        assert len(detections) == 4 and detections.first_center('props') == (5, 5)
+
+        slot, seq, _ = reader.acquire_latest()
+        assert seq == 7 and reader.frames[slot].max() == 7
+        print("  ✓ 帧环与结果区正确")
+    finally:
+        reader.close()
+        owner.close()
+
+
+def test_resized_frames_and_failure():
+    """分辨率变化后裁剪/填黑而不是让截图进程出错；子进程退出时报告原因"""
+    print("测试分辨率变化与进程退出...")
+    owner = SharedBuffers((90, 160, 3), slots=3, max_det=4)
+    try:
+        owner.write_frame(np.full((120, 200, 3), 5, dtype=np.uint8), 1.0)
+        assert owner.frames[0].min() == 5
+        owner.write_frame(np.full((60, 100, 3), 7, dtype=np.uint8), 2.0)
+        frame = owner.frames[1]
+        assert frame[:60, :100].min() == 7 and frame[60:].max() == 0 and frame[:, 100:].max() == 0
+
+        pipeline = ProcessPipeline('model.pt', CLASS_NAMES)
+        assert pipeline.failure() is None
+        pipeline.buffers = owner
+        pipeline._processes = [SimpleNamespace(name='DetectorCapture', exitcode=0, is_alive=lambda: False)]
+        owner.control[_CAPTURE_FAILED] = 1
+        assert pipeline.failure() == "截图进程连续出错已退出"
+        pipeline.buffers = None
+        print("  ✓ 尺寸变化与进程退出处理正确")
+    finally:
+        owner.close()
+
+
+if __name__ == "__main__":
+    test_frame_ring_and_results()
+    test_resized_frames_and_failure()
+    print("\n测试完成！")
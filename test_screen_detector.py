@@ -0,0 +1,126 @@
+"""
+测试检测器的快照缓存与类别筛选（用固定画面和假推理引擎，不需要模型）
+"""
+import numpy as np
+
+from detections import Detections
+from frame_sources import FrameSource
+from inference_engines import InferenceEngine
+from screen_detector import ScreenDetector
+
+CLASS_NAMES = {0: 'person', 1: 'portal1', 2: 'portal2', 3: 'button1', 9: 'props'}
+
+
+class StaticFrameSource(FrameSource):
+    """始终返回同一幅画面"""
+
+    name = "static"
+
+    def __init__(self, frame):
+        super().__init__()
+        self.frame = frame
+
+    def grab(self, region=None):
+        if region is None:
+            return self.frame
+        x1, y1, x2, y2 = region
+        return self.frame[y1:y2, x1:x2]
+
+
+class FakeEngine(InferenceEngine):
+    """每个类别在固定位置返回一个框，记录每次推理的类别筛选"""
+
+    name = "fake"
+
+    def __init__(self):
+        super().__init__()
+        self.names = CLASS_NAMES
+        self.calls = []
+        self.score = 0.9
+
+    def _detect(self, frames, conf=0.25, imgsz=640, classes=None, max_det=300):
+        self.calls.append(None if classes is None else sorted(classes))
+        ids = sorted(CLASS_NAMES) if classes is None else classes
+        boxes = np.array([[10 * i, 10, 10 * i + 10, 20, self.score, i] for i in ids], dtype=np.float32).reshape(-1, 6)
+        return [Detections.from_boxes_array(boxes, self.names) for _ in frames]
+
+
+def make_detector(**kwargs):
+    frame = np.zeros((200, 300, 3), dtype=np.uint8)
+    return ScreenDetector(engine=FakeEngine(), frame_source=StaticFrameSource(frame),
+                          cache_max_age=10, **kwargs)
+
+
+def test_alternating_class_queries():
+    """交替查询不同类别时复用同一帧"""
+    print("测试交替查询类别...")
+    detector = make_detector(filter_classes=True)
+    engine = detector.engine
+    for _ in range(3):
+        for name in ('portal1', 'portal2', 'person'):
+            assert detector.get_center_by_name(name) is not None
+    # 每个新类别最多触发一次推理，之后全部命中缓存
+    assert len(engine.calls) == 3 and engine.calls[-1] == [0, 1, 2]
+    assert detector.cache_hits == 6
+    print("  ✓ 推理 3 次，命中缓存 6 次")
+
+    # 默认推理全部类别，一次推理回答所有查询
+    detector = make_detector()
+    for name in ('portal1', 'portal2', 'person', 'props'):
+        assert detector.get_center_by_name(name) is not None
+    assert detector.engine.calls == [None]
+    print("  ✓ 默认只推理 1 次")
+
+
+def test_profiles_with_class_queries():
+    """自动选择配置不受类别筛选影响，配置不包含查询的类别时视为没找到"""
+    print("测试推理配置与类别筛选...")
+    detector = make_detector(filter_classes=True, profile='auto')
+    detector.get_center_by_name('portal1')
+    assert detector.engine.calls == [None]
+
+    detector = make_detector(filter_classes=True, profile='menu')
+    assert detector.get_center_by_name('portal2') is None
+    assert detector.engine.calls == []
+    print("  ✓ 配置筛选正确")
+
+
+def test_invalidate_clears_gate():
+    """设置变化后画面没变也重新推理"""
+    print("测试失效后重新推理...")
+    detector = make_detector(change_threshold=8.0)
+    detector.get_snapshot(max_age=0)
+    detector.get_snapshot(max_age=0)
+    assert len(detector.engine.calls) == 1
+    detector.set_class_conf('props', 0.95)
+    detector.get_snapshot(max_age=0)
+    assert len(detector.engine.calls) == 2
+    print("  ✓ 修改阈值后重新推理")
+
+    # 默认不启用画面变化检测和模板匹配
+    detector = make_detector()
+    detector.get_snapshot(max_age=0)
+    detector.get_snapshot(max_age=0)
+    assert detector.change_gate is None and len(detector.engine.calls) == 2
+    assert detector.template_matcher is None
+
+
+def test_tracker_follows_detector_conf():
+    """跟踪器阈值随检测阈值变化，刚过检测阈值的目标也能生成轨迹"""
+    print("测试跟踪阈值...")
+    detector = make_detector(conf=0.3, class_conf={'props': 0.2})
+    detector.engine.score = 0.35
+    for _ in range(2):
+        detector.get_tracks('portal1', max_age=0)
+        detector.invalidate_cache()
+    assert [track.name for track in detector.get_tracks('portal1', max_age=0)] == ['portal1']
+    assert [round(c, 3) for c in detector._tracker_conf()] == [0.3, 0.2, 0.2]
+    print("  ✓ 置信度 0.35 的目标已跟踪")
+
+
+if __name__ == "__main__":
+    test_alternating_class_queries()
+    test_profiles_with_class_queries()
+    test_invalidate_clears_gate()
+    test_tracker_follows_detector_conf()
+    print("\n测试完成！")
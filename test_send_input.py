@@ -0,0 +1,59 @@
+"""
+测试 SendInput 批量输入（用记录调用的 user32 替身，不需要 Windows）
+"""
+from game_input_advanced import INPUT_KEYBOARD, INPUT_MOUSE, BatchedWindowsInput, WindowsInput
+
+
+class FakeUser32:
+    """记录 GetSystemMetrics 和 SendInput 调用"""
+
+    def __init__(self, size=(1920, 1080)):
+        self.size = size
+        self.metrics_calls = 0
+        self.batches = []
+
+    def GetSystemMetrics(self, index):
+        self.metrics_calls += 1
+        return self.size[index]
+
+    def SendInput(self, count, inputs, size):
+        batch = []
+        for item in inputs[:count]:
+            if item.type == INPUT_MOUSE:
+                batch.append(('mouse', item.u.mi.dwFlags, item.u.mi.dx, item.u.mi.dy))
+            else:
+                batch.append(('key', item.u.ki.wVk, item.u.ki.dwFlags))
+        self.batches.append(batch)
+        return count
+
+
+def test_batched_click_and_keys():
+    """移动、按下、释放一次发出，每次移动按当前屏幕尺寸换算"""
+    print("测试 SendInput 批量输入...")
+    user32 = FakeUser32()
+    win_input = BatchedWindowsInput(user32)
+
+    for _ in range(10):
+        win_input.click(960, 540, button='right', delay=0)
+    assert user32.metrics_calls == 20 and len(user32.batches) == 10
+    move = WindowsInput.MOUSEEVENTF_MOVE | WindowsInput.MOUSEEVENTF_ABSOLUTE
+    assert user32.batches[0] == [('mouse', move, 32767, 32767),
+                                 ('mouse', WindowsInput.MOUSEEVENTF_RIGHTDOWN, 0, 0),
+                                 ('mouse', WindowsInput.MOUSEEVENTF_RIGHTUP, 0, 0)]
+
+    user32.batches.clear()
+    win_input.press_keys([ord('A'), 0x20])
+    assert user32.batches == [[('key', 0x41, 0), ('key', 0x41, 2), ('key', 0x20, 0), ('key', 0x20, 2)]]
+    print("  ✓ 每次点击 1 次 SendInput")
+
+    # 切换分辨率后的第一次移动就使用新尺寸
+    user32.size = (2560, 1440)
+    win_input.move_mouse(1280, 720)
+    assert win_input.get_screen_size() == (2560, 1440)
+    assert user32.batches[-1] == [('mouse', move, 32767, 32767)]
+    print("  ✓ 分辨率变化立即生效")
+
+
+if __name__ == "__main__":
+    test_batched_click_and_keys()
+    print("\n测试完成！")
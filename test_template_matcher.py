@@ -0,0 +1,56 @@
+"""
+测试静态界面元素的模板匹配
+"""
+import numpy as np
+
+from detections import Detections
+from template_matcher import TemplateMatcher
+
+CLASS_NAMES = {0: 'person', 3: 'button1'}
+
+
+def make_screen(x, y):
+    """灰色背景上在 (x, y) 画一个带花纹的按钮"""
+    rng = np.random.default_rng(0)
+    screen = np.full((300, 400, 3), 60, dtype=np.uint8)
+    screen[y:y + 30, x:x + 60] = rng.integers(0, 255, (30, 60, 3), dtype=np.uint8)
+    return screen
+
+
+def test_harvest_and_match():
+    """从检测结果截取模板，在上次位置附近匹配，匹配失败后标记刷新"""
+    print("测试模板匹配...")
+    matcher = TemplateMatcher(('button1',), search_margin=40)
+    screen = make_screen(100, 120)
+    boxes = np.array([[100, 120, 160, 150, 0.95, 3]], dtype=np.float32)
+    matcher.harvest(screen, Detections.from_boxes_array(boxes, CLASS_NAMES))
+    assert matcher.has_template('button1')
+
+    # 按钮移动了 10 像素，仍在搜索范围内
+    moved = make_screen(110, 125)
+    x1, y1, x2, y2 = matcher.search_window('button1')
+    assert matcher.match('button1', moved[y1:y2, x1:x2], (x1, y1)) == (140, 140)
+    print("  ✓ 命中")
+
+    # 按钮消失: 匹配失败，下一次推理重新截取模板
+    empty = np.full((300, 400, 3), 60, dtype=np.uint8)
+    x1, y1, x2, y2 = matcher.search_window('button1')
+    assert matcher.match('button1', empty[y1:y2, x1:x2], (x1, y1)) is None
+    assert 'button1' in matcher._stale
+    stats = matcher.get_stats()['button1']
+    assert (stats['hits'], stats['misses']) == (1, 1)
+    print("  ✓ 未命中时回退")
+
+    # 置信度低或同类多个实例时不截取
+    matcher = TemplateMatcher(('button1',))
+    low = np.array([[100, 120, 160, 150, 0.5, 3]], dtype=np.float32)
+    matcher.harvest(screen, Detections.from_boxes_array(low, CLASS_NAMES))
+    two = np.array([[100, 120, 160, 150, 0.95, 3], [200, 120, 260, 150, 0.95, 3]], dtype=np.float32)
+    matcher.harvest(screen, Detections.from_boxes_array(two, CLASS_NAMES))
+    assert not matcher.has_template('button1')
+    print("  ✓ 只从可靠的检测结果截取模板")
+
+
+if __name__ == "__main__":
+    test_harvest_and_match()
+    print("\n测试完成！")
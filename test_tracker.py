@@ -0,0 +1,59 @@
+"""
+测试多目标跟踪
+"""
+import numpy as np
+
+from detections import Detections
+from tracker import ObjectTracker
+
+CLASS_NAMES = {0: 'person', 9: 'props'}
+
+
+def frame(*boxes):
+    return Detections.from_boxes_array(np.array(boxes, dtype=np.float32).reshape(-1, 6), CLASS_NAMES)
+
+
+def test_stable_ids_and_velocity():
+    """匀速运动的目标保持编号，速度和外推位置正确"""
+    print("测试轨迹编号与速度...")
+    tracker = ObjectTracker()
+    for i in range(10):
+        t = i * 0.1
+        x = 100 + 200 * t      # 向右 200 像素/秒
+        tracker.update(frame([x, 100, x + 40, 140, 0.9, 9],
+                             [500, 500, 540, 540, 0.9, 9]), t)
+
+    tracks = sorted(tracker.tracks('props', timestamp=0.9), key=lambda tr: tr.track_id)
+    assert [tr.track_id for tr in tracks] == [1, 2]
+    moving, still = tracks
+    assert abs(moving.velocity[0] - 200) < 20 and abs(moving.velocity[1]) < 5
+    assert abs(still.velocity[0]) < 5
+
+    # 跳过推理，外推 0.1 秒
+    predicted = tracker.get_track(moving.track_id, timestamp=1.0)
+    assert abs(predicted.center[0] - (100 + 200 * 1.0 + 20)) <= 3
+    print("  ✓ 编号稳定，速度与外推正确")
+
+
+def test_low_confidence_keeps_track():
+    """置信度下降的目标仍匹配原轨迹，消失的目标超时后删除"""
+    print("测试低置信度匹配与轨迹删除...")
+    tracker = ObjectTracker(max_lost=0.3)
+    tracker.update(frame([0, 0, 20, 20, 0.9, 9]), 0.0)
+    tracker.update(frame([2, 0, 22, 20, 0.9, 9]), 0.1)
+    tracker.update(frame([4, 0, 24, 20, 0.2, 9]), 0.2)
+    tracks = tracker.tracks(timestamp=0.2)
+    assert len(tracks) == 1 and tracks[0].track_id == 1 and tracks[0].hits == 3
+
+    # 不同类别不匹配；原目标消失超时后删除
+    tracker.update(frame([4, 0, 24, 20, 0.9, 0]), 0.3)
+    tracker.update(frame([4, 0, 24, 20, 0.9, 0]), 0.6)
+    names = {tr.name for tr in tracker.tracks(timestamp=0.6)}
+    assert names == {'person'}
+    print("  ✓ 低置信度匹配正确，丢失轨迹已删除")
+
+
+if __name__ == "__main__":
+    test_stable_ids_and_velocity()
+    test_low_confidence_keeps_track()
+    print("\n测试完成！")
@@ -0,0 +1,154 @@
+"""
+测试等待原语
+"""
+import time
+from types import SimpleNamespace
+
+import numpy as np
+
+from game_utils import click_and_confirm, wait_for, wait_for_any, wait_until_gone, wait_for_stable
+
+
+class ScriptedDetector:
+    """按顺序返回预设的检测结果，每次 get_snapshot 算一帧"""
+
+    def __init__(self, frames):
+        self.frames = frames    # [{名称: 坐标}, ...]，用完后重复最后一帧
+        self.calls = 0
+        self.captures = 0
+
+    def get_snapshot(self, region=None, max_age=None, classes=None):
+        centers = self.frames[min(self.calls, len(self.frames) - 1)]
+        self.calls += 1
+        return SimpleNamespace(frame_id=self.calls, first_center=centers.get)
+
+    def capture_screen(self, region=None):
+        # 第 3 次截图开始画面变亮
+        self.captures += 1
+        return np.full((100, 100, 3), 200 if self.captures >= 3 else 0, dtype=np.uint8)
+
+    def invalidate_cache(self):
+        pass
+
+
+class RepeatingDetector(ScriptedDetector):
+    """画面没变时复用快照: 每一帧连续返回 3 次（frame_id 相同）"""
+
+    def get_snapshot(self, region=None, max_age=None, classes=None):
+        frame = min(self.calls // 3, len(self.frames) - 1)
+        self.calls += 1
+        return SimpleNamespace(frame_id=frame, first_center=self.frames[frame].get)
+
+
+class RecordingInput:
+    def __init__(self):
+        self.actions = []
+
+    def move_mouse(self, x, y):
+        self.actions.append(('move', x, y))
+
+    def click(self, button='left'):
+        self.actions.append(('click', button))
+
+    def double_click(self):
+        self.actions.append(('double',))
+
+
+def test_wait_primitives():
+    """出现、任意出现、消失、稳定、超时、停止"""
+    print("测试等待原语...")
+    fast = dict(min_interval=0.001, max_interval=0.002)
+
+    result = wait_for(ScriptedDetector([{}, {}, {'button1': (10, 20)}]), 'button1', **fast)
+    assert result and result.pos == (10, 20) and result.polls == 3
+
+    result = wait_for_any(ScriptedDetector([{}, {'portal2': (1, 1), 'portal1': (2, 2)}]),
+                          ['portal1', 'portal2'], **fast)
+    assert result.name == 'portal1'
+
+    # 单帧漏检不算消失
+    frames = [{'button1': (5, 5)}, {}, {'button1': (6, 6)}, {}, {}]
+    result = wait_until_gone(ScriptedDetector(frames), 'button1', confirm=2, **fast)
+    assert result.status == 'gone' and result.pos == (6, 6) and result.polls == 5
+    # 重复返回的同一帧只算一次漏检
+    frames = [{'button1': (5, 5)}, {}, {'button1': (6, 6)}]
+    result = wait_until_gone(RepeatingDetector(frames), 'button1', confirm=2, timeout=0.05, **fast)
+    assert result.status == 'timeout'
+
+    frames = [{'boss': (0, 0)}, {'boss': (50, 0)}, {'boss': (52, 1)}, {'boss': (51, 2)}]
+    result = wait_for_stable(ScriptedDetector(frames), 'boss', tolerance=5, frames=3, **fast)
+    assert result.status == 'stable' and result.polls == 4
+
+    result = wait_for(ScriptedDetector([{}]), 'button1', timeout=0.05, **fast)
+    assert not result and result.status == 'timeout' and result.elapsed >= 0.05
+
+    app = SimpleNamespace(is_running=False, is_paused=False)
+    assert wait_for(ScriptedDetector([{}]), 'button1', timeout=None, app=app).status == 'stopped'
+    print("  ✓ 等待原语正确")
+
+
+def test_click_and_confirm():
+    """观察到出现、消失或区域变化立即返回，超时后重试并点击目标的新位置"""
+    print("测试点击确认...")
+    fast = dict(min_interval=0.001, max_interval=0.002, move_delay=0)
+
+    game_input = RecordingInput()
+    detector = ScriptedDetector([{}, {}, {'startButton': (9, 9)}])
+    result = click_and_confirm(detector, (1, 2), appear='startButton', game_input=game_input, **fast)
+    assert result.status == 'appeared' and result.pos == (9, 9) and result.attempts == 1
+    assert game_input.actions == [('move', 1, 2), ('click', 'left')]
+
+    # 第一次点击后按钮移动了位置，重试时点击新位置
+    game_input = RecordingInput()
+    frames = [{'button1': (50, 50)}] * 3 + [{}]
+    result = click_and_confirm(ScriptedDetector(frames), (40, 40), disappear='button1', click_type='double',
+                               game_input=game_input, timeout=0.001, retries=5, **fast)
+    assert result.status == 'disappeared' and result.attempts > 1
+    assert game_input.actions[:2] == [('move', 40, 40), ('double',)] and game_input.actions[2] == ('move', 50, 50)
+
+    # 重复返回的漏检帧不算消失
+    result = click_and_confirm(RepeatingDetector([{'button1': (5, 5)}, {}, {'button1': (6, 6)}]), (40, 40), disappear='button1',
+                               game_input=RecordingInput(), timeout=0.05, retries=0, **fast)
+    assert result.status == 'timeout'
+
+    result = click_and_confirm(ScriptedDetector([{}]), (1, 2), region=(0, 0, 100, 100),
+                               game_input=RecordingInput(), **fast)
+    assert result.status == 'changed' and result.reaction_time >= 0
+
+    result = click_and_confirm(ScriptedDetector([{}]), (1, 2), appear='boss', game_input=RecordingInput(),
+                               timeout=0.01, retries=1, **fast)
+    assert not result and result.attempts == 2
+
+    # 点击后暂停 0.2 秒，暂停时间不计入 0.05 秒的超时
+    class PausedApp:
+        is_running = True
+        resume_at = time.monotonic() + 0.2
+
+        @property
+        def is_paused(self):
+            return time.monotonic() < self.resume_at
+
+    app = PausedApp()
+    result = click_and_confirm(ScriptedDetector([{}, {}, {'startButton': (9, 9)}]), (1, 2), appear='startButton',
+                               game_input=RecordingInput(), app=app, timeout=0.05, retries=0, **fast)
+    assert result.status == 'appeared' and result.reaction_time < 0.1
+    print("  ✓ 点击确认正确")
+
+
+def test_template_fast_path():
+    """有模板的界面按钮直接模板匹配，不检测整帧"""
+    print("测试模板匹配优先...")
+    detector = ScriptedDetector([{}])
+    detector.match_template = {'button1': (30, 40)}.get
+    result = wait_for(detector, 'button1', timeout=0.1)
+    assert result.pos == (30, 40) and detector.calls == 0
+    # 没有模板的类别回退到检测
+    assert not wait_for(detector, 'portal1', timeout=0.05) and detector.calls > 0
+    print("  ✓ 模板匹配优先，失败时回退")
+
+
+if __name__ == "__main__":
+    test_wait_primitives()
+    test_click_and_confirm()
+    test_template_fast_path()
+    print("\n测试完成！")
@@ -0,0 +1,47 @@
+"""
+切片推理
+
+高分辨率屏幕（2560x1440、4K）整屏缩小到模型输入尺寸后，props 等小目标只剩几个像素。
+切片推理把画面切成相互重叠的小块，以接近原始分辨率送入模型:
+- 整屏图像和所有切片合并为一次批量推理
+- 指定类别只采用切片中的结果，其余类别仍采用整屏结果
+- 切片边缘被截断的框通过跨切片 NMS（按较小框面积计算重叠）去重
+"""
+
+from typing import List, NamedTuple, Tuple
+
+Region = Tuple[int, int, int, int]
+
+
+class TileConfig(NamedTuple):
+    """一组类别的切片设置"""
+    classes: Tuple[str, ...]    # 使用切片结果的类别
+    tile_size: int = 640        # 切片边长（像素），与推理尺寸相同时切片不缩放
+    overlap: float = 0.2        # 相邻切片的重叠比例，应大于目标尺寸 / tile_size
+
+
+def tile_grid(width: int, height: int, tile_size: int, overlap: float) -> List[Region]:
+    """
+    覆盖整个画面的切片区域
+
+    参数:
+        width, height: 画面尺寸
+        tile_size: 切片边长
+        overlap: 重叠比例 [0, 1)
+
+    返回:
+        [(x1, y1, x2, y2), ...]，画面小于切片时返回整个画面
+    """
+    stride = max(1, int(tile_size * (1 - overlap)))
+
+    def starts(length):
+        if length <= tile_size:
+            return [0]
+        positions = list(range(0, length - tile_size, stride))
+        # 最后一块贴齐边缘
+        positions.append(length - tile_size)
+        return positions
+
+    return [(x, y, min(x + tile_size, width), min(y + tile_size, height))
+            for y in starts(height) for x in starts(width)]
+
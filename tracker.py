@@ -0,0 +1,261 @@
+"""
+多目标跟踪
+
+在逐帧独立的检测结果之上维护持续的目标编号（类似 ByteTrack）:
+1. 每个轨迹用匀速卡尔曼滤波估计中心点和速度
+2. 高置信度检测先按 IoU 与预测位置匹配，剩余轨迹再与低置信度检测匹配
+   （被遮挡或模糊时置信度下降的目标不会丢失编号）
+3. 未匹配的高置信度检测生成新轨迹，长时间未匹配的轨迹被删除
+
+两次推理之间可以用 predict() 把轨迹外推到当前时刻，因此可以隔帧推理。
+
+用法:
+    tracker = ObjectTracker()
+    tracker.update(detections, timestamp)
+    for track in tracker.tracks('props'):
+        print(track.track_id, track.center, track.velocity)
+"""
+
+import itertools
+import time
+from typing import Dict, List, NamedTuple, Optional, Tuple
+
+import numpy as np
+
+from detections import Detections
+
+
+class TrackState(NamedTuple):
+    """某一时刻的轨迹状态"""
+    track_id: int
+    name: str
+    center: Tuple[int, int]                 # 中心点（已外推到查询时刻）
+    bbox: Tuple[int, int, int, int]         # 边界框（已外推到查询时刻）
+    velocity: Tuple[float, float]           # 速度（像素/秒）
+    confidence: float                       # 最近一次匹配的置信度
+    age: float                              # 轨迹存在时间（秒）
+    time_since_update: float                # 距最近一次匹配的时间（秒）
+    hits: int                               # 匹配次数
+
+
+class Track:
+    """单个目标的轨迹（匀速卡尔曼滤波，状态为 cx, cy, vx, vy）"""
+
+    def __init__(self, track_id: int, cls_id: int, name: str, box: np.ndarray,
+                 conf: float, timestamp: float, process_noise: float, measurement_noise: float):
+        self.track_id = track_id
+        self.cls_id = cls_id
+        self.name = name
+        self.conf = conf
+        self.size = np.array([box[2] - box[0], box[3] - box[1]], dtype=np.float64)
+        self.state = np.array([(box[0] + box[2]) / 2, (box[1] + box[3]) / 2, 0.0, 0.0])
+        # 初始速度未知，方差较大
+        self.cov = np.diag([measurement_noise, measurement_noise, 1e4, 1e4])
+        self.process_noise = process_noise
+        self.measurement_noise = measurement_noise
+        self.first_seen = timestamp
+        self.last_update = timestamp
+        self.hits = 1
+
+    def _transition(self, dt: float) -> np.ndarray:
+        f = np.eye(4)
+        f[0, 2] = f[1, 3] = dt
+        return f
+
+    def predict(self, timestamp: float) -> np.ndarray:
+        """外推到 timestamp 时刻的边界框（不修改状态）"""
+        dt = max(0.0, timestamp - self.last_update)
+        cx, cy = self.state[:2] + self.state[2:] * dt
+        w, h = self.size
+        return np.array([cx - w / 2, cy - h / 2, cx + w / 2, cy + h / 2])
+
+    def update(self, box: np.ndarray, conf: float, timestamp: float):
+        """用新的检测结果更新轨迹"""
+        dt = max(0.0, timestamp - self.last_update)
+        f = self._transition(dt)
+        # 预测
+        state = f @ self.state
+        q = self.process_noise * np.diag([dt ** 3 / 3, dt ** 3 / 3, dt, dt])
+        cov = f @ self.cov @ f.T + q
+        # 更新（只观测中心点）
+        z = np.array([(box[0] + box[2]) / 2, (box[1] + box[3]) / 2])
+        s = cov[:2, :2] + np.eye(2) * self.measurement_noise
+        k = cov[:, :2] @ np.linalg.inv(s)
+        self.state = state + k @ (z - state[:2])
+        self.cov = (np.eye(4) - k @ np.eye(2, 4)) @ cov
+
+        # 尺寸做指数平滑
+        self.size = 0.7 * self.size + 0.3 * np.array([box[2] - box[0], box[3] - box[1]])
+        self.conf = conf
+        self.last_update = timestamp
+        self.hits += 1
+
+    def snapshot(self, timestamp: float) -> TrackState:
+        """生成 timestamp 时刻的 TrackState"""
+        x1, y1, x2, y2 = self.predict(timestamp)
+        return TrackState(
+            track_id=self.track_id,
+            name=self.name,
+            center=(int((x1 + x2) / 2), int((y1 + y2) / 2)),
+            bbox=(int(x1), int(y1), int(x2), int(y2)),
+            velocity=(float(self.state[2]), float(self.state[3])),
+            confidence=self.conf,
+            age=timestamp - self.first_seen,
+            time_since_update=max(0.0, timestamp - self.last_update),
+            hits=self.hits
+        )
+
+
+def iou_matrix(a: np.ndarray, b: np.ndarray) -> np.ndarray:
+    """两组 xyxy 边界框两两之间的 IoU，形状 (len(a), len(b))"""
+    if not len(a) or not len(b):
+        return np.zeros((len(a), len(b)))
+    a = a[:, None, :]
+    b = b[None, :, :]
+    w = (np.minimum(a[..., 2], b[..., 2]) - np.maximum(a[..., 0], b[..., 0])).clip(0)
+    h = (np.minimum(a[..., 3], b[..., 3]) - np.maximum(a[..., 1], b[..., 1])).clip(0)
+    inter = w * h
+    area_a = (a[..., 2] - a[..., 0]) * (a[..., 3] - a[..., 1])
+    area_b = (b[..., 2] - b[..., 0]) * (b[..., 3] - b[..., 1])
+    return inter / np.maximum(area_a + area_b - inter, 1e-6)
+
+
+def _greedy_match(iou: np.ndarray, threshold: float) -> List[Tuple[int, int]]:
+    """按 IoU 从大到小贪心匹配，返回 [(行, 列), ...]"""
+    pairs = []
+    if not iou.size:
+        return pairs
+    rows, cols = np.nonzero(iou >= threshold)
+    order = np.argsort(-iou[rows, cols], kind='stable')
+    used_rows, used_cols = set(), set()
+    for r, c in zip(rows[order], cols[order]):
+        if r in used_rows or c in used_cols:
+            continue
+        used_rows.add(r)
+        used_cols.add(c)
+        pairs.append((int(r), int(c)))
+    return pairs
+
+
+class ObjectTracker:
+    """多目标跟踪器"""
+
+    def __init__(self, high_conf: float = 0.5, low_conf: float = 0.1, new_track_conf: Optional[float] = None,
+                 match_iou: float = 0.2, max_lost: float = 0.5, min_hits: int = 2,
+                 process_noise: float = 500.0, measurement_noise: float = 4.0):
+        """
+        参数:
+            high_conf: 第一轮匹配使用的检测置信度下限
+            low_conf: 第二轮匹配使用的检测置信度下限（低于该值的检测直接丢弃）
+                      检测器按自身阈值过滤后才交给跟踪器，阈值应与检测器一致（见 ScreenDetector.get_tracks）
+            new_track_conf: 未匹配的检测生成新轨迹所需的置信度，None表示与 high_conf 相同
+            match_iou: 检测与预测位置匹配的最小 IoU
+            max_lost: 轨迹连续未匹配多久（秒）后删除
+            min_hits: 匹配次数达到该值后轨迹才被 tracks() 返回
+            process_noise: 过程噪声（加速度方差，像素²/秒³）
+            measurement_noise: 检测中心点的测量方差（像素²）
+        """
+        self.high_conf = high_conf
+        self.low_conf = low_conf
+        self.new_track_conf = high_conf if new_track_conf is None else new_track_conf
+        self.match_iou = match_iou
+        self.max_lost = max_lost
+        self.min_hits = min_hits
+        self.process_noise = process_noise
+        self.measurement_noise = measurement_noise
+        self._tracks: List[Track] = []
+        self._ids = itertools.count(1)
+        self.last_update: Optional[float] = None
+
+    def update(self, detections: Detections, timestamp: Optional[float] = None) -> List[TrackState]:
+        """
+        用一帧检测结果更新所有轨迹
+
+        参数:
+            detections: 该帧的 Detections
+            timestamp: 截图时间（time.monotonic()），None表示当前时间
+
+        返回:
+            本帧更新后的已确认轨迹
+        """
+        if timestamp is None:
+            timestamp = time.monotonic()
+
+        xyxy = detections.xyxy.astype(np.float64)
+        conf = detections.confidence
+        cls_ids = detections.class_id
+        high = np.nonzero(conf >= self.high_conf)[0]
+        low = np.nonzero((conf >= self.low_conf) & (conf < self.high_conf))[0]
+
+        unmatched_tracks = list(range(len(self._tracks)))
+        predicted = np.array([t.predict(timestamp) for t in self._tracks]).reshape(-1, 4)
+        track_cls = np.array([t.cls_id for t in self._tracks], dtype=np.int64)
+
+        matched_dets = set()
+        for det_idx in (high, low):
+            if not unmatched_tracks or not len(det_idx):
+                continue
+            iou = iou_matrix(predicted[unmatched_tracks], xyxy[det_idx])
+            # 只在同类之间匹配
+            iou[track_cls[unmatched_tracks][:, None] != cls_ids[det_idx][None, :]] = 0.0
+            pairs = _greedy_match(iou, self.match_iou)
+            for r, c in pairs:
+                track = self._tracks[unmatched_tracks[r]]
+                d = det_idx[c]
+                track.update(xyxy[d], float(conf[d]), timestamp)
+                matched_dets.add(d)
+            matched_rows = {r for r, _ in pairs}
+            unmatched_tracks = [t for i, t in enumerate(unmatched_tracks) if i not in matched_rows]
+
+        # 删除丢失太久的轨迹
+        lost = {i for i in unmatched_tracks if timestamp - self._tracks[i].last_update > self.max_lost}
+        self._tracks = [t for i, t in enumerate(self._tracks) if i not in lost]
+
+        # 未匹配的高置信度检测生成新轨迹
+        for d in high:
+            if d in matched_dets or conf[d] < self.new_track_conf:
+                continue
+            cls_id = int(cls_ids[d])
+            self._tracks.append(Track(next(self._ids), cls_id, detections.class_names.get(cls_id, str(cls_id)),
+                                      xyxy[d], float(conf[d]), timestamp,
+                                      self.process_noise, self.measurement_noise))
+
+        self.last_update = timestamp
+        return [t.snapshot(timestamp) for t in self._tracks
+                if t.last_update == timestamp and t.hits >= self.min_hits]
+
+    def tracks(self, name: Optional[str] = None, timestamp: Optional[float] = None,
+               include_unconfirmed: bool = False) -> List[TrackState]:
+        """
+        获取轨迹，位置外推到 timestamp 时刻
+
+        参数:
+            name: 只返回该类别，None表示全部
+            timestamp: 外推时刻（time.monotonic()），None表示当前时间
+            include_unconfirmed: 是否包含匹配次数不足 min_hits 的新轨迹
+
+        返回:
+            TrackState 列表
+        """
+        if timestamp is None:
+            timestamp = time.monotonic()
+        return [t.snapshot(timestamp) for t in self._tracks
+                if (name is None or t.name == name)
+                and (include_unconfirmed or t.hits >= self.min_hits)]
+
+    def get_track(self, track_id: int, timestamp: Optional[float] = None) -> Optional[TrackState]:
+        """按编号获取轨迹，不存在时返回 None"""
+        if timestamp is None:
+            timestamp = time.monotonic()
+        for t in self._tracks:
+            if t.track_id == track_id:
+                return t.snapshot(timestamp)
+        return None
+
+    def reset(self):
+        """清除所有轨迹"""
+        self._tracks = []
+        self.last_update = None
+
+    def __len__(self) -> int:
+        return len(self._tracks)
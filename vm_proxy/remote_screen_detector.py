@@ -4,12 +4,37 @@
 继承原有的 ScreenDetector，但截图从远程虚拟机获取
 """
 
+from frame_sources import FrameSource
 from screen_detector import ScreenDetector
 from remote_client import SyncRemoteGameClient
 import cv2
 import numpy as np
 
 
+class RemoteFrameSource(FrameSource):
+    """从虚拟机代理获取截图（JPEG 传输，区域在主机端裁剪）"""
+
+    name = "remote"
+
+    def __init__(self, remote_client: SyncRemoteGameClient, quality: int = 85):
+        super().__init__()
+        self.remote_client = remote_client
+        self.quality = quality
+        self._closed = False
+
+    def grab(self, region=None, quality: int = None) -> np.ndarray:
+        frame = self.remote_client.capture_screen(quality=quality or self.quality)
+        return self._crop(frame, region)
+
+    def close(self):
+        if not self._closed:
+            self._closed = True
+            self.remote_client.disconnect()
+
+    def __repr__(self) -> str:
+        return f"RemoteFrameSource({self.remote_client.async_client.host!r})"
+
+
 class RemoteScreenDetector(ScreenDetector):
     """
     远程屏幕检测器
@@ -18,7 +43,7 @@ class RemoteScreenDetector(ScreenDetector):
     """
 
     def __init__(self, vm_host: str, vm_port: int = 8765,
-                 model_path: str = "hjzgv1.pt", conf: float = 0.25):
+                 model_path: str = "hjzgv1.pt", conf: float = 0.25, engine=None):
         """
         初始化远程检测器
 
@@ -27,10 +52,12 @@ class RemoteScreenDetector(ScreenDetector):
             vm_port: 虚拟机代理服务端口
             model_path: YOLO 模型路径
             conf: 置信度阈值
+            engine: 已创建的推理引擎（例如多台虚拟机共享的 BatchInferenceService.client()），
+                    None表示按模型路径加载
         """
         # 初始化父类（但不加载模型，因为父类的构造函数会尝试本地截图）
         # 我们手动加载模型
-        from ultralytics import YOLO
+        from inference_engines import create_engine
 
         # 禁用 SSL 验证
         import ssl
@@ -54,40 +81,50 @@ class RemoteScreenDetector(ScreenDetector):
 
         model_path = get_resource_path(model_path)
 
-        # 加载 YOLO 模型
-        self.model = YOLO(model_path)
+        # 加载模型（按文件类型选择推理引擎）
+        self.engine = engine if engine is not None else create_engine(model_path)
+        self.model = getattr(self.engine, 'model', None)
+        self.model_path = model_path
+        self.threads = None
         self.conf = conf
-        self.class_names = self.model.names
+        self.class_names = self.engine.names
 
         print(f"模型加载成功: {model_path}")
         print(f"支持的类别: {self.class_names}")
 
+        self._init_detection_state()
+
         # 连接到虚拟机
         self.remote_client = SyncRemoteGameClient(vm_host, vm_port)
         print(f"正在连接虚拟机 {vm_host}:{vm_port} ...")
         self.remote_client.connect()
         print("虚拟机连接成功！")
+        self.frame_source = RemoteFrameSource(self.remote_client)
+        self.frame_source.latency = self.latency
 
     def capture_screen(self, region=None, quality: int = 85) -> np.ndarray:
         """
         截取远程虚拟机屏幕
 
         Args:
-            region: 截取区域（暂不支持，全屏截图）
+            region: 截取区域 (x1, y1, x2, y2)，在主机端从全屏截图中裁剪
             quality: JPEG 质量
 
         Returns:
             numpy 数组格式的图像 (BGR)
         """
-        if region:
-            print("警告：远程检测器暂不支持区域截图，返回全屏")
-
-        # 从虚拟机获取截图
-        frame = self.remote_client.capture_screen(quality=quality)
+        return self.frame_source.grab(region, quality=quality)
 
-        return frame
+    def start_continuous(self, target_fps: float = 10.0, should_run=None, should_pause=None,
+                         region=None, processes: bool = False):
+        """启动后台连续检测（截图来自网络连接，子进程无法共用，不支持 processes=True）"""
+        if processes:
+            raise ValueError("远程检测不支持多进程检测")
+        super().start_continuous(target_fps, should_run, should_pause, region)
 
     def __del__(self):
         """析构时断开连接"""
-        if hasattr(self, 'remote_client'):
+        if hasattr(self, 'frame_source'):
+            self.frame_source.close()
+        elif hasattr(self, 'remote_client'):
             self.remote_client.disconnect()
@@ -13,15 +13,20 @@ import websockets
 import json
 import base64
 import cv2
-import numpy as np
-from PIL import ImageGrab
+import os
+import sys
 import pyautogui
 import time
-from typing import Dict, Any
+from typing import Dict, Any, Union
+
+# 图像来源模块位于项目根目录
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from frame_sources import FrameSource, create_frame_source
 
 # 配置
 HOST = "0.0.0.0"  # 监听所有网络接口
 PORT = 8765
+FRAME_SOURCE = "auto"  # 截图方式: auto / mss / imagegrab / xshm，或视频/图片目录路径
 
 # 设置 PyAutoGUI
 pyautogui.PAUSE = 0.05
@@ -31,9 +36,15 @@ pyautogui.FAILSAFE = True
 class GameProxyServer:
     """游戏代理服务器"""
 
-    def __init__(self):
+    def __init__(self, frame_source: Union[str, FrameSource] = FRAME_SOURCE):
+        """
+        Args:
+            frame_source: 图像来源名称、路径或 FrameSource 实例
+        """
         self.clients = set()
         self.is_running = True
+        self.frame_source = create_frame_source(frame_source)
+        print(f"图像来源: {self.frame_source}")
 
     async def capture_screen(self, quality: int = 85) -> str:
         """
@@ -46,14 +57,11 @@ class GameProxyServer:
             base64 编码的图像字符串
         """
         try:
-            # 截取屏幕
-            screenshot = ImageGrab.grab()
-
-            # 转换为 numpy 数组
-            img_array = np.array(screenshot)
+            # 截取屏幕 (BGR)
+            frame = self.frame_source.grab()
 
             # 压缩为 JPEG 格式
-            _, buffer = cv2.imencode('.jpg', img_array, [int(cv2.IMWRITE_JPEG_QUALITY), quality])
+            _, buffer = cv2.imencode('.jpg', frame, [int(cv2.IMWRITE_JPEG_QUALITY), quality])
 
             # 转换为 base64
             img_base64 = base64.b64encode(buffer).decode('utf-8')